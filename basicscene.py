@@ -1,12 +1,16 @@
 
 import typing
-from typing import Optional
+from typing import List, Optional
 import gamebase
 import pygame
-from pygame import Surface
+from pygame import Color, Surface
 from player import PlayerInputManager
 from scene import DynamicEntity, Scene, SingletonEntity
+import frametelemetry
 import gamesave
+import globalresources
+from glyphatlas import GlyphText
+import tickprofiler
 from utils import FadeEffect
 
 class BasicScene(Scene):
@@ -24,13 +28,33 @@ class BasicScene(Scene):
 
 DEBUG_DISPLAY_POS_X = gamebase.WINDOW_DIMENSION[0]
 DEBUG_DISPLAY_POS_Y = gamebase.WINDOW_DIMENSION[1] - 60
+DEBUG_DISPLAY_PROFILE_ROW_COUNT = 8
+DEBUG_DISPLAY_TELEMETRY_INTERVAL = 50 # the ticks between updates of the frame percentiles
 
 _debug_display_is_active: bool = False
 
 class DebugDisplay(SingletonEntity, DynamicEntity):
+    '''
+    Shows the frametime, the percentiles and the histogram of the last frame times, see the module frametelemetry, and above them the hooks that took the most time per tick, see the module tickprofiler. The profiler runs while the display is active.
+    '''
+
+    tick_order = 20 # over the other user interface
 
     __last_frametime_ms: int = -1
-    __frametime_surface: Optional[Surface] = None
+    __text_frametime: GlyphText
+    __telemetry_surfaces: List[Surface]
+    __last_profile_window_count: int = -1
+    __profile_surfaces: List[Surface]
+
+    def on_spawn(self):
+
+        super().on_spawn()
+        self.__text_frametime = GlyphText(
+            gamebase.get_glyph_atlas(Color("khaki"), antialias = False),
+            gamebase.render_text("frametime: ", False, "khaki")
+        )
+        self.__telemetry_surfaces = []
+        self.__profile_surfaces = []
 
     @property
     def is_active(self) -> bool:
@@ -41,25 +65,77 @@ class DebugDisplay(SingletonEntity, DynamicEntity):
     def is_active(self, val: bool):
         global _debug_display_is_active
         _debug_display_is_active = val
+        tickprofiler.set_enabled(val)
 
-    def on_late_tick(self):
+    def on_hud(self):
         is_active = self.is_active
         if is_active:
             frametime_ms = gamebase.get_frametime_ms()
+            text_frametime = self.__text_frametime
             if self.__last_frametime_ms != frametime_ms:
                 self.__last_frametime_ms = frametime_ms
-                font = gamebase.get_default_font()
-                self.__frametime_surface = font.render(
-                    f"frametime: {frametime_ms} ms", False, "khaki"
-                )
-        
-            surface = self.__frametime_surface
-            if surface != None:
-                screen = gamebase.get_screen()
-                screen.blit(
-                    surface,
-                    (DEBUG_DISPLAY_POS_X - surface.get_width(), DEBUG_DISPLAY_POS_Y)
+                text_frametime.set_text(f"{frametime_ms} ms")
+
+            screen = gamebase.get_screen()
+            gamebase.report_dirty_rect(text_frametime.draw(
+                screen,
+                (DEBUG_DISPLAY_POS_X - text_frametime.width, DEBUG_DISPLAY_POS_Y)
+            ))
+            y = self.__draw_lines(self.__get_telemetry_surfaces(), DEBUG_DISPLAY_POS_Y)
+            self.__draw_lines(self.__get_profile_surfaces(), y)
+
+    def __draw_lines(self, surfaces: List[Surface], y: int) -> int:
+        '''
+        Draw lines upwards from y, and returns the top of the last line.
+        '''
+
+        screen = gamebase.get_screen()
+        line_height = gamebase.get_default_font().get_linesize()
+        for surface in surfaces:
+            y -= line_height
+            gamebase.report_dirty_rect(screen.blit(
+                surface, (DEBUG_DISPLAY_POS_X - surface.get_width(), y)
+            ))
+        return y
+
+    def __get_telemetry_surfaces(self) -> List[Surface]:
+        if len(self.__telemetry_surfaces) == 0 or gamebase.get_tick_count() % DEBUG_DISPLAY_TELEMETRY_INTERVAL == 0:
+            telemetry = gamebase.get_frame_telemetry()
+            percentiles = telemetry.get_percentiles_ms()
+            histogram = telemetry.get_histogram()
+            bounds = frametelemetry.FRAME_TELEMETRY_HISTOGRAM_BOUNDS_MS
+            buckets = [
+                f"<={bound}ms: {count}" for bound, count in zip(bounds, histogram) if count > 0
+            ]
+            if histogram[-1] > 0:
+                buckets.append(f">{bounds[-1]}ms: {histogram[-1]}")
+            text_cache = gamebase.get_text_cache()
+            font = gamebase.get_default_font()
+            self.__telemetry_surfaces = [
+                font.render(
+                    "p50/p95/p99/max: " + "/".join(f"{value:.1f}" for value in percentiles.values()) + " ms",
+                    False, "khaki"
+                ),
+                font.render(", ".join(buckets), False, "khaki"),
+                font.render(
+                    f"text cache: {text_cache.hit_count} hits, {text_cache.miss_count} misses", False, "khaki"
+                ),
+            ]
+        return self.__telemetry_surfaces
+
+    def __get_profile_surfaces(self) -> List[Surface]:
+        profiler = tickprofiler.get_profiler()
+        font = gamebase.get_default_font()
+        if self.__last_profile_window_count != profiler.window_count:
+            self.__last_profile_window_count = profiler.window_count
+            self.__profile_surfaces = [
+                font.render(
+                    f"{name}.{hook_name}: {stats.total_ns / 1e6 / tickprofiler.PROFILE_WINDOW_TICKS:.3f} ms "
+                    f"(max {stats.max_ns / 1e6:.2f})", False, "khaki"
                 )
+                for name, hook_name, stats in profiler.get_window_rows(DEBUG_DISPLAY_PROFILE_ROW_COUNT)
+            ]
+        return self.__profile_surfaces
                         
     
 
@@ -70,6 +146,8 @@ CAPTION_HOLD_TIME = 1.0
 
 class Caption(SingletonEntity, DynamicEntity):
 
+    tick_order = 10
+
     __surface: Optional[Surface] = None
     __fade_effect: FadeEffect
 
@@ -81,7 +159,7 @@ class Caption(SingletonEntity, DynamicEntity):
             CAPTION_FADE_TIME, CAPTION_HOLD_TIME, CAPTION_FADE_TIME
         )
 
-    def on_late_tick(self):
+    def on_hud(self):
         
         surface = self.__surface
         if surface != None:
@@ -94,20 +172,15 @@ class Caption(SingletonEntity, DynamicEntity):
             else:
                 screen = gamebase.get_screen()
                 surface.set_alpha(int(255 * fade_effect.value))
-                screen.blit(
+                gamebase.report_dirty_rect(screen.blit(
                     surface, 
                     (CAPTION_POS_X - surface.get_width() // 2, CAPTION_POS_Y)
-                )
-
-FONT = gamebase.get_default_font()
+                ))
 
-def _generate_bool_option_imgs(name: str):
-    return {
-        enabled : FONT.render(f"{name} {"Enabled" if enabled else "Disabled"}", True, "black") for enabled in (True, False)
-    }
 
-IMGS_FULLSCREEN_SWITCH = _generate_bool_option_imgs("Fullscreen")
-IMGS_MUTE_SWITCH = _generate_bool_option_imgs("Mute")
+def _get_bool_option_img(name: str, enabled: bool) -> Surface:
+    # rendered when an option is first switched rather than at import, and cached from then on
+    return gamebase.render_text(f"{name} {"Enabled" if enabled else "Disabled"}", True, "black")
 
 class KeyboardReactiveSettingsChanger(DynamicEntity):
 
@@ -133,8 +206,9 @@ class KeyboardReactiveSettingsChanger(DynamicEntity):
 
         if gamesave.get("is_fullscreen", bool) ^ pygame.display.is_fullscreen():
             pygame.display.toggle_fullscreen()
+            gamebase.request_full_redraw()
 
-    def on_tick(self):
+    def on_input(self):
         
         input_manager = self.__input_manager
         if input_manager.request_debug:
@@ -142,11 +216,21 @@ class KeyboardReactiveSettingsChanger(DynamicEntity):
             debug_display.is_active = not debug_display.is_active
         if input_manager.request_fullscreen:
             pygame.display.toggle_fullscreen()
+            gamebase.request_full_redraw()
             is_fullscreen = pygame.display.is_fullscreen()
             gamesave.set("is_fullscreen", is_fullscreen)
-            self.__caption.set_surface(IMGS_FULLSCREEN_SWITCH[is_fullscreen])
+            self.__caption.set_surface(_get_bool_option_img("Fullscreen", is_fullscreen))
         if input_manager.request_mute:
             is_mute = gamesave.get("is_mute", bool)
             is_mute = not is_mute
             gamesave.set("is_mute", is_mute)
-            self.__caption.set_surface(IMGS_MUTE_SWITCH[is_mute])
\ No newline at end of file
+            if not is_mute:
+                globalresources.start_loading(is_silent = gamebase.is_headless())
+            self.__caption.set_surface(_get_bool_option_img("Mute", is_mute))
+        if input_manager.request_profile_dump and tickprofiler.is_enabled():
+            path = tickprofiler.PROFILE_DUMP_FILE_PATH
+            try:
+                tickprofiler.get_profiler().dump(path)
+                self.__caption.set_surface(gamebase.render_text(f"Profile saved to {path}", True, "black"))
+            except OSError as e:
+                print(f"WARNING: Couldn't save the profile to {path}: {e}")
\ No newline at end of file
@@ -0,0 +1,90 @@
+'''
+Benchmark of the main-thread tick jitter caused by the block map generator thread.
+
+It runs only BlockMapManager and BlockMapGenerator headless, paced to the real tick rate, and reports how long the main thread spends in each tick together with the CPU time the whole process burns and the final metrics of the blockmap pool.
+
+Usage:
+    python bench_handoff.py [--seconds 30]
+'''
+
+import argparse
+import os
+import statistics
+import time
+from typing import List, Optional
+import typing
+
+os.environ["DONT_TOUCH_BLOCKS_HEADLESS"] = "1"
+
+import gamebase
+from blockmap import BlockMapManager, BlockMapPoolMetrics
+from blockmap_generator import BlockMapGenerator
+from scene import DynamicEntity, Scene
+
+_tick_durations_ns: List[int] = []
+_pool_metrics: Optional[BlockMapPoolMetrics] = None
+
+class HandoffBenchScene(Scene):
+
+    def on_create(self):
+        global _pool_metrics
+
+        self.spawn_entity(TickPacer)
+        manager = typing.cast(BlockMapManager, self.spawn_entity(BlockMapManager))
+        self.spawn_entity(BlockMapGenerator)
+        _pool_metrics = manager.metrics
+
+    def on_destroy(self):
+
+        pass
+
+class TickPacer(DynamicEntity):
+    '''
+    Paces the headless loop to the tick rate and measures the main-thread time of every tick.
+    '''
+
+    __deadline_ns: int = 0
+    __tick_starttime_ns: int = 0
+
+    def on_input(self):
+
+        now_ns = time.perf_counter_ns()
+        if self.__deadline_ns == 0:
+            self.__deadline_ns = now_ns
+        self.__deadline_ns += 1000000000 // gamebase.TICK_RATE
+        sleep_ns = self.__deadline_ns - now_ns
+        if sleep_ns > 0:
+            time.sleep(sleep_ns / 1e9)
+        self.__tick_starttime_ns = time.perf_counter_ns()
+
+    def on_late_tick(self):
+
+        _tick_durations_ns.append(time.perf_counter_ns() - self.__tick_starttime_ns)
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+def main():
+    parser = argparse.ArgumentParser(description = "Measure main-thread tick jitter with the generator thread running.")
+    parser.add_argument("--seconds", type = float, default = 30.0)
+    args = parser.parse_args()
+
+    gamebase.register_scene("HandoffBenchScene", HandoffBenchScene)
+    cpu_starttime = time.process_time()
+    wall_starttime = time.perf_counter()
+    gamebase.run("HandoffBenchScene", max_ticks = int(args.seconds * gamebase.TICK_RATE))
+    cpu_time = time.process_time() - cpu_starttime
+    wall_time = time.perf_counter() - wall_starttime
+
+    # the first tick includes the initial generation
+    durations = sorted(d / 1e6 for d in _tick_durations_ns[1:])
+    print(f"ticks: {len(durations)}")
+    print(f"tick time p50: {percentile(durations, 0.5):.3f} ms")
+    print(f"tick time p99: {percentile(durations, 0.99):.3f} ms")
+    print(f"tick time max: {durations[-1]:.3f} ms")
+    print(f"tick time stdev: {statistics.pstdev(durations):.3f} ms")
+    print(f"process CPU: {100 * cpu_time / wall_time:.1f} %")
+    print(f"blockmap pool: {_pool_metrics}")
+
+if __name__ == "__main__":
+    main()
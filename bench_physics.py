@@ -0,0 +1,111 @@
+'''
+Benchmark of the per-tick physics: the Decimal arithmetic the game used to do versus the fixed-point ints it does now.
+
+Both kernels do the same work as one game tick: update the scroll speed and the block map offset, move the player, convert its position to block positions for both block maps and accumulate the score.
+
+Usage:
+    python bench_physics.py [--ticks 200000]
+'''
+
+import argparse
+import decimal
+from decimal import Decimal
+from fractions import Fraction
+import time
+import fixedpoint
+
+TICK_RATE = 100
+BLOCK_SIDE_LEN = 40
+SURFACE_WIDTH = 1280
+
+def run_decimal(ticks: int) -> float:
+    '''
+    The physics as it was done with Decimal at precision 5.
+    '''
+
+    with decimal.localcontext() as ctx:
+        ctx.prec = 5
+        dt = Decimal(1) / Decimal(TICK_RATE)
+        g_accel = Decimal(1000)
+        jump_speed = Decimal(285)
+        max_speed = Decimal(600)
+        speed_accel = (Decimal(600) - Decimal(300)) / Decimal(180)
+        player_x = Decimal(200)
+        speed = Decimal(300)
+        offset_x = Decimal(0)
+        pos_y = Decimal(200)
+        speed_y = Decimal(0)
+        score = Decimal(0)
+
+        starttime_ns = time.perf_counter_ns()
+        for tick in range(ticks):
+            if speed < max_speed:
+                speed += speed_accel * dt
+                if speed > max_speed:
+                    speed = max_speed
+            offset_x -= speed * dt
+            if offset_x <= -SURFACE_WIDTH:
+                offset_x = Decimal(0)
+            if tick % 50 == 0:
+                speed_y = -jump_speed
+            speed_y += g_accel * dt
+            pos_y += speed_y * dt
+            for origin_x in (offset_x, offset_x + SURFACE_WIDTH):
+                int(((player_x - origin_x) / BLOCK_SIDE_LEN).quantize(
+                    Decimal(1), rounding = decimal.ROUND_FLOOR))
+                int((pos_y / BLOCK_SIDE_LEN).quantize(
+                    Decimal(1), rounding = decimal.ROUND_FLOOR))
+            score += dt
+        return (time.perf_counter_ns() - starttime_ns) / ticks
+
+def run_fixed(ticks: int) -> float:
+    '''
+    The same physics with fixed-point ints.
+    '''
+
+    g_accel = fixedpoint.accel_from_pixels_per_second2(1000, TICK_RATE)
+    jump_speed = fixedpoint.speed_from_pixels_per_second(285, TICK_RATE)
+    initial_speed = fixedpoint.speed_from_pixels_per_second(300, TICK_RATE)
+    max_speed = fixedpoint.speed_from_pixels_per_second(600, TICK_RATE)
+    speed_accel = fixedpoint.exact(Fraction(max_speed - initial_speed, 180 * TICK_RATE))
+    block_side_len = fixedpoint.from_pixels(BLOCK_SIDE_LEN)
+    surface_width = fixedpoint.from_pixels(SURFACE_WIDTH)
+    player_x = fixedpoint.from_pixels(200)
+    speed = initial_speed
+    offset_x = 0
+    pos_y = fixedpoint.from_pixels(200)
+    speed_y = 0
+    score_ticks = 0
+
+    starttime_ns = time.perf_counter_ns()
+    for tick in range(ticks):
+        if speed < max_speed:
+            speed += speed_accel
+            if speed > max_speed:
+                speed = max_speed
+        offset_x -= speed
+        if offset_x <= -surface_width:
+            offset_x = 0
+        if tick % 50 == 0:
+            speed_y = -jump_speed
+        speed_y += g_accel
+        pos_y += speed_y
+        for origin_x in (offset_x, offset_x + surface_width):
+            (player_x - origin_x) // block_side_len
+            pos_y // block_side_len
+        score_ticks += 1
+    return (time.perf_counter_ns() - starttime_ns) / ticks
+
+def main():
+    parser = argparse.ArgumentParser(description = "Compare the per-tick cost of Decimal and fixed-point physics.")
+    parser.add_argument("--ticks", type = int, default = 200000)
+    args = parser.parse_args()
+
+    decimal_ns = run_decimal(args.ticks)
+    fixed_ns = run_fixed(args.ticks)
+    print(f"Decimal:     {decimal_ns:8.0f} ns/tick")
+    print(f"fixed-point: {fixed_ns:8.0f} ns/tick")
+    print(f"speedup:     {decimal_ns / fixed_ns:8.1f}x")
+
+if __name__ == "__main__":
+    main()
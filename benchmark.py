@@ -0,0 +1,323 @@
+'''
+Benchmark suite of the hot paths and of a full headless game, with machine-readable results and a comparison against a stored baseline.
+
+Every benchmark reports the time of one operation in nanoseconds: the best and the median of --repeat runs. The headless game runs in its own process, because gamebase.run can only be called once, and reports the time of one tick.
+
+Usage:
+    python benchmark.py [--filter blockmap] [--repeat 5] [--seconds 60] [--output results.json] [--baseline baseline.json] [--threshold 0.1]
+
+To guard an optimization, save the results of the base commit with --output, then run the suite on the change with --baseline. The exit code is 1 if a benchmark is slower than its baseline by more than the threshold.
+'''
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import timeit
+import typing
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+os.environ["DONT_TOUCH_BLOCKS_HEADLESS"] = "1"
+os.environ.setdefault("DONT_TOUCH_BLOCKS_FRAME_TELEMETRY", "")
+os.environ.setdefault("DONT_TOUCH_BLOCKS_RUN_HISTORY", "")
+
+import blockmap
+import blockmap_generator
+import gamebase
+import gamesave
+import xor_encrypt
+from blockmap import BlockMap, BlockMapManager
+from blockmap_engine import BlockMapEngine
+from scene import Scene
+from utils import DecimalVector2
+
+BENCHMARK_RESULTS_FORMAT = 1
+DEFAULT_REGRESSION_THRESHOLD = 0.1
+BENCHMARK_SEED = 1
+
+# (best, median) in nanoseconds per operation
+Timing = Tuple[float, float]
+
+def measure(func: Callable[[], Any], repeat: int) -> Timing:
+    '''
+    Time a function like timeit: the number of calls per run is chosen so that a run takes at least 0.2 seconds.
+    '''
+
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = [elapsed / number * 1e9 for elapsed in timer.repeat(repeat, number)]
+    return (min(times), statistics.median(times))
+
+def _generate_map() -> Tuple[bytearray, bytearray]:
+    params = blockmap_generator.get_generation_params()
+    occupancy = bytearray(params.map_size)
+    colors = bytearray(params.map_size * 4)
+    BlockMapEngine(params, BENCHMARK_SEED).generate(occupancy, colors)
+    return (occupancy, colors)
+
+def bench_blockmap_refresh(args: argparse.Namespace) -> Timing:
+    '''
+    Load a generated map into a BlockMap and redraw its whole surface.
+    '''
+
+    occupancy, colors = _generate_map()
+    bmap = BlockMap()
+    def run():
+        bmap.load(occupancy, colors)
+        bmap.refresh()
+    return measure(run, args.repeat)
+
+def bench_blockmap_generate(args: argparse.Namespace) -> Timing:
+    '''
+    What BlockMapGenerator.__generate does for a map in the thread generation mode: generate it with the engine, load it and redraw it.
+    '''
+
+    params = blockmap_generator.get_generation_params()
+    engine = BlockMapEngine(params, BENCHMARK_SEED)
+    occupancy = bytearray(params.map_size)
+    colors = bytearray(params.map_size * 4)
+    bmap = BlockMap()
+    def run():
+        engine.generate(occupancy, colors)
+        bmap.load(occupancy, colors)
+        bmap.refresh()
+    return measure(run, args.repeat)
+
+class _BenchScene(Scene):
+
+    def on_create(self):
+        pass
+
+    def on_destroy(self):
+        pass
+
+def bench_test_touch_block(args: argparse.Namespace) -> Timing:
+    '''
+    One collision test of BlockMapManager, at positions spread over both block maps.
+    '''
+
+    occupancy, colors = _generate_map()
+    manager = typing.cast(BlockMapManager, _BenchScene().spawn_entity(BlockMapManager))
+    manager.launch(lambda bmap: bmap.load(occupancy, colors))
+    manager.move(blockmap.BLOCK_MAP_SURFACE_WIDTH_FIXED // 3)
+    rng = random.Random(BENCHMARK_SEED)
+    positions = [
+        (
+            rng.randrange(blockmap.BLOCK_MAP_SURFACE_WIDTH_FIXED),
+            rng.randrange(-blockmap.BLOCK_SIDE_LEN_FIXED, blockmap.BLOCK_MAP_SURFACE_HEIGHT_FIXED + blockmap.BLOCK_SIDE_LEN_FIXED)
+        )
+        for _ in range(1000)
+    ]
+    test_touch_block = manager.test_touch_block
+    def run():
+        for x, y in positions:
+            test_touch_block(x, y)
+    best, median = measure(run, args.repeat)
+    manager.stop_generation()
+    return (best / len(positions), median / len(positions))
+
+def bench_decimal_vector2(args: argparse.Namespace) -> Timing:
+    '''
+    A step of DecimalVector2 arithmetic: an addition, a subtraction, a scaling and a dot product.
+    '''
+
+    position = DecimalVector2(Decimal("200.5"), Decimal("300.25"))
+    velocity = DecimalVector2(Decimal("3.5"), Decimal("-2.75"))
+    dt = Decimal("0.01")
+    def run():
+        moved = position + velocity * dt
+        (moved - position) * velocity
+    return measure(run, args.repeat)
+
+_XOR_CONTENT = "".join(chr(ord("a") + i % 26) for i in range(4096))
+_XOR_KEY = "benchmark key"
+
+def bench_xor_encrypt(args: argparse.Namespace) -> Timing:
+    '''
+    Encrypt 4 KiB of text.
+    '''
+
+    return measure(lambda: xor_encrypt.encrypt(_XOR_CONTENT, _XOR_KEY), args.repeat)
+
+def bench_xor_decrypt(args: argparse.Namespace) -> Timing:
+    '''
+    Decrypt and check 4 KiB of text.
+    '''
+
+    content, md5 = xor_encrypt.encrypt(_XOR_CONTENT, _XOR_KEY)
+    return measure(lambda: xor_encrypt.decrypt(content, _XOR_KEY, md5), args.repeat)
+
+def _bench_xor_encrypt_size(size: int, args: argparse.Namespace) -> Timing:
+    content = (_XOR_CONTENT * (size // len(_XOR_CONTENT) + 1))[:size]
+    return measure(lambda: xor_encrypt.encrypt(content, _XOR_KEY), args.repeat)
+
+def bench_xor_encrypt_1kb(args: argparse.Namespace) -> Timing:
+    '''
+    Encrypt 1 KB of text.
+    '''
+
+    return _bench_xor_encrypt_size(1000, args)
+
+def bench_xor_encrypt_1mb(args: argparse.Namespace) -> Timing:
+    '''
+    Encrypt 1 MB of text.
+    '''
+
+    return _bench_xor_encrypt_size(1000000, args)
+
+XOR_STREAM_CHUNK_SIZE = 1 << 20
+
+def bench_xor_stream_100mb(args: argparse.Namespace) -> Timing:
+    '''
+    Encrypt 100 MB with XorStream, in chunks of 1 MiB.
+    '''
+
+    content = _XOR_CONTENT.encode() * (100000000 // len(_XOR_CONTENT) + 1)
+    content = memoryview(content)[:100000000]
+    def run():
+        stream = xor_encrypt.XorStream(_XOR_KEY)
+        for start in range(0, len(content), XOR_STREAM_CHUNK_SIZE):
+            stream.update(content[start:start + XOR_STREAM_CHUNK_SIZE])
+        stream.hexdigest()
+    return measure(run, args.repeat)
+
+def bench_gamesave_save(args: argparse.Namespace) -> Timing:
+    '''
+    Save the game save, which is written back unchanged.
+    '''
+
+    return measure(gamesave.save, args.repeat)
+
+def _run_headless_game(seconds: float) -> float:
+    '''
+    Run a seeded headless game in this process, and returns the nanoseconds per tick.
+    '''
+
+    from headless import SoakGameScene
+    # the runs are seeded by the global random, so every benchmark run plays the same games.
+    random.seed(BENCHMARK_SEED)
+    blockmap_generator.set_generation_mode(blockmap_generator.GENERATION_MODE_THREAD)
+    gamebase.register_scene("SoakGameScene", SoakGameScene)
+    starttime_ns = time.perf_counter_ns()
+    gamebase.run("SoakGameScene", max_ticks = int(seconds * gamebase.TICK_RATE))
+    return (time.perf_counter_ns() - starttime_ns) / gamebase.get_tick_count()
+
+def bench_headless_game(args: argparse.Namespace) -> Timing:
+    '''
+    A tick of a full headless game of --seconds simulated seconds, restarted whenever it's over.
+    '''
+
+    context = multiprocessing.get_context("spawn")
+    times: List[float] = []
+    for _ in range(args.repeat):
+        with context.Pool(1, maxtasksperchild = 1) as pool:
+            times.append(pool.apply(_run_headless_game, (args.seconds,)))
+    return (min(times), statistics.median(times))
+
+# (name, unit of an operation, benchmark)
+BENCHMARKS: List[Tuple[str, str, Callable[[argparse.Namespace], Timing]]] = [
+    ("blockmap_refresh", "map", bench_blockmap_refresh),
+    ("blockmap_generate", "map", bench_blockmap_generate),
+    ("test_touch_block", "test", bench_test_touch_block),
+    ("decimal_vector2", "step", bench_decimal_vector2),
+    ("xor_encrypt", "4 KiB", bench_xor_encrypt),
+    ("xor_decrypt", "4 KiB", bench_xor_decrypt),
+    ("xor_encrypt_1kb", "1 KB", bench_xor_encrypt_1kb),
+    ("xor_encrypt_1mb", "1 MB", bench_xor_encrypt_1mb),
+    ("xor_stream_100mb", "100 MB", bench_xor_stream_100mb),
+    ("gamesave_save", "save", bench_gamesave_save),
+    ("headless_game", "tick", bench_headless_game),
+]
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    '''
+    Returns the names of the benchmarks whose best time is slower than the baseline by more than the threshold, a fraction of the baseline time. Benchmarks missing from either side are ignored.
+    '''
+
+    regressions: List[str] = []
+    baseline_benchmarks = baseline.get("benchmarks", {})
+    for name, result in results["benchmarks"].items():
+        base = baseline_benchmarks.get(name)
+        if base != None and result["best_ns"] > base["best_ns"] * (1 + threshold):
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmark the hot paths and a headless game.")
+    parser.add_argument(
+        "--filter", action = "append", default = None,
+        help = "run only the benchmarks whose names contain this, can be repeated"
+    )
+    parser.add_argument("--list", action = "store_true", help = "list the benchmarks and exit")
+    parser.add_argument(
+        "--repeat", type = int, default = 5,
+        help = "the number of timed runs of every benchmark (default: 5)"
+    )
+    parser.add_argument(
+        "--seconds", type = float, default = 60.0,
+        help = "simulated seconds of a headless game run (default: 60)"
+    )
+    parser.add_argument("--output", default = None, help = "write the results to this JSON file")
+    parser.add_argument("--baseline", default = None, help = "compare with the results in this JSON file")
+    parser.add_argument(
+        "--threshold", type = float, default = DEFAULT_REGRESSION_THRESHOLD,
+        help = f"the slowdown over the baseline reported as a regression (default: {DEFAULT_REGRESSION_THRESHOLD})"
+    )
+    args = parser.parse_args()
+    if args.repeat < 1:
+        parser.error("--repeat must be positive.")
+
+    benchmarks = [
+        benchmark for benchmark in BENCHMARKS
+        if args.filter == None or any(pattern in benchmark[0] for pattern in args.filter)
+    ]
+    if args.list:
+        for name, unit, func in benchmarks:
+            print(f"{name}: {(func.__doc__ or "").strip()}")
+        return
+    if len(benchmarks) == 0:
+        print("No benchmark matches the filter.")
+        sys.exit(1)
+
+    baseline: Optional[Dict[str, Any]] = None
+    if args.baseline != None:
+        with open(args.baseline, "r", encoding = "utf-8") as f:
+            baseline = json.load(f)
+
+    results: Dict[str, Any] = {
+        "format": BENCHMARK_RESULTS_FORMAT,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "benchmarks": {},
+    }
+    for name, unit, func in benchmarks:
+        best, median = func(args)
+        results["benchmarks"][name] = {"unit": unit, "best_ns": best, "median_ns": median}
+        line = f"{name:<20} {best:>14.1f} ns/{unit} (median {median:.1f})"
+        if baseline != None:
+            base = baseline.get("benchmarks", {}).get(name)
+            if base != None:
+                line += f", {(best / base["best_ns"] - 1) * 100:+.1f}% vs baseline"
+        print(line)
+
+    if args.output != None:
+        with open(args.output, "w", encoding = "utf-8") as f:
+            json.dump(results, f, indent = 2)
+
+    if baseline != None:
+        regressions = compare(results, baseline, args.threshold)
+        for name in regressions:
+            print(f"REGRESSION: {name} is more than {args.threshold * 100:.0f}% slower than the baseline.")
+        if len(regressions) > 0:
+            sys.exit(1)
+        print(f"OK: no benchmark is more than {args.threshold * 100:.0f}% slower than the baseline.")
+
+if __name__ == "__main__":
+    main()
@@ -2,18 +2,19 @@
 This module is mainly about a data structure 'block map'.
 '''
 
-import decimal
-from queue import Queue
-from typing import Callable, List, Optional, Tuple
+from collections import deque
+import math
+import time
+from typing import Callable, Deque, List, Optional, Set, Tuple
 import pygame
-from pygame import Rect, draw
 from pygame import Color, Surface
 import gamebase
+import fixedpoint
 from scene import DynamicEntity, SingletonEntity
-from utils import ColorValue
-from decimal import Decimal
+from utils import ColorValue, HandoffQueue
 
 BLOCK_SIDE_LEN = 40
+BLOCK_SIDE_LEN_FIXED = fixedpoint.from_pixels(BLOCK_SIDE_LEN)
 
 class Block:
     '''
@@ -30,22 +31,58 @@ BLOCK_MAP_SURFACE_HEIGHT = gamebase.WINDOW_DIMENSION[1]
 BLOCK_MAP_WIDTH = BLOCK_MAP_SURFACE_WIDTH // BLOCK_SIDE_LEN
 BLOCK_MAP_HEIGHT = BLOCK_MAP_SURFACE_HEIGHT // BLOCK_SIDE_LEN
 BLOCK_MAP_SIZE = BLOCK_MAP_WIDTH * BLOCK_MAP_HEIGHT
+BLOCK_MAP_SURFACE_WIDTH_FIXED = fixedpoint.from_pixels(BLOCK_MAP_SURFACE_WIDTH)
+BLOCK_MAP_SURFACE_HEIGHT_FIXED = fixedpoint.from_pixels(BLOCK_MAP_SURFACE_HEIGHT)
+
+_EMPTY_OCCUPANCY = bytes(BLOCK_MAP_SIZE)
+_EMPTY_COLORS = bytes(BLOCK_MAP_SIZE * 4)
+_ALL_COLUMNS_DIRTY = b"\1" * BLOCK_MAP_WIDTH
+_NO_COLUMN_DIRTY = bytes(BLOCK_MAP_WIDTH)
+_EMPTY_COLUMN_MASKS = [0] * BLOCK_MAP_WIDTH
+_OCCUPANCY_TO_BINARY_DIGITS = bytes.maketrans(b"\0\1", b"01")
 
 class BlockMap:
     '''
     A data structure representing a two-dimensional block map.
 
-    This map contains an list of Optional[Block](None represent no block) and a corresponding pygame.Surface instance. The surface is the same size as the game window.
+    This map contains two flat buffers and a corresponding pygame.Surface instance. The surface is the same size as the game window.
+
+    The occupancy buffer holds one byte per block, 1 for a block and 0 for no block, column by column(the index is x * BLOCK_MAP_HEIGHT + y). The color buffer is a BLOCK_MAP_WIDTH x BLOCK_MAP_HEIGHT RGBA image, row by row, whose alpha is 255 where there's a block. Both buffers are exported without copying through the properties occupancy and colors, e.g. numpy.asarray(bmap.occupancy).
+
+    The occupancy is also indexed by one int per column, whose bit y is set where there's a block, so that a collision query is a division and a bit test.
+
+    World positions are fixed-point numbers in sub-pixels, see the module fixedpoint.
     '''
 
-    __blocks: List[Optional[Block]]
+    __occupancy: bytearray
+    __column_masks: List[int]
+    __colors: bytearray
+    __dirty_columns: bytearray # 1 for the columns changed since the last refresh
     __surface: Surface
-    __offset_x: Decimal = Decimal(BLOCK_MAP_SURFACE_WIDTH)
+    __image: Surface # the color buffer converted to the pixel format of the surface, one pixel per block
+    __image_columns: List[Surface]
+    __surface_columns: List[Surface]
+    __offset_x: int = BLOCK_MAP_SURFACE_WIDTH_FIXED
 
     def __init__(self):
-        self.__blocks = [None] * BLOCK_MAP_SIZE
+        self.__occupancy = bytearray(BLOCK_MAP_SIZE)
+        self.__column_masks = list(_EMPTY_COLUMN_MASKS)
+        self.__colors = bytearray(BLOCK_MAP_SIZE * 4)
+        self.__dirty_columns = bytearray(_ALL_COLUMNS_DIRTY)
         self.__surface = Surface(
             (BLOCK_MAP_SURFACE_WIDTH, BLOCK_MAP_SURFACE_HEIGHT), flags = pygame.SRCALPHA)
+        self.__image = Surface(
+            (BLOCK_MAP_WIDTH, BLOCK_MAP_HEIGHT), flags = pygame.SRCALPHA)
+        self.__image_columns = [
+            self.__image.subsurface((x, 0, 1, BLOCK_MAP_HEIGHT))
+            for x in range(BLOCK_MAP_WIDTH)
+        ]
+        self.__surface_columns = [
+            self.__surface.subsurface(
+                (x * BLOCK_SIDE_LEN, 0, BLOCK_SIDE_LEN, BLOCK_MAP_SURFACE_HEIGHT)
+            )
+            for x in range(BLOCK_MAP_WIDTH)
+        ]
         
     @property
     def surface(self) -> Surface:
@@ -56,9 +93,35 @@ class BlockMap:
         return self.__surface
     
     @property
-    def offset_x(self) -> Decimal:
+    def occupancy(self) -> memoryview:
+        '''
+        Returns a read-only view of the occupancy buffer with the shape (BLOCK_MAP_WIDTH, BLOCK_MAP_HEIGHT).
+        '''
+
+        return memoryview(self.__occupancy).toreadonly().cast(
+            "B", (BLOCK_MAP_WIDTH, BLOCK_MAP_HEIGHT))
+    
+    @property
+    def colors(self) -> memoryview:
+        '''
+        Returns a read-only view of the RGBA color buffer with the shape (BLOCK_MAP_HEIGHT, BLOCK_MAP_WIDTH, 4).
+        '''
+
+        return memoryview(self.__colors).toreadonly().cast(
+            "B", (BLOCK_MAP_HEIGHT, BLOCK_MAP_WIDTH, 4))
+    
+    @property
+    def column_masks(self) -> List[int]:
         '''
-        Returns the offset as a world position X.
+        Returns the occupancy bitmask of every column, bit y for the block position Y. The list mustn't be modified.
+        '''
+
+        return self.__column_masks
+
+    @property
+    def offset_x(self) -> int:
+        '''
+        Returns the offset as a world position X in sub-pixels.
         '''
 
         return self.__offset_x
@@ -71,12 +134,14 @@ class BlockMap:
         Calling method recycle can make it usable again.
         '''
 
-        return self.__offset_x <= -BLOCK_MAP_SURFACE_WIDTH
+        return self.__offset_x <= -BLOCK_MAP_SURFACE_WIDTH_FIXED
         
     def get_block(self, x: int, y: int) -> Optional[Block]:
         '''
         Returns the block at the specified block position.
 
+        A new Block instance is created for every call, use is_solid and get_color on hot paths.
+
         Args:
             x: Block position X.
             y: Block position Y.
@@ -85,7 +150,9 @@ class BlockMap:
             IndexError: The specified position is out of the range.
         '''
 
-        return self.__blocks[x * BLOCK_MAP_HEIGHT + y]
+        if not self.is_solid(x, y):
+            return None
+        return Block(self.get_color(x, y))
     
     def set_block(self, x: int, y: int, block: Optional[Block]):
         '''
@@ -100,61 +167,145 @@ class BlockMap:
             IndexError: The specified position is out of the range.
         '''
 
-        self.__blocks[x * BLOCK_MAP_HEIGHT + y] = block
+        self.set_cell(x, y, None if block == None else tuple(block.color)[:3])
 
-    def pos_world_to_block(self, x: Decimal, y: Decimal) -> Tuple[int, int]:
+    def is_solid(self, x: int, y: int) -> bool:
+        '''
+        Returns whether there's a block at the specified block position.
+
+        Raises:
+            IndexError: The specified position is out of the range.
+        '''
+
+        if not (0 <= x < BLOCK_MAP_WIDTH and 0 <= y < BLOCK_MAP_HEIGHT):
+            raise IndexError(f"The block position ({x}, {y}) is out of the range!")
+        return self.__occupancy[x * BLOCK_MAP_HEIGHT + y] != 0
+
+    def get_color(self, x: int, y: int) -> Tuple[int, int, int]:
+        '''
+        Returns the RGB color at the specified block position. It's meaningless if there's no block.
+        '''
+
+        i = (y * BLOCK_MAP_WIDTH + x) * 4
+        colors = self.__colors
+        return (colors[i], colors[i + 1], colors[i + 2])
+
+    def set_cell(self, x: int, y: int, color: Optional[Tuple[int, int, int]]):
+        '''
+        Set or clear the block at the specified block position.
+
+        Args:
+            x: Block position X.
+            y: Block position Y.
+            color: The RGB color of the block, or None to clear the block.
+
+        Raises:
+            IndexError: The specified position is out of the range.
+        '''
+
+        if not (0 <= x < BLOCK_MAP_WIDTH and 0 <= y < BLOCK_MAP_HEIGHT):
+            raise IndexError(f"The block position ({x}, {y}) is out of the range!")
+        i = (y * BLOCK_MAP_WIDTH + x) * 4
+        self.__dirty_columns[x] = 1
+        if color == None:
+            self.__occupancy[x * BLOCK_MAP_HEIGHT + y] = 0
+            self.__column_masks[x] &= ~(1 << y)
+            self.__colors[i:i + 4] = b"\0\0\0\0"
+        else:
+            self.__occupancy[x * BLOCK_MAP_HEIGHT + y] = 1
+            self.__column_masks[x] |= 1 << y
+            self.__colors[i:i + 4] = bytes((color[0], color[1], color[2], 255))
+
+    def load(self, occupancy, colors):
+        '''
+        Replace all cells with the given buffers, e.g. a map generated in another process.
+
+        Args:
+            occupancy: BLOCK_MAP_SIZE bytes laid out as the occupancy property.
+            colors: BLOCK_MAP_SIZE * 4 bytes laid out as the colors property.
+        '''
+
+        self.__occupancy[:] = occupancy
+        self.__colors[:] = colors
+        self.__dirty_columns[:] = _ALL_COLUMNS_DIRTY
+        # the bytes of a column reversed are the binary digits of its mask.
+        binary_digits = self.__occupancy.translate(_OCCUPANCY_TO_BINARY_DIGITS)
+        self.__column_masks[:] = [
+            int(binary_digits[(x + 1) * BLOCK_MAP_HEIGHT - 1::-1][:BLOCK_MAP_HEIGHT], 2)
+            for x in range(BLOCK_MAP_WIDTH)
+        ]
+
+    def pos_world_to_block(self, x: int, y: int) -> Tuple[int, int]:
         '''
         Convert a world position to a block position.
 
         Args:
-            x: World position X.
-            y: World position Y.
+            x: World position X in sub-pixels.
+            y: World position Y in sub-pixels.
         
         Returns:
             The corresponding block position as a tuple.
         '''
 
-        origin_x = self.__offset_x
-        block_x = int(((x - origin_x) / BLOCK_SIDE_LEN).quantize(
-            Decimal(1), rounding = decimal.ROUND_FLOOR))
-        block_y = int((y / BLOCK_SIDE_LEN).quantize(
-            Decimal(1), rounding = decimal.ROUND_FLOOR))
-        return (block_x, block_y)
+        return (
+            (x - self.__offset_x) // BLOCK_SIDE_LEN_FIXED, 
+            y // BLOCK_SIDE_LEN_FIXED
+        )
 
     def refresh(self):
         '''
         Refresh the Surface instance according to the block map.
-        '''
 
-        self.__surface.fill((0, 0, 0, 0))
-        for x in range(BLOCK_MAP_WIDTH):
-            for y in range(BLOCK_MAP_HEIGHT):
-                block = self.get_block(x, y)
-                if block != None:
-                    draw.rect(
-                        self.__surface, block.color, 
-                        Rect(
-                            x * BLOCK_SIDE_LEN, y * BLOCK_SIDE_LEN, BLOCK_SIDE_LEN, BLOCK_SIDE_LEN
-                        )
-                    )
+        Only the columns changed since the last refresh are redrawn. The color buffer is rasterized by scaling it up with nearest-neighbor sampling, so a column, or the whole map, is painted by one scale call no matter how many blocks it has.
+        '''
 
-    def move(self, dx: Decimal):
+        dirty_columns = self.__dirty_columns
+        if dirty_columns == _NO_COLUMN_DIRTY:
+            return
+        surface = self.__surface
+        if self.__occupancy == _EMPTY_OCCUPANCY:
+            surface.fill((0, 0, 0, 0))
+            dirty_columns[:] = _NO_COLUMN_DIRTY
+            return
+        
+        # Blitting converts RGBA to the pixel format of the surface. As every alpha is 0 or 255, the blended result is the exact color.
+        image = self.__image
+        colors = pygame.image.frombuffer(
+            self.__colors, (BLOCK_MAP_WIDTH, BLOCK_MAP_HEIGHT), "RGBA")
+        if dirty_columns == _ALL_COLUMNS_DIRTY:
+            image.fill((0, 0, 0, 0))
+            image.blit(colors, (0, 0))
+            pygame.transform.scale(image, surface.get_size(), surface)
+        else:
+            image_columns = self.__image_columns
+            surface_columns = self.__surface_columns
+            column_size = surface_columns[0].get_size()
+            for x in range(BLOCK_MAP_WIDTH):
+                if dirty_columns[x] != 0:
+                    column_rect = (x, 0, 1, BLOCK_MAP_HEIGHT)
+                    image.fill((0, 0, 0, 0), column_rect)
+                    image.blit(colors, (x, 0), column_rect)
+                    pygame.transform.scale(
+                        image_columns[x], column_size, surface_columns[x])
+        dirty_columns[:] = _NO_COLUMN_DIRTY
+
+    def move(self, dx: int):
         '''
         Move the block map.
 
         Args:
-            dx: The world distance to move on the X-axis. 
+            dx: The world distance to move on the X-axis in sub-pixels. 
         '''
 
         self.__offset_x -= dx
 
     @offset_x.setter
-    def offset_x(self, x: Decimal):
+    def offset_x(self, x: int):
         '''
-        Set the world offset x directly to avoid precision issue.
+        Set the world offset x directly.
 
         Args:
-            x: The world position x to set.
+            x: The world position x to set in sub-pixels.
         '''
 
         self.__offset_x = x
@@ -164,27 +315,149 @@ class BlockMap:
         Reset the block map and make it usable again.
         '''
 
-        for i in range(BLOCK_MAP_SIZE):
-            self.__blocks[i] = None
-        self.__offset_x = Decimal(BLOCK_MAP_SURFACE_WIDTH)
+        self.__occupancy[:] = _EMPTY_OCCUPANCY
+        self.__column_masks[:] = _EMPTY_COLUMN_MASKS
+        self.__colors[:] = _EMPTY_COLORS
+        self.__dirty_columns[:] = _ALL_COLUMNS_DIRTY
+        self.__offset_x = BLOCK_MAP_SURFACE_WIDTH_FIXED
+
+BLOCK_MAP_POOL_MIN_SIZE = 2 + 2 # two on the screen, one being generated and one ready
+BLOCK_MAP_MEMORY_SIZE = BLOCK_MAP_SURFACE_WIDTH * BLOCK_MAP_SURFACE_HEIGHT * 4 + BLOCK_MAP_SIZE * 9 # estimated bytes per block map
+BLOCK_MAP_POOL_MEMORY_BUDGET = 48 * 1024 * 1024
+BLOCK_MAP_POOL_MAX_SIZE = max(
+    BLOCK_MAP_POOL_MIN_SIZE, BLOCK_MAP_POOL_MEMORY_BUDGET // BLOCK_MAP_MEMORY_SIZE
+)
+PREFETCH_SAFETY_FACTOR = 2.0 # how many times the peak generation latency the ready blockmaps should cover
+GENERATION_LATENCY_PEAK_DECAY = 0.9
+GENERATION_LATENCY_AVG_WEIGHT = 0.2
+READY_BLOCKMAP_WAIT_TIMEOUT = 0.004 # the seconds to wait for a late blockmap before falling back to an empty one
+GENERATION_STOP_TIMEOUT = 2.0 # the seconds to wait for the blockmaps being generated when the manager is destroyed
+REPLAY_BLOCKMAP_WAIT_TIMEOUT = 10.0 # the seconds a replay waits for a blockmap before it's given up, as the generator must have died
+STARVATION_EVENT_HISTORY = 64
+
+# blockmaps not owned by any BlockMapManager, kept for the next game scene. They're allocated lazily.
+_blockmap_pool: List[BlockMap] = []
+
+def _acquire_blockmap() -> BlockMap:
+    global _blockmap_pool
+    if len(_blockmap_pool) > 0:
+        return _blockmap_pool.pop()
+    return BlockMap()
+
+def get_target_pool_size(generation_latency_peak_ms: float, time_to_consume_ms: float) -> int:
+    '''
+    Returns the pool size whose ready blockmaps cover PREFETCH_SAFETY_FACTOR times the peak generation latency, within BLOCK_MAP_POOL_MIN_SIZE and BLOCK_MAP_POOL_MAX_SIZE.
+    '''
+
+    ready_needed = math.ceil(PREFETCH_SAFETY_FACTOR * generation_latency_peak_ms / time_to_consume_ms)
+    # two on the screen, one being generated and the ready ones.
+    target = 3 + max(1, ready_needed)
+    return min(max(target, BLOCK_MAP_POOL_MIN_SIZE), BLOCK_MAP_POOL_MAX_SIZE)
+
+class StarvationEvent:
+    '''
+    A record of a tick when no generated blockmap was ready in time. Times are in milliseconds.
+    '''
+
+    tick: int
+    waited_ms: float # the time spent waiting for the late blockmap
+    generation_elapsed_ms: float # the time the blockmap being generated had taken so far, 0 if the generator was idle
+    time_to_consume_ms: float
+    pool_size: int
+
+    def __init__(self, tick: int, waited_ms: float, generation_elapsed_ms: float, time_to_consume_ms: float, pool_size: int):
+        self.tick = tick
+        self.waited_ms = waited_ms
+        self.generation_elapsed_ms = generation_elapsed_ms
+        self.time_to_consume_ms = time_to_consume_ms
+        self.pool_size = pool_size
+
+    def __str__(self) -> str:
+        return (
+            f"tick {self.tick}: waited {self.waited_ms:.1f} ms, "
+            f"generation running for {self.generation_elapsed_ms:.1f} ms, "
+            f"time to consume {self.time_to_consume_ms:.0f} ms, pool size {self.pool_size}"
+        )
+
+class BlockMapPoolMetrics:
+    '''
+    Statistics of the blockmap prefetch pool of a BlockMapManager. Times are in milliseconds.
+
+    The pool grows when the peak generation latency gets close to the time the player takes to pass a blockmap, and shrinks when it's far from it, within BLOCK_MAP_POOL_MEMORY_BUDGET.
+
+    The attributes are updated by BlockMapManager and are read-only to others.
+    '''
+
+    pool_size: int = 0 # the number of blockmaps owned by the manager
+    target_pool_size: int = BLOCK_MAP_POOL_MIN_SIZE
+    ready_depth: int = 0 # the number of generated blockmaps waiting to be shown
+    min_ready_depth: Optional[int] = None # the lowest ready_depth seen when a blockmap was taken
+    generated_count: int = 0
+    generation_latency_ms: float = 0.0 # the latency of the last generation
+    generation_latency_avg_ms: float = 0.0
+    generation_latency_peak_ms: float = 0.0 # decays by GENERATION_LATENCY_PEAK_DECAY per generation
+    time_to_consume_ms: float = math.inf # the time the player takes to pass a blockmap at the current speed
+    starvation_count: int = 0 # the number of times an empty blockmap was shown because the generator was late
+    starvation_events: Deque[StarvationEvent] # the last STARVATION_EVENT_HISTORY starvations
+    stall_count: int = 0 # the number of generations that took longer than the time to consume a blockmap
+
+    def __init__(self):
+        self.starvation_events = deque(maxlen = STARVATION_EVENT_HISTORY)
+
+    @property
+    def headroom(self) -> float:
+        '''
+        Returns how many times the peak generation latency fits in the time to consume a blockmap. The generator can't keep up in the long run if it's less than 1.
+        '''
 
-BLOCK_MAP_POOL_SIZE = 2 + 2
-_blockmap_pool: List[BlockMap] = [
-    BlockMap() for _ in range(BLOCK_MAP_POOL_SIZE)
-]
+        if self.generation_latency_peak_ms == 0.0:
+            return math.inf
+        return self.time_to_consume_ms / self.generation_latency_peak_ms
+
+    def record_generation(self, latency_ms: float):
+        self.generation_latency_ms = latency_ms
+        if self.generated_count == 0:
+            self.generation_latency_avg_ms = latency_ms
+        else:
+            self.generation_latency_avg_ms += GENERATION_LATENCY_AVG_WEIGHT * (
+                latency_ms - self.generation_latency_avg_ms)
+        self.generation_latency_peak_ms = max(
+            latency_ms, self.generation_latency_peak_ms * GENERATION_LATENCY_PEAK_DECAY)
+        self.generated_count += 1
+
+    def __str__(self) -> str:
+        return (
+            f"pool: {self.pool_size}/{self.target_pool_size}, "
+            f"ready: {self.ready_depth} (min {self.min_ready_depth}), "
+            f"generation: {self.generation_latency_avg_ms:.1f} ms (peak {self.generation_latency_peak_ms:.1f} ms), "
+            f"time to consume: {self.time_to_consume_ms:.0f} ms, "
+            f"headroom: {self.headroom:.1f}x, "
+            f"starvations: {self.starvation_count}, stalls: {self.stall_count}"
+        )
 
 class BlockMapManager(SingletonEntity, DynamicEntity):
     '''
     A manager of all block maps in a game scene.
     '''
+
+    tick_order = 0 # swaps the block maps before they move
     
     __blockmap1: BlockMap # a blockmap closer to the player
     __blockmap2: BlockMap # a blockmap farther away the player
-    __ready_blockmaps: Queue[BlockMap] # generated blockmaps ready to use
-    __unready_blockmaps: Queue[BlockMap] # blockmaps that need to be generated
+    __ready_blockmaps: HandoffQueue[BlockMap] # generated blockmaps ready to use
+    __unready_blockmaps: HandoffQueue[BlockMap] # blockmaps that need to be generated
 
     __is_stopped: bool = False
 
+    __metrics: BlockMapPoolMetrics
+    __generation_starttime_ns: int = 0 # 0 while the generator is idle
+    __reported_stall_starttime_ns: int = 0
+
+    __swap_count: int = 0 # the number of times blockmap2 has been replaced
+    __starved_swaps: List[int] # the indices of the swaps that fell back to an empty blockmap
+    __replayed_starved_swaps: Optional[Set[int]] = None
+    __replay_error: Optional[str] = None
+
     @property
     def is_stopped(self):
         return self.__is_stopped
@@ -193,18 +466,46 @@ class BlockMapManager(SingletonEntity, DynamicEntity):
     def is_stopped(self, stopped: bool):
         self.__is_stopped = stopped
 
+    @property
+    def metrics(self) -> BlockMapPoolMetrics:
+        return self.__metrics
+
+    @property
+    def starved_swaps(self) -> List[int]:
+        '''
+        Returns the indices of the blockmap swaps that fell back to an empty blockmap, which a replay needs to reproduce the run.
+        '''
+
+        return self.__starved_swaps
+
+    @property
+    def replay_error(self) -> Optional[str]:
+        '''
+        Returns why the replay can't be reproduced anymore, or None. The swaps fall back to an empty blockmap from then on.
+        '''
+
+        return self.__replay_error
+
+    def replay_starvations(self, starved_swaps: List[int]):
+        '''
+        Make the swaps deterministic for a replay: the swaps of the given indices fall back to an empty blockmap and the others wait for the generator, up to REPLAY_BLOCKMAP_WAIT_TIMEOUT, see replay_error.
+        '''
+
+        self.__replayed_starved_swaps = set(starved_swaps)
+
     def launch(self, init_callback: Callable[[BlockMap], None]):
-        global _blockmap_pool
+        self.__starved_swaps = []
+        self.__metrics = BlockMapPoolMetrics()
+        self.__metrics.pool_size = BLOCK_MAP_POOL_MIN_SIZE
 
-        # get all blockmaps from the pool.
-        self.__blockmap1 = _blockmap_pool.pop()
+        self.__blockmap1 = _acquire_blockmap()
         self.__blockmap1.refresh()
-        self.__blockmap1.offset_x = Decimal(0)
-        self.__blockmap2 = _blockmap_pool.pop()
-        self.__ready_blockmaps = Queue()
-        self.__unready_blockmaps = Queue()
-        while len(_blockmap_pool) > 0:
-            self.__unready_blockmaps.put(_blockmap_pool.pop())
+        self.__blockmap1.offset_x = 0
+        self.__blockmap2 = _acquire_blockmap()
+        self.__ready_blockmaps = HandoffQueue()
+        self.__unready_blockmaps = HandoffQueue()
+        for _ in range(BLOCK_MAP_POOL_MIN_SIZE - 2):
+            self.__unready_blockmaps.put(_acquire_blockmap())
         init_callback(self.__blockmap2)
 
     def on_destroy(self):
@@ -212,68 +513,191 @@ class BlockMapManager(SingletonEntity, DynamicEntity):
         super().on_destroy()
         global _blockmap_pool
 
+        self.stop_generation()
+
         # return all blockmaps to the pool.
         self.__blockmap1.recycle()
         self.__blockmap2.recycle()
         
-        _blockmap_pool += (self.__blockmap1, self.__blockmap2)
-        while len(_blockmap_pool) != BLOCK_MAP_POOL_SIZE:
-            try:
-                bmap = self.__ready_blockmaps.get_nowait()
-                bmap.recycle()
-                _blockmap_pool.append(bmap)
-            except:
-                pass
-            try:
-                bmap = self.__unready_blockmaps.get_nowait()
-                _blockmap_pool.append(bmap)
-            except:
-                pass
-        
+        blockmaps = [self.__blockmap1, self.__blockmap2]
+        deadline = time.perf_counter() + GENERATION_STOP_TIMEOUT
+        while len(blockmaps) != self.__metrics.pool_size:
+            bmap = self.__unready_blockmaps.get_nowait()
+            if bmap != None:
+                blockmaps.append(bmap)
+                continue
+            # wait for the blockmap being generated, if any, unless the generator has died.
+            bmap = self.__ready_blockmaps.get(max(0.0, deadline - time.perf_counter()))
+            if bmap == None:
+                print(f"WARNING: The blockmap generator didn't return {self.__metrics.pool_size - len(blockmaps)} blockmaps in {GENERATION_STOP_TIMEOUT} s, they're left to it.")
+                break
+            bmap.recycle()
+            blockmaps.append(bmap)
+        _blockmap_pool += blockmaps
+        del _blockmap_pool[BLOCK_MAP_POOL_MAX_SIZE:]
+
+    def test_touch_block(self, x: int, y: int) -> bool:
+        '''
+        Returns whether there's a block at the specified world position in sub-pixels.
+        '''
 
-    def __test_touch_block_for_blockmap(self, bmap: BlockMap, x: Decimal, y: Decimal) -> bool:
-        bpos_x, bpos_y = bmap.pos_world_to_block(x, y)
-        if bpos_x < 0 or bpos_x >= BLOCK_MAP_WIDTH:
+        if y < 0 or y >= BLOCK_MAP_SURFACE_HEIGHT_FIXED:
             return False
-        if bpos_y < 0 or bpos_y >= BLOCK_MAP_HEIGHT:
-            return False
-        block = bmap.get_block(bpos_x, bpos_y)
-        return block != None
-
-    def test_touch_block(self, x: Decimal, y: Decimal) -> bool:
-        if self.__test_touch_block_for_blockmap(self.__blockmap1, x, y):
-            return True
-        if self.__test_touch_block_for_blockmap(self.__blockmap2, x, y):
-            return True
+        bit = 1 << (y // BLOCK_SIDE_LEN_FIXED)
+        bmap = self.__blockmap1
+        bpos_x = (x - bmap.offset_x) // BLOCK_SIDE_LEN_FIXED
+        if 0 <= bpos_x < BLOCK_MAP_WIDTH:
+            return bmap.column_masks[bpos_x] & bit != 0
+        bmap = self.__blockmap2
+        bpos_x = (x - bmap.offset_x) // BLOCK_SIDE_LEN_FIXED
+        if 0 <= bpos_x < BLOCK_MAP_WIDTH:
+            return bmap.column_masks[bpos_x] & bit != 0
         return False
 
     def on_tick(self):
-        dt = gamebase.TICK_TIME
+        metrics = self.__metrics
+        self.__watch_generation()
         if self.__blockmap1.is_invalid:
-            unready_blockmap = self.__blockmap1
-            unready_blockmap.recycle()
-            self.__unready_blockmaps.put(unready_blockmap)
+            passed_blockmap = self.__blockmap1
+            passed_blockmap.recycle()
             self.__blockmap1 = self.__blockmap2
-            self.__blockmap2 = self.__ready_blockmaps.get()
-        
+            next_blockmap = self.__take_ready_blockmap()
+            if next_blockmap == None:
+                # show the passed blockmap again, empty, instead of freezing the game.
+                passed_blockmap.refresh()
+                next_blockmap = passed_blockmap
+            else:
+                self.__update_target_pool_size()
+                if metrics.pool_size > metrics.target_pool_size:
+                    # shrink the pool by dropping the passed blockmap.
+                    metrics.pool_size -= 1
+                else:
+                    self.__unready_blockmaps.put(passed_blockmap)
+            self.__blockmap2 = next_blockmap
+            self.__blockmap2.offset_x = self.__blockmap1.offset_x + BLOCK_MAP_SURFACE_WIDTH_FIXED
+            ready_depth = len(self.__ready_blockmaps)
+            if metrics.min_ready_depth == None or ready_depth < metrics.min_ready_depth:
+                metrics.min_ready_depth = ready_depth
+        elif (metrics.pool_size < metrics.target_pool_size
+              and not self.__is_stopped and not self.__unready_blockmaps.is_closed):
+            # grow the pool by one blockmap per tick, so that the allocation doesn't stall a single tick too long.
+            # Once the generation is stopped, a new blockmap would never be taken.
+            self.__unready_blockmaps.put(_acquire_blockmap())
+            metrics.pool_size += 1
+        metrics.ready_depth = len(self.__ready_blockmaps)
+
+    def on_render(self):
         screen = gamebase.get_screen()
-        screen.blit(
-            self.__blockmap1.surface, (int(self.__blockmap1.offset_x), 0)
-        )
-        screen.blit(
-            self.__blockmap2.surface, (int(self.__blockmap2.offset_x), 0)
-        )
+        gamebase.report_dirty_rect(screen.blit(
+            self.__blockmap1.surface, 
+            (fixedpoint.to_pixels(self.__blockmap1.offset_x), 0)
+        ))
+        gamebase.report_dirty_rect(screen.blit(
+            self.__blockmap2.surface, 
+            (fixedpoint.to_pixels(self.__blockmap2.offset_x), 0)
+        ))
         
-    def move(self, dx: Decimal):
+    def move(self, dx: int):
+        if dx > 0:
+            self.__metrics.time_to_consume_ms = (
+                BLOCK_MAP_SURFACE_WIDTH_FIXED * 1000 / (dx * gamebase.TICK_RATE))
         self.__blockmap1.move(dx)
-        self.__blockmap2.offset_x = self.__blockmap1.offset_x + BLOCK_MAP_SURFACE_WIDTH
+        self.__blockmap2.offset_x = self.__blockmap1.offset_x + BLOCK_MAP_SURFACE_WIDTH_FIXED
 
     def try_get_unready_blockmap(self) -> Optional[BlockMap]:
-        try:
-            return self.__unready_blockmaps.get_nowait()
-        except:
-            return None
+        return self.__unready_blockmaps.get_nowait()
+    
+    def wait_unready_blockmap(self) -> Optional[BlockMap]:
+        '''
+        Returns a blockmap that needs to be generated, blocking the calling thread until there's one.
+
+        Returns:
+            The blockmap, or None once stop_generation has been called.
+        '''
+
+        blockmap = self.__unready_blockmaps.get()
+        if blockmap != None:
+            self.__generation_starttime_ns = time.perf_counter_ns()
+        return blockmap
     
     def put_ready_blockmap(self, blockmap: BlockMap):
+        self.__metrics.record_generation(
+            (time.perf_counter_ns() - self.__generation_starttime_ns) / 1e6)
+        self.__generation_starttime_ns = 0
         self.__ready_blockmaps.put(blockmap)
-    
\ No newline at end of file
+
+    def stop_generation(self):
+        '''
+        Wake up the generator waiting in wait_unready_blockmap and make it return None from now on.
+        '''
+
+        self.__unready_blockmaps.close()
+
+    def __take_ready_blockmap(self) -> Optional[BlockMap]:
+        '''
+        Returns the next generated blockmap, waiting at most READY_BLOCKMAP_WAIT_TIMEOUT for a late one.
+
+        Returns:
+            The blockmap, or None if the generator is starved, which is recorded in the metrics.
+        '''
+
+        swap_index = self.__swap_count
+        self.__swap_count += 1
+        replayed_starved_swaps = self.__replayed_starved_swaps
+        if replayed_starved_swaps != None:
+            if swap_index in replayed_starved_swaps:
+                self.__starved_swaps.append(swap_index)
+                return None
+            if self.__replay_error != None:
+                return None
+            blockmap = self.__ready_blockmaps.get(REPLAY_BLOCKMAP_WAIT_TIMEOUT)
+            if blockmap == None:
+                self.__replay_error = f"no blockmap was generated for the swap {swap_index} in {REPLAY_BLOCKMAP_WAIT_TIMEOUT} s"
+                print(f"WARNING: The replay can't be reproduced: {self.__replay_error}.")
+            return blockmap
+
+        blockmap = self.__ready_blockmaps.get_nowait()
+        if blockmap != None:
+            return blockmap
+        wait_starttime_ns = time.perf_counter_ns()
+        blockmap = self.__ready_blockmaps.get(READY_BLOCKMAP_WAIT_TIMEOUT)
+        if blockmap != None:
+            return blockmap
+
+        now_ns = time.perf_counter_ns()
+        generation_starttime_ns = self.__generation_starttime_ns
+        metrics = self.__metrics
+        event = StarvationEvent(
+            gamebase.get_tick_count(),
+            (now_ns - wait_starttime_ns) / 1e6,
+            0.0 if generation_starttime_ns == 0 else (now_ns - generation_starttime_ns) / 1e6,
+            metrics.time_to_consume_ms,
+            metrics.pool_size
+        )
+        metrics.starvation_count += 1
+        metrics.starvation_events.append(event)
+        self.__starved_swaps.append(swap_index)
+        print(f"WARNING: No blockmap was ready in time, an empty one is shown. {event}")
+        return None
+
+    def __watch_generation(self):
+        '''
+        Warn once for every generation that runs longer than the time to consume a blockmap, before it causes a starvation.
+        '''
+
+        starttime_ns = self.__generation_starttime_ns
+        if starttime_ns == 0 or starttime_ns == self.__reported_stall_starttime_ns:
+            return
+        metrics = self.__metrics
+        elapsed_ms = (time.perf_counter_ns() - starttime_ns) / 1e6
+        if elapsed_ms > metrics.time_to_consume_ms:
+            self.__reported_stall_starttime_ns = starttime_ns
+            metrics.stall_count += 1
+            print(f"WARNING: A blockmap generation has been running for {elapsed_ms:.0f} ms, longer than the time to consume a blockmap({metrics.time_to_consume_ms:.0f} ms).")
+
+    def __update_target_pool_size(self):
+        metrics = self.__metrics
+        if metrics.generated_count == 0:
+            return
+        metrics.target_pool_size = get_target_pool_size(
+            metrics.generation_latency_peak_ms, metrics.time_to_consume_ms)
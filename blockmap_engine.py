@@ -0,0 +1,538 @@
+'''
+This module contains the block map generation algorithm.
+
+It doesn't import pygame or any game module, so that it can run in a worker process. All positions, speeds and timers are fixed-point ints, see the module fixedpoint.
+'''
+
+import atexit
+import math
+import multiprocessing
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+import random
+from typing import List, Optional, Tuple
+
+# (speed_x, speed_y, pos_y, offset_x, simulated_ticks) of the simulated player, which is carried from one map to the next
+EngineState = Tuple[int, int, int, int, int]
+
+GENERATION_PROCESS_RESPONSE_TIMEOUT = 5.0 # s, a GenerationProcess waits so long for an answer to a request other than generate
+
+class GenerationParams:
+    '''
+    The constants the generation algorithm depends on.
+    '''
+
+    map_width: int
+    map_height: int
+    block_side_len: int
+    tick_rate: int
+    gravity_accel: int
+    jump_speed: int
+    initial_speed: int
+    max_speed: int
+    speed_accel: int
+    pos_y_min: int
+    pos_y_max: int
+    pos_y_jumpable_min: int
+    jump_interval_min: float
+    jump_interval_max: float
+    path_y_offset_range_start: Tuple[float, float]
+    path_y_offset_range_end: Tuple[float, float]
+    path_y_offset_to_end_ticks: int
+
+    def __init__(self, **kwargs):
+        for name in GenerationParams.__annotations__:
+            setattr(self, name, kwargs[name])
+
+    @property
+    def map_size(self) -> int:
+        return self.map_width * self.map_height
+
+def _get_ticks_to_height(pos_y: int, speed_y: int, g_accel: int, height: int) -> int:
+    '''
+    Returns the first tick from 1 that a falling player is at or below the given height. The player must get there.
+
+    The speed is added before the position every tick, so the height after t ticks is pos_y + t * speed_y + g_accel * t * (t + 1) / 2.
+    '''
+
+    def is_reached(ticks: int) -> bool:
+        return pos_y + ticks * speed_y + g_accel * ticks * (ticks + 1) // 2 >= height
+
+    if is_reached(1):
+        return 1
+    # the height only goes down from this tick, so the root can be corrected to an exact one around it
+    min_ticks = max(-((speed_y + g_accel) // g_accel), 1)
+    b = speed_y + g_accel / 2
+    ticks = max(math.ceil((-b + math.sqrt(max(b * b + 2 * g_accel * (height - pos_y), 0))) / g_accel), min_ticks)
+    while ticks > min_ticks and is_reached(ticks - 1):
+        ticks -= 1
+    while not is_reached(ticks):
+        ticks += 1
+    return ticks
+
+class BlockMapEngine:
+    '''
+    Generates block maps by simulating a player that jumps randomly and leaving blocks out of its path.
+
+    The state of the simulated player is carried from one map to the next, so that consecutive maps join up. All randomness comes from a random.Random seeded at the construction, so the same seed always generates the same sequence of maps.
+
+    The path through each map is traced in closed form by default. The per-tick simulation it's derived from is kept as the reference and gives exactly the same maps.
+    '''
+
+    __params: GenerationParams
+    __random: random.Random
+
+    __player_speed_x: int
+    __player_speed_y: int = 0
+    __player_pos_y: int
+    __player_offset_x: int = 0
+    __simulated_ticks: int = 0 # the ticks the simulated player has run, which narrows the path gradually
+    __is_closed_form: bool = True
+
+    __player_path: List[Tuple[int, int]] # the index means the block position x and the element means (min_y, max_y)
+
+    def __init__(self, params: GenerationParams, seed: Optional[int] = None, is_closed_form: bool = True):
+        '''
+        Args:
+            params: The generation constants.
+            seed: The seed of the random number generator, or None to seed it from the system.
+            is_closed_form: Whether to trace the path in closed form instead of tick by tick.
+        '''
+
+        self.__params = params
+        self.__is_closed_form = is_closed_form
+        self.__random = random.Random(seed)
+        self.__player_speed_x = params.initial_speed
+        self.__player_pos_y = self.__random.randint(params.pos_y_min, params.pos_y_max)
+        self.__player_path = [None] * params.map_width # type:ignore
+
+    @property
+    def params(self) -> GenerationParams:
+        return self.__params
+
+    @property
+    def simulated_ticks(self) -> int:
+        return self.__simulated_ticks
+
+    @property
+    def state(self) -> EngineState:
+        '''
+        Returns the state of the simulated player at the start of the next map.
+        '''
+
+        return (
+            self.__player_speed_x, self.__player_speed_y, self.__player_pos_y,
+            self.__player_offset_x, self.__simulated_ticks
+        )
+
+    @state.setter
+    def state(self, state: EngineState):
+        '''
+        Continue from the given state, e.g. the end of a map generated by another engine.
+        '''
+
+        (
+            self.__player_speed_x, self.__player_speed_y, self.__player_pos_y,
+            self.__player_offset_x, self.__simulated_ticks
+        ) = state
+
+    def generate(self, occupancy, colors):
+        '''
+        Generate the next block map into the given buffers.
+
+        Args:
+            occupancy: A writable buffer of map_size bytes, laid out as BlockMap's occupancy buffer.
+            colors: A writable buffer of map_size * 4 bytes, laid out as BlockMap's color buffer.
+        '''
+
+        if self.__is_closed_form:
+            self.__trace_path_closed_form()
+        else:
+            self.__trace_path_per_tick()
+
+        params = self.__params
+        map_width = params.map_width
+        map_height = params.map_height
+        rng = self.__random
+        elapsed_ticks = self.__simulated_ticks
+
+        occupancy[:] = bytes(params.map_size)
+        colors[:] = bytes(params.map_size * 4)
+        for x in range(map_width):
+            player_y_min, player_y_max = self.__player_path[x]
+            player_y_min -= self.__get_player_path_y_offset(elapsed_ticks)
+            player_y_max += self.__get_player_path_y_offset(elapsed_ticks)
+            if player_y_min > 0:
+                y_min_exc = player_y_min
+                color = (
+                    rng.randint(0, 128),
+                    rng.randint(0, 128),
+                    rng.randint(0, 128)
+                )
+                for y in reversed(range(y_min_exc)):
+                    occupancy[x * map_height + y] = 1
+                    i = (y * map_width + x) * 4
+                    colors[i:i + 4] = bytes((color[0], color[1], color[2], 255))
+                    color = tuple(
+                        max(comp - rng.randint(0, 50), 0) for comp in color
+                    )
+            if player_y_max < map_height - 1:
+                y_max = player_y_max + 1
+                color = (
+                    rng.randint(0, 128),
+                    rng.randint(0, 128),
+                    rng.randint(0, 128)
+                )
+                for y in range(y_max, map_height):
+                    occupancy[x * map_height + y] = 1
+                    i = (y * map_width + x) * 4
+                    colors[i:i + 4] = bytes((color[0], color[1], color[2], 255))
+                    color = tuple(
+                        max(comp - rng.randint(0, 50), 0) for comp in color
+                    )
+
+    def __trace_path_per_tick(self):
+        '''
+        Trace the path of the simulated player through the next map by stepping it tick by tick. It's the reference of __trace_path_closed_form.
+        '''
+
+        params = self.__params
+        map_width = params.map_width
+        block_side_len = params.block_side_len
+        jump_speed = params.jump_speed
+        max_speed = params.max_speed
+        speed_accel = params.speed_accel
+        g_accel = params.gravity_accel
+        pos_y_max = params.pos_y_max
+        pos_y_jumpable_min = params.pos_y_jumpable_min
+        speed_x = self.__player_speed_x
+        speed_y = self.__player_speed_y
+        pos_y = self.__player_pos_y
+        offset_x = self.__player_offset_x
+        elapsed_ticks = self.__simulated_ticks
+
+        bpos_x = 0
+        bpos_y_min: int = None # type:ignore
+        bpos_y_max: int = None # type:ignore
+        jump_timer = self.__get_next_jump_time()
+        while True:
+            if offset_x >= block_side_len:
+                offset_x -= block_side_len
+                self.__player_path[bpos_x] = (bpos_y_min, bpos_y_max)
+                bpos_x += 1
+                if bpos_x >= map_width:
+                    break
+                bpos_y_min = None # type:ignore
+                bpos_y_max = None # type:ignore
+            player_bpos_y = pos_y // block_side_len
+            if bpos_y_min == None or player_bpos_y < bpos_y_min:
+                bpos_y_min = player_bpos_y
+            if bpos_y_max == None or player_bpos_y > bpos_y_max:
+                bpos_y_max = player_bpos_y
+            if jump_timer <= 0:
+                jump_timer = self.__get_next_jump_time()
+                if pos_y > pos_y_jumpable_min:
+                    speed_y = -jump_speed
+            elif pos_y >= pos_y_max:
+                jump_timer = self.__get_next_jump_time()
+                speed_y = -jump_speed
+            jump_timer -= 1
+            elapsed_ticks += 1
+            speed_y += g_accel
+            pos_y += speed_y
+            if speed_x < max_speed:
+                speed_x += speed_accel
+                if speed_x > max_speed:
+                    speed_x = max_speed
+            offset_x += speed_x
+
+        self.__player_speed_x = speed_x
+        self.__player_speed_y = speed_y
+        self.__player_pos_y = pos_y
+        self.__player_offset_x = offset_x
+        self.__simulated_ticks = elapsed_ticks
+
+    def __trace_path_closed_form(self):
+        '''
+        Trace the same path as __trace_path_per_tick without stepping the height every tick.
+
+        Between two jumps, the height after j ticks is pos_y + j * speed_y + gravity_accel * j * (j + 1) / 2, so the tick the player hits the bottom is a root of a quadratic, and the min and max heights in a column are at the ends of its ticks or next to the vertex. The jump timers are drawn in the same order as the per-tick simulation, so both trace exactly the same path.
+        '''
+
+        params = self.__params
+        map_width = params.map_width
+        block_side_len = params.block_side_len
+        jump_speed = params.jump_speed
+        max_speed = params.max_speed
+        speed_accel = params.speed_accel
+        g_accel = params.gravity_accel
+        pos_y_max = params.pos_y_max
+        pos_y_jumpable_min = params.pos_y_jumpable_min
+        speed_x = self.__player_speed_x
+        speed_y = self.__player_speed_y
+        pos_y = self.__player_pos_y
+        offset_x = self.__player_offset_x
+
+        # the horizontal offset doesn't depend on the jumps. It grows by t * speed_x + speed_accel * t * (t + 1) / 2 in t ticks until the max speed, and linearly after it.
+        map_len = map_width * block_side_len
+        if speed_x < max_speed and speed_accel > 0:
+            accel_ticks = (max_speed - speed_x) // speed_accel
+            linear_speed = max_speed
+        else:
+            accel_ticks = 0
+            linear_speed = speed_x
+        accel_end = offset_x + accel_ticks * speed_x + speed_accel * accel_ticks * (accel_ticks + 1) // 2
+        b = speed_x + speed_accel / 2
+        # column_ticks[x] is the first tick in the column x, and column_ticks[map_width] is the tick the map ends
+        column_ticks = [0] * (map_width + 1)
+        for x in range(1, map_width + 1):
+            offset = x * block_side_len
+            if offset > accel_end:
+                column_ticks[x] = accel_ticks - (accel_end - offset) // linear_speed
+                continue
+            ticks = math.ceil((-b + math.sqrt(b * b + 2 * speed_accel * (offset - offset_x))) / speed_accel)
+            # correct the rounding error of the float root
+            while offset_x + ticks * speed_x + speed_accel * ticks * (ticks + 1) // 2 < offset:
+                ticks += 1
+            while ticks > 0 and offset_x + (ticks - 1) * speed_x + speed_accel * (ticks - 1) * ticks // 2 >= offset:
+                ticks -= 1
+            column_ticks[x] = ticks
+        end_tick = column_ticks[map_width]
+
+        # (first tick, end tick, pos_y, speed_y) of each jump segment, the speed is the one after the jump
+        segments: List[Tuple[int, int, int, int]] = []
+        tick = 0
+        jump_timer = self.__get_next_jump_time()
+        while tick < end_tick:
+            if jump_timer <= 0:
+                jump_timer = self.__get_next_jump_time()
+                if pos_y > pos_y_jumpable_min:
+                    speed_y = -jump_speed
+            elif pos_y >= pos_y_max:
+                jump_timer = self.__get_next_jump_time()
+                speed_y = -jump_speed
+            ticks = min(max(jump_timer, 1), end_tick - tick)
+            # the height is convex in the ticks, so it reaches the bottom before the timer iff it's there at either end
+            if ticks >= 2 and (
+                pos_y + speed_y + g_accel >= pos_y_max or
+                pos_y + (ticks - 1) * speed_y + g_accel * (ticks - 1) * ticks // 2 >= pos_y_max
+            ):
+                ticks = _get_ticks_to_height(pos_y, speed_y, g_accel, pos_y_max)
+            segments.append((tick, tick + ticks, pos_y, speed_y))
+            pos_y += ticks * speed_y + g_accel * ticks * (ticks + 1) // 2
+            speed_y += g_accel * ticks
+            jump_timer -= ticks
+            tick += ticks
+
+        path = self.__player_path
+        segment_index = 0
+        segment_start, segment_end, segment_pos_y, segment_speed_y = segments[0]
+        for x in range(map_width):
+            column_start = column_ticks[x]
+            column_end = column_ticks[x + 1]
+            y_min = None
+            y_max = None
+            while True:
+                first = (column_start if column_start > segment_start else segment_start) - segment_start
+                last = (column_end if column_end < segment_end else segment_end) - 1 - segment_start
+                y_first = segment_pos_y + first * segment_speed_y + g_accel * first * (first + 1) // 2
+                y_last = segment_pos_y + last * segment_speed_y + g_accel * last * (last + 1) // 2
+                # the vertex of the parabola is at -speed_y / g_accel - 1 / 2 ticks
+                vertex = (-2 * segment_speed_y - g_accel) // (2 * g_accel)
+                if first <= vertex < last:
+                    # the min is at one of the ticks around the vertex, and they differ by speed_y + g_accel * (vertex + 1)
+                    low = segment_pos_y + vertex * segment_speed_y + g_accel * vertex * (vertex + 1) // 2
+                    if segment_speed_y + g_accel * (vertex + 1) < 0:
+                        low += segment_speed_y + g_accel * (vertex + 1)
+                elif y_first < y_last:
+                    low = y_first
+                else:
+                    low = y_last
+                high = y_last if y_first < y_last else y_first
+                if y_min == None or low < y_min:
+                    y_min = low
+                if y_max == None or high > y_max:
+                    y_max = high
+                if segment_end > column_end:
+                    break
+                segment_index += 1
+                if segment_index == len(segments):
+                    break
+                segment_start, segment_end, segment_pos_y, segment_speed_y = segments[segment_index]
+                if segment_start >= column_end:
+                    break
+            path[x] = (y_min // block_side_len, y_max // block_side_len) # type:ignore
+
+        if end_tick > accel_ticks:
+            offset_x = accel_end + (end_tick - accel_ticks) * linear_speed
+        else:
+            offset_x += end_tick * speed_x + speed_accel * end_tick * (end_tick + 1) // 2
+        if speed_x < max_speed:
+            speed_x = min(speed_x + speed_accel * end_tick, max_speed)
+        self.__player_speed_x = speed_x
+        self.__player_speed_y = speed_y
+        self.__player_pos_y = pos_y
+        self.__player_offset_x = offset_x - map_len
+        self.__simulated_ticks += end_tick
+
+    def __get_next_jump_time(self) -> int:
+        '''
+        Returns the number of ticks until the next jump.
+        '''
+
+        params = self.__params
+        SHORT_RANGE = (params.jump_interval_min, 0.5)
+        LONG_RANGE = (0.5, params.jump_interval_max)
+        SHORT_RANGE_PROB = 0.8
+        r = SHORT_RANGE if self.__random.random() <= SHORT_RANGE_PROB else LONG_RANGE
+        return math.ceil(self.__random.uniform(r[0], r[1]) * params.tick_rate)
+
+    def __get_player_path_y_offset(self, elapsed_ticks: int) -> int:
+        params = self.__params
+        start = params.path_y_offset_range_start
+        end = params.path_y_offset_range_end
+        to_end_ticks = params.path_y_offset_to_end_ticks
+        progress = min(elapsed_ticks, to_end_ticks) / to_end_ticks
+        offset_min = start[0] + (end[0] - start[0]) * progress
+        offset_max = start[1] + (end[1] - start[1]) * progress
+        return round(self.__random.uniform(offset_min, offset_max))
+
+def _run_worker_process(params: GenerationParams, shm_name: str, conn: Connection):
+    '''
+    The entry of the worker process of GenerationProcess.
+    '''
+
+    shm = shared_memory.SharedMemory(name = shm_name)
+    try:
+        map_size = params.map_size
+        occupancy = shm.buf[:map_size]
+        colors = shm.buf[map_size:map_size * 5]
+        engine = BlockMapEngine(params)
+        while True:
+            request = conn.recv()
+            if request == None:
+                break
+            command, arg = request
+            if command == "reset":
+                engine = BlockMapEngine(params, arg)
+            elif command == "set_state":
+                engine.state = arg
+            elif command == "generate":
+                engine.generate(occupancy, colors)
+            conn.send(command)
+        del occupancy
+        del colors
+    finally:
+        shm.close()
+
+class GenerationProcess:
+    '''
+    Runs a BlockMapEngine in a worker process, so that the generation doesn't compete with the game loop for the GIL.
+
+    A generated map is returned through a shared memory block holding the occupancy buffer followed by the color buffer. Only one request can be in flight at a time.
+    '''
+
+    __params: GenerationParams
+    __shm: shared_memory.SharedMemory
+    __conn: Connection
+    __process: multiprocessing.Process
+    __is_closed: bool = False
+
+    def __init__(self, params: GenerationParams):
+        self.__params = params
+        self.__shm = shared_memory.SharedMemory(
+            create = True, size = params.map_size * 5)
+        # spawn instead of fork: forking a process that runs SDL and threads isn't safe.
+        context = multiprocessing.get_context("spawn")
+        self.__conn, child_conn = context.Pipe()
+        self.__process = context.Process(
+            target = _run_worker_process,
+            args = (params, self.__shm.name, child_conn),
+            daemon = True
+        )
+        self.__process.start()
+        child_conn.close()
+
+    @property
+    def is_closed(self) -> bool:
+        return self.__is_closed
+
+    @property
+    def occupancy(self) -> memoryview:
+        '''
+        Returns the occupancy buffer of the last generated map.
+        '''
+
+        return self.__shm.buf[:self.__params.map_size]
+
+    @property
+    def colors(self) -> memoryview:
+        '''
+        Returns the color buffer of the last generated map.
+        '''
+
+        map_size = self.__params.map_size
+        return self.__shm.buf[map_size:map_size * 5]
+
+    def reset(self, seed: Optional[int]):
+        '''
+        Restart the engine with the given seed, e.g. for a new game.
+        '''
+
+        self.__conn.send(("reset", seed))
+        self.__receive_response(GENERATION_PROCESS_RESPONSE_TIMEOUT)
+
+    def set_state(self, state: EngineState):
+        '''
+        Make the engine continue from the given state, see BlockMapEngine.state.
+        '''
+
+        self.__conn.send(("set_state", state))
+        self.__receive_response(GENERATION_PROCESS_RESPONSE_TIMEOUT)
+
+    def generate(self):
+        '''
+        Generate the next map and wait until it's in the buffers.
+        '''
+
+        self.__conn.send(("generate", None))
+        self.__receive_response(None)
+
+    def __receive_response(self, timeout: Optional[float]):
+        if timeout != None and not self.__conn.poll(timeout):
+            raise TimeoutError(f"The generation process didn't respond in {timeout} s")
+        self.__conn.recv()
+
+    def terminate(self):
+        '''
+        Kill the worker process, e.g. when it doesn't respond. A call waiting for it raises EOFError or OSError. It must be closed afterwards.
+        '''
+
+        self.__process.kill()
+        self.__process.join()
+
+    def close(self):
+        if self.__is_closed:
+            return
+        self.__is_closed = True
+        try:
+            self.__conn.send(None)
+        except OSError:
+            pass
+        self.__process.join()
+        self.__conn.close()
+        self.__shm.close()
+        self.__shm.unlink()
+
+_generation_process: Optional[GenerationProcess] = None
+
+def get_generation_process(params: GenerationParams) -> GenerationProcess:
+    '''
+    Returns the shared GenerationProcess, starting it on the first call or after it has been closed. It's closed when the program exits.
+    '''
+
+    global _generation_process
+    if _generation_process == None or _generation_process.is_closed:
+        _generation_process = GenerationProcess(params)
+        atexit.register(_generation_process.close)
+    return _generation_process
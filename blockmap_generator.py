@@ -1,16 +1,18 @@
 from decimal import Decimal
-import decimal
+import os
 from threading import Thread
-import threading
-import time
-from typing import List, Tuple
+from typing import Optional
 import typing
 import gamebase
+import fixedpoint
 from scene import DynamicEntity, SingletonEntity
 import player
 import blockmap
-from blockmap import Block, BlockMap, BlockMapManager
-import random
+from blockmap import BlockMap, BlockMapManager
+import blockmap_engine
+from blockmap_engine import BlockMapEngine, EngineState, GenerationParams, GenerationProcess
+from chunklibrary import ChunkLibrary, ChunkLibraryFormatError, ChunkStitcher, CHUNK_LIBRARY_FILE_EXTENSION
+from runrecorder import RunRecorder
 
 from utils import DecimalVector2
 
@@ -19,36 +21,138 @@ PLAYER_POS_Y_MAX = gamebase.WINDOW_DIMENSION[1] - 60
 PLAYER_POS_Y_JUMPABLE_MIN = PLAYER_POS_Y_MIN + player.PLAYER_JUMP_HEIGHT + 1
 PLAYER_JUMP_INTERVAL_MIN = 0.2
 PLAYER_JUMP_INTERVAL_MAX = (
-        2 * (PLAYER_POS_Y_MAX - PLAYER_POS_Y_MIN) / 
+        2 * (PLAYER_POS_Y_MAX - PLAYER_POS_Y_MIN) /
         float(gamebase.GRAVITY_ACCEL)
     ) ** 0.5
 
 PLAYER_PATH_Y_OFFSET_RANGE_START = DecimalVector2(Decimal(1), Decimal(5))
 PLAYER_PATH_Y_OFFSET_RANGE_END = DecimalVector2(Decimal(0), Decimal(2))
 PLAYER_PATH_Y_OFFSET_TO_END_TIME = Decimal(120)
-PLAYER_PATH_Y_OFFSET_CHANGE_SPEED = (
-    PLAYER_PATH_Y_OFFSET_RANGE_END - PLAYER_PATH_Y_OFFSET_RANGE_START
-) / PLAYER_PATH_Y_OFFSET_TO_END_TIME
+PLAYER_PATH_Y_OFFSET_TO_END_TICKS = int(PLAYER_PATH_Y_OFFSET_TO_END_TIME * gamebase.TICK_RATE)
+
+# fixed-point versions of the constants above, used by the path simulation
+PLAYER_POS_Y_MIN_FIXED = fixedpoint.from_pixels(PLAYER_POS_Y_MIN)
+PLAYER_POS_Y_MAX_FIXED = fixedpoint.from_pixels(PLAYER_POS_Y_MAX)
+PLAYER_POS_Y_JUMPABLE_MIN_FIXED = fixedpoint.from_pixels(PLAYER_POS_Y_JUMPABLE_MIN)
+
+GENERATION_MODE_ENV_NAME = "DONT_TOUCH_BLOCKS_GENERATION"
+GENERATION_MODE_THREAD = "thread"
+GENERATION_MODE_PROCESS = "process"
+
+CHUNK_LIBRARY_PATH_ENV_NAME = "DONT_TOUCH_BLOCKS_CHUNK_LIBRARY"
+DEFAULT_CHUNK_LIBRARY_PATH = "blockmaps" + CHUNK_LIBRARY_FILE_EXTENSION
+
+_generation_mode: str = os.environ.get(GENERATION_MODE_ENV_NAME, GENERATION_MODE_THREAD)
+if _generation_mode not in (GENERATION_MODE_THREAD, GENERATION_MODE_PROCESS):
+    print(f"WARNING: Unknown generation mode {_generation_mode}, use {GENERATION_MODE_THREAD} instead.")
+    _generation_mode = GENERATION_MODE_THREAD
+
+def get_generation_mode() -> str:
+    '''
+    Returns where block maps are generated, GENERATION_MODE_THREAD or GENERATION_MODE_PROCESS.
+    '''
+
+    global _generation_mode
+    return _generation_mode
+
+def set_generation_mode(mode: str):
+    '''
+    Set where block maps are generated. It takes effect from the next spawned BlockMapGenerator.
+
+    In GENERATION_MODE_PROCESS, the path simulation and the block filling run in a worker process, so that they don't compete with the game loop for the GIL. Only the rasterization is left to the work thread.
+    '''
+
+    global _generation_mode
+    if mode not in (GENERATION_MODE_THREAD, GENERATION_MODE_PROCESS):
+        raise ValueError(f"Unknown generation mode {mode}!")
+    _generation_mode = mode
+
+def get_generation_params() -> GenerationParams:
+    '''
+    Returns the constants of the generation algorithm.
+    '''
+
+    start = PLAYER_PATH_Y_OFFSET_RANGE_START
+    end = PLAYER_PATH_Y_OFFSET_RANGE_END
+    return GenerationParams(
+        map_width = blockmap.BLOCK_MAP_WIDTH,
+        map_height = blockmap.BLOCK_MAP_HEIGHT,
+        block_side_len = blockmap.BLOCK_SIDE_LEN_FIXED,
+        tick_rate = gamebase.TICK_RATE,
+        gravity_accel = gamebase.GRAVITY_ACCEL_FIXED,
+        jump_speed = player.PLAYER_JUMP_SPEED_FIXED,
+        initial_speed = player.PLAYER_INITIAL_SPEED_FIXED,
+        max_speed = player.PLAYER_MAX_SPEED_FIXED,
+        speed_accel = player.PLAYER_SPEED_ACCEL_FIXED,
+        pos_y_min = PLAYER_POS_Y_MIN_FIXED,
+        pos_y_max = PLAYER_POS_Y_MAX_FIXED,
+        pos_y_jumpable_min = PLAYER_POS_Y_JUMPABLE_MIN_FIXED,
+        jump_interval_min = PLAYER_JUMP_INTERVAL_MIN,
+        jump_interval_max = PLAYER_JUMP_INTERVAL_MAX,
+        path_y_offset_range_start = (float(start.x), float(start.y)),
+        path_y_offset_range_end = (float(end.x), float(end.y)),
+        path_y_offset_to_end_ticks = PLAYER_PATH_Y_OFFSET_TO_END_TICKS
+    )
+
+_chunk_library: Optional[ChunkLibrary] = None
+_is_chunk_library_opened: bool = False
+
+def get_chunk_library() -> Optional[ChunkLibrary]:
+    '''
+    Returns the chunk library built by build_chunk_library.py, opening it on the first call, or None if there's no valid one.
+
+    It's read from the path in DONT_TOUCH_BLOCKS_CHUNK_LIBRARY, or DEFAULT_CHUNK_LIBRARY_PATH in the working directory if the variable isn't set. Setting the variable to an empty string disables the library.
+    '''
+
+    global _chunk_library
+    global _is_chunk_library_opened
+    if _is_chunk_library_opened:
+        return _chunk_library
+    _is_chunk_library_opened = True
+    path = os.environ.get(CHUNK_LIBRARY_PATH_ENV_NAME)
+    if path == None:
+        path = DEFAULT_CHUNK_LIBRARY_PATH
+        if not os.path.exists(path):
+            return None
+    if path == "":
+        return None
+    try:
+        _chunk_library = ChunkLibrary(path, get_generation_params())
+    except (OSError, ChunkLibraryFormatError) as e:
+        print(f"WARNING: Couldn't open the chunk library {path}, generate block maps live instead: {e}")
+    return _chunk_library
 
 class BlockMapGenerator(SingletonEntity, DynamicEntity):
+    '''
+    Generates block maps on a work thread with a BlockMapEngine, see the module blockmap_engine.
+
+    In the process generation mode, the engine runs in a worker process and the work thread only rasterizes its results.
+
+    The engine is seeded by the RunRecorder of the scene if there's one, so that the run can be replayed.
+
+    If there's a chunk library, see get_chunk_library, the maps are taken from it until its chains run out, and then the engine continues from where the last chunk ends. A replay uses the library only if it was recorded with the same one.
+    '''
+
+    tick_order = 10 # moves the block maps after they're swapped
+
     __blockmap_manager: BlockMapManager
 
-    __blockmap_speed: Decimal = player.PLAYER_INITIAL_SPEED
+    __blockmap_speed: int = player.PLAYER_INITIAL_SPEED_FIXED
 
-    __player_speed_x: Decimal = player.PLAYER_INITIAL_SPEED
-    __player_speed_y: Decimal = Decimal(0)
-    __player_pos_y: Decimal
-    __player_offset_x: Decimal = Decimal(0)
-    
-    __player_path: List[Tuple[int, int]] # the index means the block position x and the element means (min_y, max_y)
-    __player_path_y_offset_range: DecimalVector2 = PLAYER_PATH_Y_OFFSET_RANGE_START
-    __player_path_y_offset_range_is_changing: bool = True
+    __seed: Optional[int] = None
+    __stitcher: Optional[ChunkStitcher] = None
+    __engine: Optional[BlockMapEngine] = None
+    __process: Optional[GenerationProcess] = None
+    __occupancy: bytearray
+    __colors: bytearray
 
     __work_thread: Thread
-    __thread_stop_flag: bool = False
 
     @property
-    def player_speed(self) -> Decimal:
+    def player_speed(self) -> int:
+        '''
+        Returns the scroll speed of block maps in sub-pixels per tick.
+        '''
 
         return self.__blockmap_speed
 
@@ -57,133 +161,110 @@ class BlockMapGenerator(SingletonEntity, DynamicEntity):
         self.__blockmap_manager = typing.cast(
             BlockMapManager, self.scene.get_singleton_entity(BlockMapManager)
         )
-        self.__player_pos_y = Decimal(
-            random.uniform(
-                PLAYER_POS_Y_MIN, PLAYER_POS_Y_MAX
-            )
+        recorder = typing.cast(
+            Optional[RunRecorder], self.scene.get_singleton_entity(RunRecorder)
         )
-        self.__player_path = [None] * blockmap.BLOCK_MAP_WIDTH # type:ignore
+        self.__seed = None if recorder == None else recorder.seed
+        library = get_chunk_library()
+        if recorder != None and recorder.is_replaying:
+            library_id = recorder.record.chunk_library_id
+            if library_id == 0:
+                library = None
+            elif library == None or library.library_id != library_id:
+                print(f"WARNING: The replay was recorded with the chunk library {library_id:016x}, which isn't available.")
+                library = None
+        elif recorder != None and library != None:
+            recorder.record.chunk_library_id = library.library_id
+        if library != None:
+            self.__stitcher = ChunkStitcher(library, self.__seed)
+        else:
+            self.__start_live_generation(None)
         self.__blockmap_manager.launch(
             lambda initial_bmap: self.__generate(initial_bmap)
         )
-        self.__work_thread = Thread(target = self.__run_work_thread)
+        # a daemon, so that a work thread left behind by on_destroy doesn't keep the program running
+        self.__work_thread = Thread(target = self.__run_work_thread, daemon = True)
         self.__work_thread.start()
 
     def on_destroy(self):
         super().on_destroy()
-        self.__thread_stop_flag = True
-        self.__work_thread.join()
+        self.__blockmap_manager.stop_generation()
+        work_thread = self.__work_thread
+        work_thread.join(blockmap.GENERATION_STOP_TIMEOUT)
+        if not work_thread.is_alive():
+            return
+        process = self.__process
+        if process == None:
+            print(f"WARNING: The blockmap generation didn't stop in {blockmap.GENERATION_STOP_TIMEOUT} s, its work thread is left behind.")
+            return
+        # the worker process hangs, so the work thread waits for it forever.
+        print(f"WARNING: The blockmap generation process didn't respond in {blockmap.GENERATION_STOP_TIMEOUT} s, it's terminated.")
+        process.terminate()
+        work_thread.join(blockmap.GENERATION_STOP_TIMEOUT)
+        process.close()
 
     def on_tick(self):
-        dt = gamebase.TICK_TIME
-
-        if self.__blockmap_speed < player.PLAYER_MAX_SPEED:
-            self.__blockmap_speed += player.PLAYER_SPEED_ACCEL * dt
-            if self.__blockmap_speed > player.PLAYER_MAX_SPEED:
-                self.__blockmap_speed = player.PLAYER_MAX_SPEED
-        self.__blockmap_manager.move(self.__blockmap_speed * dt)
+        if self.__blockmap_speed < player.PLAYER_MAX_SPEED_FIXED:
+            self.__blockmap_speed += player.PLAYER_SPEED_ACCEL_FIXED
+            if self.__blockmap_speed > player.PLAYER_MAX_SPEED_FIXED:
+                self.__blockmap_speed = player.PLAYER_MAX_SPEED_FIXED
+        self.__blockmap_manager.move(self.__blockmap_speed)
 
-        if self.__player_path_y_offset_range_is_changing:
-            self.__player_path_y_offset_range += typing.cast(DecimalVector2, PLAYER_PATH_Y_OFFSET_CHANGE_SPEED * dt)
-            if self.__player_path_y_offset_range.x <= PLAYER_PATH_Y_OFFSET_RANGE_END.x:
-                self.__player_path_y_offset_range = PLAYER_PATH_Y_OFFSET_RANGE_END
-                self.__player_path_y_offset_range_is_changing = False
 
-    
     def __run_work_thread(self):
         blockmap_manager = self.__blockmap_manager
         while True:
-            time.sleep(0.001)
-            if self.__thread_stop_flag:
-                break
-            bmap = blockmap_manager.try_get_unready_blockmap()
+            bmap = blockmap_manager.wait_unready_blockmap()
             if bmap == None:
-                continue
-            self.__generate(bmap)
+                break
+            try:
+                self.__generate(bmap)
+            except (EOFError, OSError) as e:
+                # the worker process has died or been terminated, so the manager falls back to empty blockmaps.
+                print(f"WARNING: The blockmap generation process has stopped: {e!r}")
+                break
             blockmap_manager.put_ready_blockmap(bmap)
-            #time.sleep(0.001)
-            
+
+    def __start_live_generation(self, state: Optional[EngineState]):
+        params = get_generation_params()
+        if get_generation_mode() == GENERATION_MODE_PROCESS:
+            process = blockmap_engine.get_generation_process(params)
+            try:
+                process.reset(self.__seed)
+            except (EOFError, OSError) as e:
+                # the shared process has died or hangs since an earlier scene, e.g. after on_destroy left it idle.
+                print(f"WARNING: The blockmap generation process doesn't respond, it's restarted: {e!r}")
+                process.terminate()
+                process.close()
+                process = blockmap_engine.get_generation_process(params)
+                process.reset(self.__seed)
+            self.__process = process
+            if state != None:
+                process.set_state(state)
+        else:
+            self.__engine = BlockMapEngine(params, self.__seed)
+            if state != None:
+                self.__engine.state = state
+            self.__occupancy = bytearray(params.map_size)
+            self.__colors = bytearray(params.map_size * 4)
 
     def __generate(self, bmap: BlockMap):
-        bpos_x = 0
-        dt = gamebase.TICK_TIME
-        bpos_y_min: int = None # type:ignore
-        bpos_y_max: int = None # type:ignore
-        jump_timer = self.__get_next_jump_time()
-        while True:
-            if self.__player_offset_x >= blockmap.BLOCK_SIDE_LEN:
-                self.__player_offset_x -= blockmap.BLOCK_SIDE_LEN
-                self.__player_path[bpos_x] = (bpos_y_min, bpos_y_max)
-                bpos_x += 1
-                if bpos_x >= blockmap.BLOCK_MAP_WIDTH:
-                    break
-                bpos_y_min = None # type:ignore
-                bpos_y_max = None # type:ignore
-            player_bpos_y = int(self.__player_pos_y / blockmap.BLOCK_SIDE_LEN)
-            if bpos_y_min == None or player_bpos_y < bpos_y_min:
-                bpos_y_min = player_bpos_y
-            if bpos_y_max == None or player_bpos_y > bpos_y_max:
-                bpos_y_max = player_bpos_y
-            if jump_timer <= 0:
-                jump_timer = self.__get_next_jump_time()
-                if self.__player_pos_y > PLAYER_POS_Y_JUMPABLE_MIN:
-                    self.__player_speed_y = -player.PLAYER_JUMP_SPEED
-            elif self.__player_pos_y >= PLAYER_POS_Y_MAX:
-                jump_timer = self.__get_next_jump_time()
-                self.__player_speed_y = -player.PLAYER_JUMP_SPEED
-            jump_timer -= dt
-            self.__player_speed_y += gamebase.GRAVITY_ACCEL * dt
-            self.__player_pos_y += self.__player_speed_y * dt
-            if self.__player_speed_x < player.PLAYER_MAX_SPEED:
-                self.__player_speed_x += player.PLAYER_SPEED_ACCEL * dt
-                if self.__player_speed_x > player.PLAYER_MAX_SPEED:
-                    self.__player_speed_x = player.PLAYER_MAX_SPEED
-            self.__player_offset_x += self.__player_speed_x * dt
-        for x in range(blockmap.BLOCK_MAP_WIDTH):
-            player_y_min, player_y_max = self.__player_path[x]
-            player_y_min -= self.__get_player_path_y_offset()
-            player_y_max += self.__get_player_path_y_offset()
-            if player_y_min > 0:
-                y_min_exc = player_y_min
-                color = (
-                    random.randint(0, 128), 
-                    random.randint(0, 128), 
-                    random.randint(0, 128) 
-                )
-                for y in reversed(range(y_min_exc)):
-                    bmap.set_block(x, y, Block(color))
-                    color = tuple(
-                        max(comp - random.randint(0, 50), 0) for comp in color
-                    )
-            if player_y_max < blockmap.BLOCK_MAP_HEIGHT - 1:
-                y_max = player_y_max + 1
-                color = (
-                    random.randint(0, 128), 
-                    random.randint(0, 128), 
-                    random.randint(0, 128) 
-                )
-                for y in range(y_max, blockmap.BLOCK_MAP_HEIGHT):
-                    bmap.set_block(x, y, Block(color))
-                    color = tuple(
-                        max(comp - random.randint(0, 50), 0) for comp in color
-                    )
+        stitcher = self.__stitcher
+        if stitcher != None:
+            index = stitcher.next_chunk()
+            if index != None:
+                library = stitcher.library
+                bmap.load(library.get_occupancy(index), library.get_colors(index))
+                bmap.refresh()
+                return
+            # the chains have run out.
+            self.__stitcher = None
+            self.__start_live_generation(stitcher.exit_state)
+        process = self.__process
+        if process != None:
+            process.generate()
+            bmap.load(process.occupancy, process.colors)
+        else:
+            self.__engine.generate(self.__occupancy, self.__colors) # type:ignore
+            bmap.load(self.__occupancy, self.__colors)
         bmap.refresh()
-
-    def __get_next_jump_time(self) -> Decimal:
-        SHORT_RANGE = (PLAYER_JUMP_INTERVAL_MIN, 0.5)
-        LONG_RANGE = (0.5, PLAYER_JUMP_INTERVAL_MAX)
-        SHORT_RANGE_PROB = 0.8
-        r = SHORT_RANGE if random.random() <= SHORT_RANGE_PROB else LONG_RANGE
-        return Decimal(random.uniform(r[0], r[1]))
-    
-    def __get_player_path_y_offset(self) -> int:
-        offset_range = self.__player_path_y_offset_range
-        return int(
-            Decimal(
-                random.uniform(float(offset_range.x), float(offset_range.y))
-            ).quantize(Decimal(1), rounding = decimal.ROUND_HALF_EVEN)
-        )
-            
-            
-            
-        
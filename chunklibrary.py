@@ -0,0 +1,262 @@
+'''
+This module contains the chunk library: block maps generated offline, and its compact binary file format.
+
+A library holds chains of chunks. A chain is the sequence of maps one BlockMapEngine generates from the start of a run, so every chunk ends in the state the next chunk of its chain starts from. The file is memory-mapped, so loading a chunk costs a copy instead of a generation. It doesn't import pygame, so that the library can be built without a window.
+
+File format, all integers are little endian:
+    magic b"DTBC", version(1 byte), library id(8 bytes), params digest(8 bytes), map width(2 bytes), map height(2 bytes), number of chains(4 bytes), chain length(4 bytes)
+    the chunks of each chain in order, each of which is:
+        entry state and exit state, 5 signed 8-byte ints each, see blockmap_engine.EngineState
+        corridor bounds, the first and the last open row of each column(1 byte each)
+        occupancy(map size bytes) and colors(map size * 4 bytes), laid out as BlockMap's buffers
+'''
+
+import hashlib
+import mmap
+import os
+import random
+import struct
+import typing
+from typing import List, Optional, Tuple
+from blockmap_engine import BlockMapEngine, EngineState, GenerationParams
+
+CHUNK_LIBRARY_MAGIC = b"DTBC"
+CHUNK_LIBRARY_VERSION = 1
+CHUNK_LIBRARY_FILE_EXTENSION = ".chunks"
+
+_HEADER = struct.Struct("<4sBQ8sHHII")
+_STATES = struct.Struct("<10q")
+
+class ChunkLibraryFormatError(ValueError):
+    '''
+    Raised when the file isn't a valid chunk library for the generation params.
+    '''
+
+    pass
+
+def get_params_digest(params: GenerationParams) -> bytes:
+    '''
+    Returns 8 bytes that identify the generation params, so that a library generated with other constants isn't used.
+    '''
+
+    return hashlib.sha256(repr(sorted(vars(params).items())).encode()).digest()[:8]
+
+def _get_chunk_size(params: GenerationParams) -> int:
+    return _STATES.size + params.map_width * 2 + params.map_size * 5
+
+def _get_corridor_bounds(occupancy: bytearray, map_width: int, map_height: int) -> bytes:
+    bounds = bytearray()
+    for x in range(map_width):
+        column = occupancy[x * map_height:(x + 1) * map_height]
+        bounds.append(column.index(0))
+        bounds.append(column.rindex(0))
+    return bytes(bounds)
+
+def build_chunk_library(path: str, params: GenerationParams, chain_count: int, chain_length: int, seed: Optional[int] = None) -> int:
+    '''
+    Generate a chunk library and write it to the given path. The file is replaced only when it's complete.
+
+    Args:
+        path: The path of the library file.
+        params: The generation constants.
+        chain_count: The number of chains, each of which is generated with its own seed.
+        chain_length: The number of maps in a chain.
+        seed: The seed of the chain seeds, or None to seed it from the system.
+
+    Returns:
+        The id of the library.
+    '''
+
+    rng = random.Random(seed)
+    library_id = rng.getrandbits(64)
+    occupancy = bytearray(params.map_size)
+    colors = bytearray(params.map_size * 4)
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(_HEADER.pack(
+            CHUNK_LIBRARY_MAGIC, CHUNK_LIBRARY_VERSION, library_id, get_params_digest(params),
+            params.map_width, params.map_height, chain_count, chain_length
+        ))
+        for _ in range(chain_count):
+            engine = BlockMapEngine(params, rng.getrandbits(64))
+            for _ in range(chain_length):
+                entry_state = engine.state
+                engine.generate(occupancy, colors)
+                f.write(_STATES.pack(*entry_state, *engine.state))
+                f.write(_get_corridor_bounds(occupancy, params.map_width, params.map_height))
+                f.write(occupancy)
+                f.write(colors)
+    os.replace(temp_path, path)
+    return library_id
+
+class ChunkLibrary:
+    '''
+    A memory-mapped chunk library. A chunk is referred by its index, which is chain * chain_length + depth.
+    '''
+
+    __params: GenerationParams
+    __mmap: mmap.mmap
+    __view: memoryview
+    __chunk_size: int
+
+    __library_id: int
+    __chain_count: int
+    __chain_length: int
+
+    def __init__(self, path: str, params: GenerationParams):
+        '''
+        Raises:
+            OSError: The file couldn't be opened.
+            ChunkLibraryFormatError: The file isn't a valid library for the given params.
+        '''
+
+        self.__params = params
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise ChunkLibraryFormatError("The chunk library is truncated!")
+            (
+                magic, version, self.__library_id, params_digest,
+                map_width, map_height, self.__chain_count, self.__chain_length
+            ) = _HEADER.unpack(header)
+            if magic != CHUNK_LIBRARY_MAGIC:
+                raise ChunkLibraryFormatError("The file isn't a chunk library!")
+            if version != CHUNK_LIBRARY_VERSION:
+                raise ChunkLibraryFormatError(f"The chunk library version {version} isn't supported!")
+            if (
+                params_digest != get_params_digest(params)
+                or map_width != params.map_width or map_height != params.map_height
+            ):
+                raise ChunkLibraryFormatError("The chunk library was generated with other generation params!")
+            self.__chunk_size = _get_chunk_size(params)
+            if os.fstat(f.fileno()).st_size != _HEADER.size + self.chunk_count * self.__chunk_size:
+                raise ChunkLibraryFormatError("The chunk library size doesn't match its header!")
+            if self.chunk_count == 0:
+                raise ChunkLibraryFormatError("The chunk library is empty!")
+            self.__mmap = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        self.__view = memoryview(self.__mmap)
+
+    @property
+    def library_id(self) -> int:
+        return self.__library_id
+
+    @property
+    def chain_count(self) -> int:
+        return self.__chain_count
+
+    @property
+    def chain_length(self) -> int:
+        return self.__chain_length
+
+    @property
+    def chunk_count(self) -> int:
+        return self.__chain_count * self.__chain_length
+
+    def get_states(self, index: int) -> Tuple[EngineState, EngineState]:
+        '''
+        Returns the entry state and the exit state of a chunk.
+        '''
+
+        values = _STATES.unpack_from(self.__view, self.__get_offset(index))
+        return (
+            typing.cast(EngineState, values[:5]), typing.cast(EngineState, values[5:])
+        )
+
+    def get_corridor_bounds(self, index: int) -> List[Tuple[int, int]]:
+        '''
+        Returns the first and the last open row of each column of a chunk.
+        '''
+
+        start = self.__get_offset(index) + _STATES.size
+        bounds = self.__view[start:start + self.__params.map_width * 2]
+        return [(bounds[i], bounds[i + 1]) for i in range(0, len(bounds), 2)]
+
+    def get_occupancy(self, index: int) -> memoryview:
+        start = self.__get_offset(index) + _STATES.size + self.__params.map_width * 2
+        return self.__view[start:start + self.__params.map_size]
+
+    def get_colors(self, index: int) -> memoryview:
+        start = (
+            self.__get_offset(index) + _STATES.size + self.__params.map_width * 2
+            + self.__params.map_size
+        )
+        return self.__view[start:start + self.__params.map_size * 4]
+
+    def is_compatible(self, index: int, next_index: int) -> bool:
+        '''
+        Returns whether the chunk of next_index can follow the chunk of index.
+
+        The next chunk of the same chain always can. A chunk of another chain at the next depth can if it starts at the row the simulated player leaves the chunk at, and its first column has an opening in common with the last column of the chunk.
+        '''
+
+        chain_length = self.__chain_length
+        if next_index % chain_length != index % chain_length + 1:
+            return False
+        if next_index == index + 1:
+            return True
+        block_side_len = self.__params.block_side_len
+        _, exit_state = self.get_states(index)
+        entry_state, _ = self.get_states(next_index)
+        if entry_state[2] // block_side_len != exit_state[2] // block_side_len:
+            return False
+        last_min, last_max = self.get_corridor_bounds(index)[-1]
+        first_min, first_max = self.get_corridor_bounds(next_index)[0]
+        return max(last_min, first_min) <= min(last_max, first_max)
+
+    def close(self):
+        self.__view.release()
+        self.__mmap.close()
+
+    def __get_offset(self, index: int) -> int:
+        if not 0 <= index < self.chunk_count:
+            raise IndexError(f"The chunk index {index} is out of range!")
+        return _HEADER.size + index * self.__chunk_size
+
+class ChunkStitcher:
+    '''
+    Picks the chunks of a run: the first chunk of a random chain, then a random compatible chunk at each next depth, until the deepest chunk.
+    '''
+
+    __library: ChunkLibrary
+    __random: random.Random
+    __index: Optional[int] = None # the last picked chunk
+
+    def __init__(self, library: ChunkLibrary, seed: Optional[int] = None):
+        self.__library = library
+        self.__random = random.Random(seed)
+
+    @property
+    def library(self) -> ChunkLibrary:
+        return self.__library
+
+    @property
+    def exit_state(self) -> Optional[EngineState]:
+        '''
+        Returns the state the last picked chunk ends in, from which the live generation continues. None if no chunk has been picked.
+        '''
+
+        if self.__index == None:
+            return None
+        return self.__library.get_states(self.__index)[1]
+
+    def next_chunk(self) -> Optional[int]:
+        '''
+        Returns the index of the next chunk, or None if the chains have run out.
+        '''
+
+        library = self.__library
+        index = self.__index
+        if index == None:
+            next_index = self.__random.randrange(library.chain_count) * library.chain_length
+        elif index % library.chain_length + 1 >= library.chain_length:
+            return None
+        else:
+            depth = index % library.chain_length + 1
+            candidates = [
+                chain * library.chain_length + depth
+                for chain in range(library.chain_count)
+                if library.is_compatible(index, chain * library.chain_length + depth)
+            ]
+            next_index = self.__random.choice(candidates)
+        self.__index = next_index
+        return next_index
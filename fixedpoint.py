@@ -0,0 +1,85 @@
+'''
+This module provides the integer fixed-point representation used by the per-tick physics.
+
+Positions are measured in sub-pixels, speeds in sub-pixels per tick and accelerations in sub-pixels per tick squared. Integer arithmetic is exact and deterministic on every thread, unlike Decimal whose result depends on the context of the calling thread.
+'''
+
+from decimal import Decimal
+from fractions import Fraction
+from typing import Union
+
+# 6000 makes every physics constant of the game an exact integer, e.g. the speed acceleration of 1/6000 pixel per tick squared.
+SUBPIXELS_PER_PIXEL = 6000
+
+Rational = Union[int, str, Decimal, Fraction]
+
+def exact(value: Rational) -> int:
+    '''
+    Convert a rational number to an int.
+
+    Args:
+        value: The number to convert.
+
+    Raises:
+        ValueError: The number isn't an integer.
+    '''
+
+    frac = Fraction(value)
+    if frac.denominator != 1:
+        raise ValueError(f"{value} can't be represented as a fixed-point number exactly!")
+    return frac.numerator
+
+def from_pixels(px: Rational) -> int:
+    '''
+    Convert a length in pixels to sub-pixels.
+    '''
+
+    return exact(Fraction(px) * SUBPIXELS_PER_PIXEL)
+
+def speed_from_pixels_per_second(speed: Rational, tick_rate: int) -> int:
+    '''
+    Convert a speed in pixels per second to sub-pixels per tick.
+    '''
+
+    return exact(Fraction(speed) * SUBPIXELS_PER_PIXEL / tick_rate)
+
+def accel_from_pixels_per_second2(accel: Rational, tick_rate: int) -> int:
+    '''
+    Convert an acceleration in pixels per second squared to sub-pixels per tick squared.
+    '''
+
+    return exact(Fraction(accel) * SUBPIXELS_PER_PIXEL / (tick_rate * tick_rate))
+
+def to_pixels(value: int) -> int:
+    '''
+    Convert a length in sub-pixels to whole pixels, rounding towards negative infinity.
+    '''
+
+    return value // SUBPIXELS_PER_PIXEL
+
+def div_round_half_even(dividend: int, divisor: int) -> int:
+    '''
+    Divide two ints and round the quotient half to even, the same as Decimal.quantize does by default.
+
+    Args:
+        dividend: The dividend.
+        divisor: The divisor, which must be positive.
+    '''
+
+    quotient, remainder = divmod(dividend, divisor)
+    twice = remainder * 2
+    if twice > divisor or (twice == divisor and quotient % 2 == 1):
+        quotient += 1
+    return quotient
+
+def to_decimal(dividend: int, divisor: int, places: int) -> Decimal:
+    '''
+    Returns dividend / divisor as a Decimal with the given number of decimal places, rounded half to even.
+
+    The result is constructed exactly, so it doesn't depend on the precision of the current decimal context.
+    '''
+
+    scaled = div_round_half_even(dividend * 10 ** places, divisor)
+    sign = 1 if scaled < 0 else 0
+    digits = tuple(int(digit) for digit in str(abs(scaled)))
+    return Decimal((sign, digits, -places))
@@ -0,0 +1,157 @@
+'''
+This module contains the frame telemetry: a ring buffer of the time every frame spends in each phase of the game loop, with percentiles and a histogram of it.
+
+Averages hide hitches, so the telemetry keeps the timing of every one of the last frames instead. It doesn't import pygame.
+'''
+
+import json
+import math
+import os
+from array import array
+from typing import Any, Dict, List, Optional, Sequence
+
+# event: scene loading and pygame events, tick: the phases of Scene._tick that update the game, render: clearing the screen and the RENDER and HUD phases of the tick, flip: presenting the frame
+FRAME_PHASES = ("event", "tick", "render", "flip")
+FRAME_TOTAL = "frame" # the sum of the phases, i.e. the frame time without the wait for the next tick
+FRAME_TELEMETRY_CAPACITY = 1024 # the number of the last frames that are kept, about 10 seconds at the tick rate
+FRAME_TELEMETRY_PERCENTILES = (50, 95, 99)
+FRAME_TELEMETRY_HISTOGRAM_BOUNDS_MS = (1, 2, 4, 8, 10, 16, 33, 50, 100) # the upper bounds of the buckets, and a last bucket for the rest
+
+def get_percentile(sorted_values: Sequence[int], percent: float) -> int:
+    '''
+    Returns the nearest-rank percentile of sorted values, or 0 if there's none.
+    '''
+
+    if len(sorted_values) == 0:
+        return 0
+    rank = math.ceil(len(sorted_values) * percent / 100)
+    return sorted_values[max(0, rank - 1)]
+
+class FrameTelemetry:
+    '''
+    A ring buffer of the last frame timings. Times are recorded in nanoseconds and reported in milliseconds.
+    '''
+
+    __capacity: int
+    __phase_buffers: Dict[str, array] # the times of each phase and of the total, in the order of the ring
+    __next_index: int = 0
+    __frame_count: int = 0 # the number of frames in the buffer
+    __recorded_count: int = 0 # the number of frames recorded since the last clear
+
+    def __init__(self, capacity: int = FRAME_TELEMETRY_CAPACITY):
+        if capacity < 1:
+            raise ValueError("Arg capacity must be positive!")
+        self.__capacity = capacity
+        self.__phase_buffers = {
+            phase: array("q", bytes(8 * capacity)) for phase in FRAME_PHASES + (FRAME_TOTAL,)
+        }
+
+    @property
+    def capacity(self) -> int:
+        return self.__capacity
+
+    @property
+    def frame_count(self) -> int:
+        '''
+        Returns the number of frames in the buffer, at most the capacity.
+        '''
+
+        return self.__frame_count
+
+    @property
+    def recorded_count(self) -> int:
+        '''
+        Returns the number of frames recorded since the last clear, including the ones that have been overwritten.
+        '''
+
+        return self.__recorded_count
+
+    def record(self, event_ns: int, tick_ns: int, render_ns: int, flip_ns: int):
+        buffers = self.__phase_buffers
+        index = self.__next_index
+        buffers["event"][index] = event_ns
+        buffers["tick"][index] = tick_ns
+        buffers["render"][index] = render_ns
+        buffers["flip"][index] = flip_ns
+        buffers[FRAME_TOTAL][index] = event_ns + tick_ns + render_ns + flip_ns
+        index += 1
+        self.__next_index = 0 if index == self.__capacity else index
+        if self.__frame_count < self.__capacity:
+            self.__frame_count += 1
+        self.__recorded_count += 1
+
+    def clear(self):
+        self.__next_index = 0
+        self.__frame_count = 0
+        self.__recorded_count = 0
+
+    def get_times_ns(self, phase: str = FRAME_TOTAL) -> List[int]:
+        '''
+        Returns the times of a phase of the frames in the buffer, the oldest first.
+
+        Args:
+            phase: One of FRAME_PHASES, or FRAME_TOTAL.
+        '''
+
+        buffer = self.__phase_buffers[phase]
+        if self.__frame_count < self.__capacity:
+            return buffer[:self.__frame_count].tolist()
+        index = self.__next_index
+        return buffer[index:].tolist() + buffer[:index].tolist()
+
+    def get_percentiles_ms(self, phase: str = FRAME_TOTAL) -> Dict[str, float]:
+        '''
+        Returns the percentiles of FRAME_TELEMETRY_PERCENTILES and the maximum of a phase, keyed by "p50", "p95", "p99" and "max".
+        '''
+
+        times = sorted(self.__phase_buffers[phase][:self.__frame_count])
+        percentiles = {
+            f"p{percent}": get_percentile(times, percent) / 1e6 for percent in FRAME_TELEMETRY_PERCENTILES
+        }
+        percentiles["max"] = (times[-1] if len(times) > 0 else 0) / 1e6
+        return percentiles
+
+    def get_histogram(self, phase: str = FRAME_TOTAL) -> List[int]:
+        '''
+        Returns the number of frames in each bucket of FRAME_TELEMETRY_HISTOGRAM_BOUNDS_MS. A frame is counted in the first bucket whose bound isn't lower than its time. The last count is of the frames over the last bound.
+        '''
+
+        bounds_ns = [bound * 1000000 for bound in FRAME_TELEMETRY_HISTOGRAM_BOUNDS_MS]
+        counts = [0] * (len(bounds_ns) + 1)
+        for time_ns in self.__phase_buffers[phase][:self.__frame_count]:
+            bucket = 0
+            while bucket < len(bounds_ns) and time_ns > bounds_ns[bucket]:
+                bucket += 1
+            counts[bucket] += 1
+        return counts
+
+    def to_report(self, scene_name: Optional[str] = None) -> Dict[str, Any]:
+        '''
+        Returns the statistics of the buffer as a JSON-serializable dict.
+        '''
+
+        return {
+            "scene": scene_name,
+            "recorded_frames": self.__recorded_count,
+            "frames": self.__frame_count,
+            "percentiles_ms": {
+                phase: self.get_percentiles_ms(phase) for phase in FRAME_PHASES + (FRAME_TOTAL,)
+            },
+            "histogram": {
+                "bounds_ms": list(FRAME_TELEMETRY_HISTOGRAM_BOUNDS_MS),
+                "counts": self.get_histogram(),
+            },
+        }
+
+def write_reports(path: str, reports: List[Dict[str, Any]]):
+    '''
+    Write reports to a JSON file. The file is replaced only when it's complete, so a reader never sees a partial file.
+
+    Raises:
+        OSError: The file couldn't be written.
+    '''
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump({"reports": reports}, f, indent = 2)
+    os.replace(temp_path, path)
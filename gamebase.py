@@ -2,43 +2,62 @@
 This is the basic framework of the entire game program. 
 '''
 
-from typing import Dict, Type, Optional
-import decimal
+from typing import Any, Dict, List, Tuple, Type, Optional
 from decimal import Decimal
 import pygame
 from pygame import display
+from pygame import Color
 from pygame.font import Font
 from scene import Scene
 from utils import InvalidOperationException
 import gamesave
 import gc
 import globalresources
+import startuptrace
+import runhistory
+import fixedpoint
+import frametelemetry
+from frametelemetry import FrameTelemetry
+from glyphatlas import GlyphAtlas
+from textcache import TextCache
+import os
 import time
 
-pygame.init()
+HEADLESS_ENV_NAME = "DONT_TOUCH_BLOCKS_HEADLESS"
+DIRTY_RECT_MODE_ENV_NAME = "DONT_TOUCH_BLOCKS_DIRTY_RECTS"
+FRAME_TELEMETRY_ENV_NAME = "DONT_TOUCH_BLOCKS_FRAME_TELEMETRY"
 
-gamesave.load()
+_is_headless: bool = os.environ.get(HEADLESS_ENV_NAME, "0") not in ("", "0")
 
-globalresources._load()
+if _is_headless:
+    # SDL chooses its drivers in pygame.init(), so they must be set before that.
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
 
-decimal.getcontext().prec = 5
+# pygame is initialized, the game save is loaded and the sounds are decoded by run, so that importing this module is cheap.
 
 # constants
 WINDOW_DIMENSION = (1280, 800)
 BACKGROUND_COLOR = (205, 201, 201)
+HEADLESS_SCREEN_DIMENSION = (1, 1)
 
 TICK_RATE = 100
 TICK_TIME = Decimal(1) / Decimal(TICK_RATE)
 TICK_TIME_FLOAT = float(TICK_TIME)
 
 GRAVITY_ACCEL = Decimal(1000)
+GRAVITY_ACCEL_FIXED = fixedpoint.accel_from_pixels_per_second2(GRAVITY_ACCEL, TICK_RATE)
 
 PRINT_INTERVAL = 50
 
+DEFAULT_FRAME_TELEMETRY_FILE_PATH = "frame_telemetry.json"
+FRAME_TELEMETRY_REPORT_HISTORY = 20 # the number of the last scene reports kept in the file
+
 _screen: pygame.Surface
 
-_default_font: Font = Font(None, size = 50)
-_default_font.set_bold(True)
+_default_font: Optional[Font] = None
+_glyph_atlases: Dict[Tuple[Tuple[int, ...], bool], GlyphAtlas] = {}
+_text_cache: TextCache = TextCache()
 
 _active_scene: "Scene" = None # type:ignore
 
@@ -46,10 +65,23 @@ _scene_type_to_load: Optional[Type["Scene"]] = None
 
 _scene_type_dict: Dict[str, Type["Scene"]] = {}
 
+_request_quit: bool = False
+
+_tick_count: int = 0
+
+_is_dirty_rect_mode: bool = os.environ.get(DIRTY_RECT_MODE_ENV_NAME, "0") not in ("", "0")
+_dirty_rects: List[pygame.Rect] = [] # regions drawn in the current frame
+_last_dirty_rects: List[pygame.Rect] = [] # regions drawn in the last frame
+_is_full_redraw_requested: bool = True
+
 _frametime_ms: int = 0
 _framecounter: int = 0
 _frametimer_ns: int = 0
 
+_frame_telemetry: FrameTelemetry = FrameTelemetry()
+_frame_telemetry_path: str = os.environ.get(FRAME_TELEMETRY_ENV_NAME, DEFAULT_FRAME_TELEMETRY_FILE_PATH)
+_frame_telemetry_reports: List[Dict[str, Any]] = []
+
 def get_screen():
     '''
     A pygame.Surface instance representing the main window.
@@ -60,12 +92,45 @@ def get_screen():
 
 def get_default_font():
     '''
-    Returns a default pygame.font.Font instance.
+    Returns a default pygame.font.Font instance, which is created on the first call.
     '''
 
     global _default_font
+    if _default_font == None:
+        with startuptrace.phase("font"):
+            pygame.font.init()
+            _default_font = Font(None, size = 50)
+            _default_font.set_bold(True)
     return _default_font
 
+def get_glyph_atlas(color: Color, antialias: bool = True) -> GlyphAtlas:
+    '''
+    Returns the glyph atlas of the default font in a colour, which is built the first time it's requested.
+    '''
+
+    global _glyph_atlases
+    key = (tuple(color), antialias)
+    atlas = _glyph_atlases.get(key)
+    if atlas == None:
+        atlas = _glyph_atlases[key] = GlyphAtlas(get_default_font(), color, antialias)
+    return atlas
+
+def get_text_cache() -> TextCache:
+    '''
+    Returns the cache of the texts rendered by render_text, which is kept across scenes.
+    '''
+
+    global _text_cache
+    return _text_cache
+
+def render_text(text: str, antialias: bool, color: Any) -> pygame.Surface:
+    '''
+    Render a static text with the default font, or return the surface it was rendered to before. The surface is shared, so it must not be drawn on.
+    '''
+
+    global _text_cache
+    return _text_cache.render(get_default_font(), text, antialias, color)
+
 def get_active_scene():
     '''
     A Scene instance representing the current active game scene.
@@ -78,6 +143,97 @@ def get_frametime_ms():
     global _frametime_ms
     return _frametime_ms
 
+def get_frame_telemetry() -> FrameTelemetry:
+    '''
+    Returns the timings of the last frames of the active scene, see the module frametelemetry.
+
+    When a scene is unloaded and when the game exits, a report of its frames is written to frame_telemetry.json in the working directory, along with the reports of the last scenes. Set the environment variable DONT_TOUCH_BLOCKS_FRAME_TELEMETRY to another path, or to an empty string to disable the file.
+    '''
+
+    global _frame_telemetry
+    return _frame_telemetry
+
+def _write_frame_telemetry():
+    global _frame_telemetry_reports
+    path = _frame_telemetry_path
+    if path == "" or _frame_telemetry.recorded_count == 0:
+        return
+    reports = _frame_telemetry_reports
+    reports.append(_frame_telemetry.to_report(type(_active_scene).__name__))
+    del reports[:-FRAME_TELEMETRY_REPORT_HISTORY]
+    try:
+        frametelemetry.write_reports(path, reports)
+    except OSError as e:
+        print(f"WARNING: Couldn't save the frame telemetry to {path}: {e}")
+
+def is_headless() -> bool:
+    '''
+    Returns whether the game runs without a window and audio device.
+
+    The headless mode is enabled by setting the environment variable DONT_TOUCH_BLOCKS_HEADLESS to 1 before this module is imported. In this mode the game loop doesn't present frames and runs ticks as fast as possible.
+    '''
+
+    global _is_headless
+    return _is_headless
+
+def get_tick_count() -> int:
+    '''
+    Returns the number of ticks the game loop has run.
+    '''
+
+    global _tick_count
+    return _tick_count
+
+def request_quit():
+    '''
+    Request to exit the game loop after the current tick.
+    '''
+
+    global _request_quit
+    _request_quit = True
+
+def is_dirty_rect_mode() -> bool:
+    '''
+    Returns whether the dirty rectangle presentation mode is enabled.
+    '''
+
+    global _is_dirty_rect_mode
+    return _is_dirty_rect_mode
+
+def set_dirty_rect_mode(enabled: bool):
+    '''
+    Enable or disable the dirty rectangle presentation mode.
+
+    By default the whole screen is cleared and presented every frame. In the dirty rectangle mode only the regions drawn in the last frame are cleared, and only the regions drawn in the last and the current frame are presented. Entities must report every region they draw on the screen by report_dirty_rect.
+
+    The mode can also be enabled by setting the environment variable DONT_TOUCH_BLOCKS_DIRTY_RECTS to 1.
+    '''
+
+    global _is_dirty_rect_mode
+    if _is_dirty_rect_mode != enabled:
+        _is_dirty_rect_mode = enabled
+        request_full_redraw()
+
+def report_dirty_rect(rect: pygame.Rect):
+    '''
+    Report a region of the screen drawn in the current frame, e.g. the Rect returned by Surface.blit.
+
+    It does nothing unless the dirty rectangle mode is enabled.
+    '''
+
+    global _is_dirty_rect_mode
+    global _dirty_rects
+    if _is_dirty_rect_mode:
+        _dirty_rects.append(rect)
+
+def request_full_redraw():
+    '''
+    Request to clear and present the whole screen in the next frame, e.g. after the display mode changes.
+    '''
+
+    global _is_full_redraw_requested
+    _is_full_redraw_requested = True
+
 def register_scene(name: str, scene_type: Type["Scene"]):
     '''
     Register a scene type.
@@ -110,14 +266,17 @@ def request_load_scene(name: str):
     
     _scene_type_to_load = _scene_type_dict[name]
 
-def run(initial_scene_name: str):
+def run(initial_scene_name: str, max_ticks: Optional[int] = None):
     '''
     Run the game!
 
     There's a game loop inside this function. The game updates a frame at set intervals. This function will exit when a quit event occurs.
 
+    In the headless mode the loop doesn't wait between ticks and doesn't present frames, so the simulation runs as fast as the CPU allows.
+
     Args:
         initial_scene_type: The type of the first Scene instance the game will create.
+        max_ticks: If not None, the function will exit after running this number of ticks.
 
     Raises:
         ValueError: The argument type is not correct.
@@ -130,58 +289,123 @@ def run(initial_scene_name: str):
     global _frametime_ms
     global _framecounter
     global _frametimer_ns
+    global _request_quit
+    global _tick_count
+    global _dirty_rects
+    global _last_dirty_rects
+    global _is_full_redraw_requested
 
     request_load_scene(initial_scene_name)
     
     # init
-    _screen = display.set_mode(WINDOW_DIMENSION)
-    display.set_caption("Don't Touch Blocks")
+    is_headless = _is_headless
+    with startuptrace.phase("pygame_init"):
+        if is_headless:
+            # The mixer isn't initialized at all, as quitting it takes longer than the rest of the startup.
+            display.init()
+            pygame.font.init()
+        else:
+            pygame.init()
+    with startuptrace.phase("gamesave"):
+        gamesave.ensure_loaded()
+    # the sounds aren't loaded while the game is muted, until it's unmuted.
+    if is_headless or not gamesave.get("is_mute", bool):
+        globalresources.start_loading(is_silent = is_headless)
+    with startuptrace.phase("display"):
+        _screen = display.set_mode(WINDOW_DIMENSION)
+        display.set_caption("Don't Touch Blocks")
+    if is_headless:
+        # Nothing is presented in the headless mode, so entities draw onto a tiny surface where blits are clipped away almost for free.
+        _screen = pygame.Surface(HEADLESS_SCREEN_DIMENSION)
     clock = pygame.time.Clock()
-    request_quit = False
     print_timer = PRINT_INTERVAL
 
     while True:
         starttime_ns = time.time_ns()
+        frame_starttime_ns = time.perf_counter_ns()
 
         # check whether there's a request to load a new scene.
         if _scene_type_to_load != None:
             if _active_scene != None: 
+                _write_frame_telemetry()
+                _frame_telemetry.clear()
                 _active_scene._destroy()
-            _active_scene = _scene_type_to_load()
-            _active_scene.on_create()
+                _active_scene = _scene_type_to_load()
+                _active_scene.on_create()
+            else:
+                with startuptrace.phase("first_scene"):
+                    _active_scene = _scene_type_to_load()
+                    _active_scene.on_create()
             _scene_type_to_load = None
+            request_full_redraw()
             gc.collect()
         
         # poll for events
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                request_quit = True
+                _request_quit = True
             _active_scene._send_pygame_event(event)
+
+        if max_ticks != None and _tick_count >= max_ticks:
+            _request_quit = True
         
         # handle the quit request
-        if request_quit:
-            _active_scene.on_destroy()
+        if _request_quit:
+            _request_quit = False
+            _write_frame_telemetry()
+            _active_scene._destroy()
+            gamesave.flush()
+            runhistory.flush()
             pygame.quit()
             break
 
-        _screen.fill(BACKGROUND_COLOR)
+        event_endtime_ns = time.perf_counter_ns()
+
+        is_partial_redraw = _is_dirty_rect_mode and not _is_full_redraw_requested
+        if is_partial_redraw:
+            for rect in _last_dirty_rects:
+                _screen.fill(BACKGROUND_COLOR, rect)
+        else:
+            _screen.fill(BACKGROUND_COLOR)
+        _is_full_redraw_requested = False
 
+        clear_ns = time.perf_counter_ns() - event_endtime_ns
         _frametimer_ns += time.time_ns() - starttime_ns
 
         # tick time calculation and tick call
-        dt = clock.tick_busy_loop(TICK_RATE) / 1000
+        if not is_headless:
+            dt = clock.tick_busy_loop(TICK_RATE) / 1000
 
         starttime_ns = time.time_ns()
+        tick_starttime_ns = time.perf_counter_ns()
 
         _active_scene._tick()
-        latency = dt - TICK_TIME_FLOAT
-        if latency > 0.005:
-            print_timer += 1
-            if print_timer > PRINT_INTERVAL:
-                print_timer = 0
-                print(f"WARNING: Performance issue. Latency: {latency}")
+        _tick_count += 1
+        tick_endtime_ns = time.perf_counter_ns()
+        if not is_headless:
+            latency = dt - TICK_TIME_FLOAT
+            if latency > 0.005:
+                print_timer += 1
+                if print_timer > PRINT_INTERVAL:
+                    print_timer = 0
+                    print(f"WARNING: Performance issue. Latency: {latency}")
+        
+            if is_partial_redraw:
+                _last_dirty_rects.extend(_dirty_rects)
+                display.update(_last_dirty_rects)
+            else:
+                display.flip()
         
-        display.flip()
+        _last_dirty_rects.clear()
+        _last_dirty_rects, _dirty_rects = _dirty_rects, _last_dirty_rects
+        # the entities draw in the RENDER and HUD phases of the tick, which are counted as render along with the clearing.
+        scene_render_ns = _active_scene.last_render_ns
+        _frame_telemetry.record(
+            event_endtime_ns - frame_starttime_ns, tick_endtime_ns - tick_starttime_ns - scene_render_ns,
+            clear_ns + scene_render_ns, time.perf_counter_ns() - tick_endtime_ns
+        )
+        if _tick_count == 1:
+            startuptrace.mark_first_frame()
 
         _frametimer_ns += time.time_ns() - starttime_ns
         _framecounter += 1
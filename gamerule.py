@@ -1,9 +1,15 @@
+import time
 import typing
+from typing import Optional
 from blockmap import BlockMapManager
 from blockmap_generator import BlockMapGenerator
 import gamebase
+import fixedpoint
 from decimal import Decimal
 from player import Player
+from runhistory import RunHistory, RunRecord
+import runhistory
+from runrecorder import RunRecorder
 from scene import DynamicEntity, SingletonEntity
 import gamesave
 
@@ -12,17 +18,24 @@ class GameRule(SingletonEntity, DynamicEntity):
     This class is responsible for implementing the game rule, such as determining whether the game is over, calculating the score, etc.
     '''
 
+    tick_order = 30 # after the player moves
+
     __player: Player
     __blockmap_manager: BlockMapManager
     __blockmap_generator: BlockMapGenerator
+    __is_replaying: bool = False
+    __seed: Optional[int] = None
+    __starttime_ns: int = 0
+    __run_history: Optional[RunHistory] = None
 
-    __score: Decimal = Decimal(0)
-    __player_speed: Decimal = Decimal(0)
+    __score_ticks: int = 0
+    __player_speed: int = 0
     
     __is_game_over: bool = False
 
     __is_new_best_score: bool = False
     __best_score: Decimal = Decimal(0)
+    __percentile_rank: Optional[float] = None
 
     @property
     def is_game_over(self) -> bool:
@@ -31,12 +44,37 @@ class GameRule(SingletonEntity, DynamicEntity):
 
     @property
     def score(self) -> Decimal:
+        '''
+        Returns the survival time in seconds.
+        '''
         
-        return self.__score
+        return fixedpoint.to_decimal(self.__score_ticks, gamebase.TICK_RATE, 2)
+    
+    @property
+    def score_ticks(self) -> int:
+        '''
+        Returns the survival time in ticks.
+        '''
+
+        return self.__score_ticks
     
     @property
     def player_speed(self) -> Decimal:
+        '''
+        Returns the player speed in pixels per second.
+        '''
         
+        return fixedpoint.to_decimal(
+            self.__player_speed * gamebase.TICK_RATE, 
+            fixedpoint.SUBPIXELS_PER_PIXEL, 2
+        )
+    
+    @property
+    def player_speed_fixed(self) -> int:
+        '''
+        Returns the player speed in sub-pixels per tick.
+        '''
+
         return self.__player_speed
     
     @property
@@ -49,6 +87,14 @@ class GameRule(SingletonEntity, DynamicEntity):
         
         return self.__best_score
 
+    @property
+    def percentile_rank(self) -> Optional[float]:
+        '''
+        Returns the percentage of the earlier runs in the run history that scored lower, or None if the game isn't over, it's a replay or there's no history.
+        '''
+
+        return self.__percentile_rank
+
     def on_spawn(self):
         super().on_spawn()
         self.__player = typing.cast(
@@ -62,24 +108,43 @@ class GameRule(SingletonEntity, DynamicEntity):
                 BlockMapGenerator
             )
         )
+        recorder = typing.cast(
+            Optional[RunRecorder], self.scene.get_singleton_entity(RunRecorder)
+        )
+        self.__is_replaying = recorder != None and recorder.is_replaying
+        self.__seed = None if recorder == None else recorder.seed
+        if not self.__is_replaying:
+            # opened now rather than at the moment of death
+            self.__run_history = runhistory.get_run_history()
+        self.__starttime_ns = time.perf_counter_ns()
 
     def on_tick(self):
-        dt = gamebase.TICK_TIME
-
         if not self.__is_game_over:
-            self.__score += dt
+            self.__score_ticks += 1
             self.__player_speed = self.__blockmap_generator.player_speed
             if self.__player.is_dead:
                 self.__is_game_over = True
                 self.__blockmap_manager.is_stopped = True
                 self.__blockmap_generator.destroy()
                 self.__blockmap_generator = None # type:ignore
-                score = self.score.quantize(Decimal("1.0"))
+                score = fixedpoint.to_decimal(
+                    self.__score_ticks, gamebase.TICK_RATE, 1)
                 best_score = gamesave.get("best_score", Decimal)
-                if score > best_score:
+                # a replayed score isn't a new record.
+                if score > best_score and not self.__is_replaying:
                     self.__is_new_best_score = True
                     best_score = score
                     gamesave.set("best_score", best_score)
                 self.__best_score = best_score
+                if self.__run_history != None:
+                    self.__record_run(self.__run_history)
+
+    def __record_run(self, history: RunHistory):
+        self.__percentile_rank = history.get_percentile_rank(self.__score_ticks)
+        runhistory.append_later(RunRecord(
+            self.__score_ticks, self.__player_speed,
+            (time.perf_counter_ns() - self.__starttime_ns) // 1000000,
+            self.__seed, time.time()
+        ))
         
         
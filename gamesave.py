@@ -1,13 +1,23 @@
+'''
+This module contains the game save, the properties kept between runs.
+
+Changes are written behind by a background thread: set only takes a snapshot of the properties, and the thread encrypts and writes the latest snapshot after a burst of changes has settled, so a slow disk never stalls a tick. The file is replaced atomically, so it's never left half-written. Pending changes are flushed when gamebase.run exits and when the program exits. The file is read on first use.
+'''
+
 from abc import ABC, abstractmethod
 from collections.abc import Collection
+import atexit
 import json
 import os
+import threading
+import time
 from typing import Any, Generic, Optional, TypeVar
 import typing
 import xor_encrypt
 from decimal import Decimal
 
 SAVE_FILENAME = "save.json"
+SAVE_COALESCE_SECONDS = 0.5 # how long the writer waits for more changes before it writes
 
 ENCRYPT_KEY = "2023.12.15 Don't touch blocks. You can't cheat!"
 
@@ -93,6 +103,12 @@ class SimplePropertyInfo(
 _property_dict: dict[str, PropertyInfo] = {}
 
 _save: dict[str, Any] = {}
+_is_loaded: bool = False
+
+_pending_save: Optional[dict[str, Any]] = None # the snapshot the writer hasn't written yet
+_pending_condition: threading.Condition = threading.Condition()
+_write_lock: threading.Lock = threading.Lock() # held while the file is written, so that an older snapshot never replaces a newer one
+_writer_thread: Optional[threading.Thread] = None
 
 def define(prop: PropertyInfo):
     global _property_dict
@@ -110,7 +126,7 @@ def get_all_properties() -> Collection[PropertyInfo]:
     return _property_dict.values()
 
 def load():
-    global _save
+    global _save, _is_loaded
 
     json_obj = None
     if os.path.exists(SAVE_FILENAME):
@@ -125,20 +141,98 @@ def load():
         json_obj = {}
     for prop in get_all_properties():
         prop.on_load(json_obj, _save)
-    save()
+    _is_loaded = True
+    # the properties are written back in their current form, without holding up the loading.
+    _request_save()
 
-def save():
-    global _save
+def ensure_loaded():
+    '''
+    Load the game save unless it's loaded. The game save is loaded on first use, so that importing this module doesn't read the file.
+    '''
+
+    global _is_loaded
+    if not _is_loaded:
+        load()
 
+def save():
+    '''
+    Write the game save now, on the calling thread, and drop any pending write.
+
+    Raises:
+        OSError: The file couldn't be written.
+    '''
+
+    global _save, _pending_save
+
+    ensure_loaded()
+    with _write_lock:
+        with _pending_condition:
+            _pending_save = None
+        _write(dict(_save))
+
+def flush():
+    '''
+    Write the pending changes now, if any, and wait until the file is written.
+    '''
+
+    global _pending_save
+
+    with _write_lock:
+        with _pending_condition:
+            snapshot = _pending_save
+            _pending_save = None
+        if snapshot == None:
+            return
+        try:
+            _write(snapshot)
+        except OSError as e:
+            print(f"WARNING: Couldn't write the game save to {SAVE_FILENAME}: {e}")
+
+def _write(snapshot: dict[str, Any]):
     json_obj = {}
     for prop in get_all_properties():
-        prop.on_save(_save, json_obj)
-    with open(SAVE_FILENAME, "w", encoding = "utf-8") as file:
-        json.dump(json_obj, file)
+        prop.on_save(snapshot, json_obj)
+    temp_filename = f"{SAVE_FILENAME}.{os.getpid()}.tmp"
+    try:
+        with open(temp_filename, "w", encoding = "utf-8") as file:
+            json.dump(json_obj, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_filename, SAVE_FILENAME)
+    except BaseException:
+        # don't leave a temporary file behind for every failed write.
+        try:
+            os.remove(temp_filename)
+        except OSError:
+            pass
+        raise
+
+def _request_save():
+    global _save, _pending_save, _writer_thread
+
+    with _pending_condition:
+        _pending_save = dict(_save)
+        if _writer_thread == None:
+            _writer_thread = threading.Thread(target = _run_writer_thread, daemon = True)
+            _writer_thread.start()
+        _pending_condition.notify()
+
+def _run_writer_thread():
+    while True:
+        with _pending_condition:
+            _pending_condition.wait_for(lambda: _pending_save != None)
+        # the changes made meanwhile are written together.
+        time.sleep(SAVE_COALESCE_SECONDS)
+        try:
+            flush()
+        except Exception as e:
+            # e.g. a property value that can't be serialized. The writer must survive it, or no later change would be written.
+            print(f"WARNING: Couldn't write the game save to {SAVE_FILENAME}: {e!r}")
 
 def get(name: str, as_type: type[TProperty]) -> TProperty:
     global _save
 
+    ensure_loaded()
     val = get_property(name).get(_save)
     if not isinstance(val, as_type):
         raise TypeError(f"Invalid type {as_type} for property {name} in gamesave.")
@@ -147,9 +241,10 @@ def get(name: str, as_type: type[TProperty]) -> TProperty:
 def set(name: str, val: Any):
     global _save
 
+    ensure_loaded()
     need_save = get_property(name).set(_save, val)
     if need_save:
-        save()
+        _request_save()
 
 class EncryptedPropertyInfo(SimplePropertyInfo[TProperty], Generic[TProperty]):
     
@@ -185,4 +280,6 @@ class EncryptedPropertyInfo(SimplePropertyInfo[TProperty], Generic[TProperty]):
 
 define_simple("is_fullscreen", bool, False)
 define_simple("is_mute", bool, False)
-define(EncryptedPropertyInfo("best_score", Decimal, Decimal(0)))
\ No newline at end of file
+define(EncryptedPropertyInfo("best_score", Decimal, Decimal(0)))
+
+atexit.register(flush)
\ No newline at end of file
@@ -10,6 +10,7 @@ import gamebase
 from gamerule import GameRule
 from gameui import GameUi
 from player import Player, PlayerInputManager
+from runrecorder import RunRecorder
 from scene import Scene
 
 class GameScene(BasicScene):
@@ -20,6 +21,7 @@ class GameScene(BasicScene):
     def on_create(self):
 
         super().on_create()
+        self.spawn_entity(RunRecorder)
         self.spawn_entity(BlockMapManager)
         self.spawn_entity(BlockMapGenerator)
         self.spawn_entity(Player)
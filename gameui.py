@@ -2,19 +2,19 @@
 This module is mainly about the UI in game.
 '''
 
-from decimal import Decimal
-from typing import Optional
 import typing
+from typing import Optional
 from pygame import Color, Surface
 import pygame
 import gamebase
+import fixedpoint
 from gamerule import GameRule
+from glyphatlas import GlyphText
 from player import PlayerInputManager
 from scene import DynamicEntity
 import globalresources
 import gamesave
 
-FONT_HEIGHT = gamebase.get_default_font().get_height()
 SCORE_COLOR = Color("yellow")
 SPEED_COLOR = Color("aqua")
 GAMEOVER_COLOR = Color("red")
@@ -24,17 +24,17 @@ MASK_COLOR = Color(100, 100, 100)
 SCORE_POS_X = gamebase.WINDOW_DIMENSION[0] // 2 - 100
 SCORE_POS_Y = 50
 SPEED_POS_X = SCORE_POS_X
-SPEED_POS_Y = SCORE_POS_Y + FONT_HEIGHT + 10
 GAMEOVER_POS_X = gamebase.WINDOW_DIMENSION[0] // 2
 GAMEOVER_POS_Y = 300
 GAMEOVER_SCORE_POS_X = GAMEOVER_POS_X
-GAMEOVER_SCORE_POS_Y = GAMEOVER_POS_Y + FONT_HEIGHT + 15
 GAMEOVER_SPEED_POS_X = GAMEOVER_SCORE_POS_X
-GAMEOVER_SPEED_POS_Y = GAMEOVER_SCORE_POS_Y + FONT_HEIGHT + 10
 GAMEOVER_BEST_SCORE_POS_X = GAMEOVER_POS_X
-GAMEOVER_BEST_SCORE_POS_Y = GAMEOVER_SPEED_POS_Y + FONT_HEIGHT + 10
+GAMEOVER_RANK_POS_X = GAMEOVER_POS_X
 GAMEOVER_KEY_HINT_POS_X = GAMEOVER_POS_X
-GAMEOVER_KEY_HINT_POS_Y = GAMEOVER_BEST_SCORE_POS_Y + FONT_HEIGHT + 15
+# the gaps below a line and below a group of lines, the lines themselves are as high as the font
+LINE_SPACING = 10
+GROUP_SPACING = 15
+RANK_COLOR = Color("white")
 GAMEOVER_ACCEPT_KEY_TIME = 1.0
 
 class GameUi(DynamicEntity):
@@ -45,20 +45,31 @@ class GameUi(DynamicEntity):
     __game_rule: GameRule
     __player_input_manager: PlayerInputManager
 
-    __last_score: Decimal = Decimal("0.0")
-    __last_text_score: Optional[Surface] = None
-    __last_speed: Decimal = Decimal("0.0")
-    __last_text_speed: Optional[Surface] = None
+    # the score in tenths of a second and the speed in tenths of a pixel per second
+    __last_score: int = 0
+    __last_speed: int = 0
+    # composed from glyph atlases, so that the font doesn't render them whenever they change
+    __text_score: GlyphText
+    __text_speed: GlyphText
 
     __text_gameover: Surface
     __text_gameover_key_hint: Surface
     __text_best_score: Surface
+    __text_rank: Optional[Surface] = None
 
     __gameover_accept_key_timer: float = 0.0
     __gameover_accept_key: bool = False
 
     __on_gameover_called: bool = False
 
+    # the vertical positions below the first line, which depend on the height of the font
+    __speed_pos_y: int
+    __gameover_score_pos_y: int
+    __gameover_speed_pos_y: int
+    __gameover_best_score_pos_y: int
+    __gameover_rank_pos_y: int
+    __gameover_key_hint_pos_y: int
+
     def on_spawn(self):
         
         super().on_spawn()
@@ -69,65 +80,94 @@ class GameUi(DynamicEntity):
             PlayerInputManager, 
             self.scene.get_singleton_entity(PlayerInputManager)
         )
-        font = gamebase.get_default_font()
-        self.__text_gameover = font.render("GAME OVER", True, GAMEOVER_COLOR)
-        self.__text_gameover_key_hint = font.render(
+        # the font is created by the game loop, not when this module is imported.
+        font_height = gamebase.get_default_font().get_height()
+        self.__speed_pos_y = SCORE_POS_Y + font_height + LINE_SPACING
+        self.__gameover_score_pos_y = GAMEOVER_POS_Y + font_height + GROUP_SPACING
+        self.__gameover_speed_pos_y = self.__gameover_score_pos_y + font_height + LINE_SPACING
+        self.__gameover_best_score_pos_y = self.__gameover_speed_pos_y + font_height + LINE_SPACING
+        self.__gameover_rank_pos_y = self.__gameover_best_score_pos_y + font_height + LINE_SPACING
+        self.__gameover_key_hint_pos_y = self.__gameover_rank_pos_y + font_height + GROUP_SPACING
+        self.__text_gameover = gamebase.render_text("GAME OVER", True, GAMEOVER_COLOR)
+        self.__text_gameover_key_hint = gamebase.render_text(
             "Press Space to play again or Esc to exit.", True, "white"
         )
+        self.__text_score = GlyphText(
+            gamebase.get_glyph_atlas(SCORE_COLOR), gamebase.render_text("Score: ", True, SCORE_COLOR)
+        )
+        self.__text_speed = GlyphText(
+            gamebase.get_glyph_atlas(SPEED_COLOR), gamebase.render_text("Speed: ", True, SPEED_COLOR)
+        )
+
+    def on_input(self):
+
+        if not self.__gameover_accept_key:
+            return
+        input_manager = self.__player_input_manager
+        if input_manager.request_jump:
+            gamebase.request_load_scene("GameScene")
+        if input_manager.request_escape:
+            gamebase.request_load_scene("MenuScene")
 
     def on_tick(self):
 
-        game_rule = self.__game_rule
-        if game_rule.is_game_over:
-            if not self.__on_gameover_called:
-                self.__on_gameover_called = True
-                self.__on_game_over()
-            self.__tick_game_over()
+        # the game over is seen from the tick after the player died, as the game rule ticks after this entity.
+        if not self.__game_rule.is_game_over:
+            return
+        if not self.__on_gameover_called:
+            self.__on_gameover_called = True
+            self.__on_game_over()
+        if not self.__gameover_accept_key:
+            self.__gameover_accept_key_timer += float(gamebase.TICK_TIME)
+            if self.__gameover_accept_key_timer >= GAMEOVER_ACCEPT_KEY_TIME:
+                self.__gameover_accept_key = True
+
+    def on_hud(self):
+
+        if self.__on_gameover_called:
+            self.__draw_game_over()
         else:
-            self.__tick_during_game()
+            self.__draw_during_game()
     
     def __update_score(self):
         game_rule = self.__game_rule
-        font = gamebase.get_default_font()
-        score = game_rule.score.quantize(Decimal("1.0"))
+        score = fixedpoint.div_round_half_even(
+            game_rule.score_ticks * 10, gamebase.TICK_RATE)
         if score != self.__last_score:
             self.__last_score = score
-            self.__last_text_score = font.render(
-                "Score: " + str(score), True, SCORE_COLOR
-            )
+            self.__text_score.set_text(str(fixedpoint.to_decimal(score, 10, 1)))
 
     def __update_speed(self):
         game_rule = self.__game_rule
-        font = gamebase.get_default_font()
-        speed = game_rule.player_speed.quantize(Decimal("1.0"))
+        speed = fixedpoint.div_round_half_even(
+            game_rule.player_speed_fixed * gamebase.TICK_RATE * 10, 
+            fixedpoint.SUBPIXELS_PER_PIXEL
+        )
         if speed != self.__last_speed:
             self.__last_speed = speed
-            self.__last_text_speed = font.render(
-                "Speed: " + str(speed), True, SPEED_COLOR
-            )
+            self.__text_speed.set_text(str(fixedpoint.to_decimal(speed, 10, 1)))
 
-    def __tick_during_game(self):
+    def __draw_during_game(self):
 
         screen = gamebase.get_screen()
 
         self.__update_score()
-        text_score = self.__last_text_score
-        if text_score != None:
-            screen.blit(
-                text_score, (SCORE_POS_X, SCORE_POS_Y)
-            )
+        text_score = self.__text_score
+        if text_score.text != None:
+            gamebase.report_dirty_rect(text_score.draw(
+                screen, (SCORE_POS_X, SCORE_POS_Y)
+            ))
         
         self.__update_speed()
-        text_speed = self.__last_text_speed
-        if text_speed != None:
-            screen.blit(
-                text_speed, (SPEED_POS_X, SPEED_POS_Y)
-            )
+        text_speed = self.__text_speed
+        if text_speed.text != None:
+            gamebase.report_dirty_rect(text_speed.draw(
+                screen, (SPEED_POS_X, self.__speed_pos_y)
+            ))
 
     def __on_game_over(self):
         game_rule = self.__game_rule
         is_new_best_score = game_rule.is_new_best_score
-        font = gamebase.get_default_font()
 
         self.__update_score()
         self.__update_speed()
@@ -135,9 +175,14 @@ class GameUi(DynamicEntity):
             "NEW Best Score: " if is_new_best_score 
             else "Best Score: "
         )
-        self.__text_best_score = font.render(
+        self.__text_best_score = gamebase.render_text(
             prefix_best_score + str(game_rule.best_score), True, NEW_BEST_SCORE_COLOR if is_new_best_score else BEST_SCORE_COLOR
         )
+        percentile_rank = game_rule.percentile_rank
+        if percentile_rank != None:
+            self.__text_rank = gamebase.render_text(
+                f"Better than {percentile_rank:.0f}% of your runs", True, RANK_COLOR
+            )
 
         gameover_sound = None if gamesave.get("is_mute", bool) else (
             globalresources.SND_NEW_BEST_SCORE if is_new_best_score 
@@ -146,50 +191,45 @@ class GameUi(DynamicEntity):
         if gameover_sound != None:
             gameover_sound.play()
     
-    def __tick_game_over(self):
+    def __draw_game_over(self):
         screen = gamebase.get_screen()
 
-        screen.fill(MASK_COLOR, special_flags = pygame.BLEND_RGB_MULT)
+        gamebase.report_dirty_rect(screen.fill(MASK_COLOR, special_flags = pygame.BLEND_RGB_MULT))
         text_gameover = self.__text_gameover
-        screen.blit(
+        gamebase.report_dirty_rect(screen.blit(
             text_gameover,
             (GAMEOVER_POS_X - text_gameover.get_width() // 2, GAMEOVER_POS_Y)
-        )
-        text_score = typing.cast(Surface, self.__last_text_score)
-        screen.blit(
-            text_score,
-            (GAMEOVER_SCORE_POS_X - text_score.get_width() // 2,
-             GAMEOVER_SCORE_POS_Y)
-        )
-        text_speed = typing.cast(Surface, self.__last_text_speed)
-        screen.blit(
-            text_speed, 
-            (GAMEOVER_SPEED_POS_X - text_speed.get_width() // 2, 
-             GAMEOVER_SPEED_POS_Y)
-        )
+        ))
+        text_score = self.__text_score
+        gamebase.report_dirty_rect(text_score.draw(
+            screen,
+            (GAMEOVER_SCORE_POS_X - text_score.width // 2,
+             self.__gameover_score_pos_y)
+        ))
+        text_speed = self.__text_speed
+        gamebase.report_dirty_rect(text_speed.draw(
+            screen, 
+            (GAMEOVER_SPEED_POS_X - text_speed.width // 2, 
+             self.__gameover_speed_pos_y)
+        ))
         text_best_score = self.__text_best_score
-        screen.blit(
+        gamebase.report_dirty_rect(screen.blit(
             text_best_score,
             (GAMEOVER_BEST_SCORE_POS_X - text_best_score.get_width() // 2, 
-             GAMEOVER_BEST_SCORE_POS_Y)
-        )
+             self.__gameover_best_score_pos_y)
+        ))
+        text_rank = self.__text_rank
+        if text_rank != None:
+            gamebase.report_dirty_rect(screen.blit(
+                text_rank,
+                (GAMEOVER_RANK_POS_X - text_rank.get_width() // 2,
+                 self.__gameover_rank_pos_y)
+            ))
 
         if self.__gameover_accept_key:
             text_key_hint = self.__text_gameover_key_hint
-            screen.blit(
+            gamebase.report_dirty_rect(screen.blit(
                 text_key_hint, 
                 (GAMEOVER_KEY_HINT_POS_X - text_key_hint.get_width() // 2, 
-                GAMEOVER_KEY_HINT_POS_Y)
-            )
-
-        if not self.__gameover_accept_key:
-            self.__gameover_accept_key_timer += float(gamebase.TICK_TIME)
-            if self.__gameover_accept_key_timer >= GAMEOVER_ACCEPT_KEY_TIME:
-                self.__gameover_accept_key = True
-        
-        if self.__gameover_accept_key:
-            input_manager = self.__player_input_manager
-            if input_manager.request_jump:
-                gamebase.request_load_scene("GameScene")
-            if input_manager.request_escape:
-                gamebase.request_load_scene("MenuScene")
+                self.__gameover_key_hint_pos_y)
+            ))
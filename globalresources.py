@@ -1,15 +1,118 @@
+'''
+The sounds shared by the game. They're loaded by a background thread started by gamebase.run, so that decoding them doesn't delay the first frame, and not at all while the game is muted. A sound accessed before it's loaded is a SilentSound placeholder.
+
+Decoded samples are cached on disk, keyed by the hash of the source file and the mixer format, so later launches load the raw samples without decoding. Set the environment variable DONT_TOUCH_BLOCKS_SOUND_CACHE to another directory, or to an empty string to disable the cache.
+'''
+
+import hashlib
+import os
+import threading
+from typing import Any, Optional
 import pygame
 from pygame.mixer import Sound
+import startuptrace
+
+SOUND_CACHE_ENV_NAME = "DONT_TOUCH_BLOCKS_SOUND_CACHE"
+DEFAULT_SOUND_CACHE_DIR = "sound_cache"
+SOUND_CACHE_VERSION = 1
+
+class SilentSound:
+    '''
+    A stand-in for pygame.mixer.Sound that plays nothing, used when there's no audio device.
+    '''
+
+    def play(self, *args, **kwargs):
+        return None
 
 SND_JUMP: Sound
 SND_DEAD: Sound
 SND_NEW_BEST_SCORE: Sound
 
-def _load():
-    global SND_JUMP
-    global SND_DEAD
-    global SND_NEW_BEST_SCORE
+_SOUND_FILES = {
+    "SND_JUMP": "resources/193438__unfa__jumping.ogg",
+    "SND_DEAD": "resources/483598__raclure__wrong.mp3",
+    "SND_NEW_BEST_SCORE": "resources/588234__mehraniiii__win.ogg",
+}
+
+_PLACEHOLDER_SOUND = SilentSound()
+
+_load_thread: Optional[threading.Thread] = None
+
+def load_sound(path: str, cache_dir: str = "") -> Sound:
+    '''
+    Load a sound, from the cache of decoded samples if it's there. The mixer must be initialized.
+
+    Args:
+        cache_dir: The directory of the cache, or an empty string not to use the cache.
+
+    Raises:
+        pygame.error: The sound couldn't be decoded.
+        OSError: The file couldn't be read.
+    '''
+
+    if cache_dir == "":
+        return Sound(path)
+    with open(path, "rb") as f:
+        source = f.read()
+    key = hashlib.sha256()
+    key.update(source)
+    key.update(repr((SOUND_CACHE_VERSION, pygame.mixer.get_init())).encode())
+    cache_path = os.path.join(cache_dir, f"{os.path.basename(path)}.{key.hexdigest()[:32]}.pcm")
+    try:
+        with open(cache_path, "rb") as f:
+            return Sound(buffer = f.read())
+    except FileNotFoundError:
+        pass
+    sound = Sound(path)
+    try:
+        os.makedirs(cache_dir, exist_ok = True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(sound.get_raw())
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"WARNING: Couldn't cache the decoded sound {path} in {cache_dir}: {e}")
+    return sound
+
+def start_loading(is_silent: bool = False):
+    '''
+    Start loading the sounds on a background thread, unless it has been started. It must be called after the mixer is initialized.
+
+    Args:
+        is_silent: Whether to use SilentSound instead, when there's no audio device.
+    '''
+
+    global _load_thread
+    if _load_thread != None:
+        return
+    _load_thread = threading.Thread(target = _load, args = (is_silent,), daemon = True)
+    _load_thread.start()
+
+def is_loaded() -> bool:
+    '''
+    Returns whether the sounds are loaded, so that they're no longer placeholders.
+    '''
+
+    global _load_thread
+    return _load_thread != None and not _load_thread.is_alive()
+
+def _load(is_silent: bool = False):
+    with startuptrace.phase("sounds"):
+        if is_silent:
+            sounds: dict[str, Any] = {name: SilentSound() for name in _SOUND_FILES}
+        else:
+            cache_dir = os.environ.get(SOUND_CACHE_ENV_NAME, DEFAULT_SOUND_CACHE_DIR)
+            try:
+                sounds = {name: load_sound(path, cache_dir) for name, path in _SOUND_FILES.items()}
+            except (pygame.error, OSError) as e:
+                print(f"WARNING: Couldn't load the sounds, the game will be silent: {e}")
+                sounds = {name: SilentSound() for name in _SOUND_FILES}
+        # the sounds are published together, after all of them are loaded.
+        globals().update(sounds)
 
-    SND_JUMP = Sound("resources/193438__unfa__jumping.ogg")
-    SND_DEAD = Sound("resources/483598__raclure__wrong.mp3")
-    SND_NEW_BEST_SCORE = Sound("resources/588234__mehraniiii__win.ogg")
+def __getattr__(name: str) -> Any:
+    # only called while a sound isn't loaded yet, as the module attribute is found first afterwards.
+    if name not in _SOUND_FILES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    start_loading()
+    return _PLACEHOLDER_SOUND
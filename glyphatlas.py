@@ -0,0 +1,149 @@
+'''
+This module contains the glyph atlas, which draws short texts such as numbers by blitting pre-rendered glyphs instead of rendering the texts with the font.
+
+Rendering a text rasterizes every glyph and allocates a new surface, which the HUD did every time a number changed. An atlas rasterizes each glyph once, so drawing a text is a blit per character. The atlases of the default font are shared, see gamebase.get_glyph_atlas.
+'''
+
+from typing import Dict, Optional, Tuple
+import pygame
+from pygame import Color, Rect, Surface
+from pygame.font import Font
+
+GLYPH_ATLAS_CHARS = "0123456789.,:-+/% ms" # the glyphs rendered up front, others are added when they're first drawn
+
+class GlyphAtlas:
+    '''
+    The glyphs of a font in a colour, side by side on one surface.
+
+    Glyphs are laid out by their widths in whole pixels, while the font positions the glyphs of a rendered text by subpixels. So a text may be a pixel or two narrower than rendered, and the digits are evenly spaced.
+    '''
+
+    __font: Font
+    __color: Color
+    __antialias: bool
+    __surface: Surface
+    __glyph_rects: Dict[str, Rect] # the area of each glyph on the surface
+
+    def __init__(self, font: Font, color: Color, antialias: bool = True, chars: str = GLYPH_ATLAS_CHARS):
+        self.__font = font
+        self.__color = color
+        self.__antialias = antialias
+        self.__surface = Surface((0, font.get_height()), pygame.SRCALPHA)
+        self.__glyph_rects = {}
+        self.__add_glyphs(chars)
+
+    @property
+    def height(self) -> int:
+        return self.__surface.get_height()
+
+    def get_width(self, text: str) -> int:
+        glyph_rects = self.__glyph_rects
+        width = 0
+        for char in text:
+            rect = glyph_rects.get(char)
+            if rect == None:
+                self.__add_glyphs(char)
+                rect = glyph_rects[char]
+            width += rect.width
+        return width
+
+    def draw(self, target: Surface, text: str, pos: Tuple[int, int], special_flags: int = 0) -> Rect:
+        '''
+        Draw a text with its top left corner at pos.
+
+        Args:
+            special_flags: The blend flags of the glyph blits, as Surface.blit takes.
+
+        Returns:
+            The area drawn on the target, as Surface.blit does.
+        '''
+
+        glyph_rects = self.__glyph_rects
+        x, y = pos
+        for char in text:
+            if char not in glyph_rects:
+                self.__add_glyphs(char)
+        surface = self.__surface
+        blit = target.blit
+        for char in text:
+            rect = glyph_rects[char]
+            blit(surface, (x, y), rect, special_flags)
+            x += rect.width
+        return target.get_rect().clip((pos[0], y, x - pos[0], surface.get_height()))
+
+    def __add_glyphs(self, chars: str):
+        glyph_rects = self.__glyph_rects
+        new_chars = [char for char in dict.fromkeys(chars) if char not in glyph_rects]
+        if len(new_chars) == 0:
+            return
+        glyphs = [self.__font.render(char, self.__antialias, self.__color) for char in new_chars]
+        old_surface = self.__surface
+        x = old_surface.get_width()
+        height = old_surface.get_height()
+        surface = Surface((x + sum(glyph.get_width() for glyph in glyphs), height), pygame.SRCALPHA)
+        # glyphs are copied as they are onto the transparent surface, with their alpha.
+        surface.blit(old_surface, (0, 0))
+        for char, glyph in zip(new_chars, glyphs):
+            surface.blit(glyph, (x, 0))
+            glyph_rects[char] = Rect(x, 0, glyph.get_width(), height)
+            x += glyph.get_width()
+        self.__surface = surface
+
+class GlyphText:
+    '''
+    A text composed from a glyph atlas after a fixed label, on a surface that is reused. The text is only composed when it changes, so drawing it every tick is a single blit.
+    '''
+
+    __atlas: GlyphAtlas
+    __label: Optional[Surface]
+    __label_width: int
+    __surface: Surface
+    __text: Optional[str] = None
+    __width: int = 0
+
+    def __init__(self, atlas: GlyphAtlas, label: Optional[Surface] = None):
+        self.__atlas = atlas
+        self.__label = label
+        self.__label_width = 0 if label == None else label.get_width()
+        self.__allocate(self.__label_width)
+
+    @property
+    def text(self) -> Optional[str]:
+        return self.__text
+
+    @property
+    def width(self) -> int:
+        return self.__width
+
+    def set_text(self, text: str):
+        if text == self.__text:
+            return
+        self.__text = text
+        atlas = self.__atlas
+        label_width = self.__label_width
+        width = label_width + atlas.get_width(text)
+        if width > self.__surface.get_width():
+            self.__allocate(width)
+        else:
+            # only the last text is cleared, the label stays.
+            self.__surface.fill((0, 0, 0, 0), (label_width, 0, self.__width - label_width, atlas.height))
+        # the glyphs are drawn onto a cleared area, where taking the maximum copies them faster than blending.
+        atlas.draw(self.__surface, text, (label_width, 0), pygame.BLEND_RGBA_MAX)
+        self.__width = width
+
+    def draw(self, target: Surface, pos: Tuple[int, int]) -> Rect:
+        '''
+        Draw the label and the text with the top left corner at pos.
+
+        Returns:
+            The area drawn on the target, as Surface.blit does.
+        '''
+
+        surface = self.__surface
+        return target.blit(surface, pos, (0, 0, self.__width, surface.get_height()))
+
+    def __allocate(self, width: int):
+        # leave room for longer texts, so that the surface is rarely allocated again.
+        self.__surface = Surface((width * 2, self.__atlas.height), pygame.SRCALPHA)
+        if self.__label != None:
+            self.__surface.blit(self.__label, (0, 0))
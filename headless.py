@@ -0,0 +1,94 @@
+'''
+Run the game without a window at full speed, for benchmarking and soak testing.
+
+Usage:
+    python headless.py [--scene GameScene] [--seconds 1000] [--profile tick_profile.txt]
+'''
+
+import argparse
+import os
+import time
+import typing
+
+os.environ["DONT_TOUCH_BLOCKS_HEADLESS"] = "1"
+# the bots' runs aren't the player's, so they're kept out of the run history unless a path is given.
+os.environ.setdefault("DONT_TOUCH_BLOCKS_RUN_HISTORY", "")
+os.environ.setdefault("DONT_TOUCH_BLOCKS_FRAME_TELEMETRY", "")
+
+# the startup trace starts when it's imported, so it's imported first.
+import startuptrace
+with startuptrace.phase("import"):
+    import gamebase
+    from gamerule import GameRule
+    from gamescene import GameScene
+    from menuscene import MenuScene
+    from scene import DynamicEntity
+    import tickprofiler
+
+class SoakGameScene(GameScene):
+    '''
+    A game scene that restarts itself as soon as the game is over, so that a long run keeps exercising the gameplay entities.
+    '''
+
+    def on_create(self):
+
+        super().on_create()
+        self.spawn_entity(GameOverRestarter)
+
+class GameOverRestarter(DynamicEntity):
+
+    __game_rule: GameRule
+
+    __is_requested: bool = False
+
+    def on_spawn(self):
+
+        super().on_spawn()
+        self.__game_rule = typing.cast(
+            GameRule, self.scene.get_singleton_entity(GameRule)
+        )
+
+    def on_late_tick(self):
+
+        if self.__game_rule.is_game_over and not self.__is_requested:
+            self.__is_requested = True
+            gamebase.request_load_scene("SoakGameScene")
+
+def main():
+    parser = argparse.ArgumentParser(description = "Run the game headless and uncapped.")
+    parser.add_argument(
+        "--scene", default = "SoakGameScene",
+        help = "the registered scene to run (default: SoakGameScene)"
+    )
+    parser.add_argument(
+        "--seconds", type = float, default = 1000.0,
+        help = "simulated seconds to run (default: 1000)"
+    )
+    parser.add_argument(
+        "--profile", nargs = "?", const = tickprofiler.PROFILE_DUMP_FILE_PATH, default = None,
+        help = f"measure the time of every entity hook and write the table to a file (default: {tickprofiler.PROFILE_DUMP_FILE_PATH})"
+    )
+    args = parser.parse_args()
+
+    gamebase.register_scene("MenuScene", MenuScene)
+    gamebase.register_scene("GameScene", GameScene)
+    gamebase.register_scene("SoakGameScene", SoakGameScene)
+
+    if args.profile != None:
+        tickprofiler.set_enabled(True)
+    max_ticks = int(args.seconds * gamebase.TICK_RATE)
+    starttime_ns = time.perf_counter_ns()
+    gamebase.run(args.scene, max_ticks = max_ticks)
+    elapsed = (time.perf_counter_ns() - starttime_ns) / 1e9
+
+    ticks = gamebase.get_tick_count()
+    simulated = ticks / gamebase.TICK_RATE
+    print(f"simulated: {simulated:.2f} s in {ticks} ticks")
+    print(f"wall time: {elapsed:.3f} s")
+    print(f"speed: {ticks / elapsed:.0f} ticks/s ({simulated / elapsed:.1f}x real time)")
+    if args.profile != None:
+        tickprofiler.get_profiler().dump(args.profile)
+        print(f"profile: {args.profile}")
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,19 @@
 The entry of the game program.
 '''
 
-import gamebase
-from gamescene import GameScene
-from menuscene import MenuScene
+# the guard keeps the worker process of the process generation mode, which imports this module, from starting the game again
+if __name__ == "__main__":
+    import multiprocessing
+    # needed by the frozen executable built by build_windows.py
+    multiprocessing.freeze_support()
 
-gamebase.register_scene("MenuScene", MenuScene)
-gamebase.register_scene("GameScene", GameScene)
-gamebase.run("MenuScene") 
\ No newline at end of file
+    # the startup trace starts when it's imported, so it's imported first.
+    import startuptrace
+    with startuptrace.phase("import"):
+        import gamebase
+        from gamescene import GameScene
+        from menuscene import MenuScene
+
+    gamebase.register_scene("MenuScene", MenuScene)
+    gamebase.register_scene("GameScene", GameScene)
+    gamebase.run("MenuScene")
\ No newline at end of file
@@ -1,14 +1,21 @@
 
 from decimal import Decimal
+import time
 import typing
 from typing import Optional
 from pygame import Surface
 from basicscene import BasicScene
 from player import PlayerInputManager
 from scene import DynamicEntity
+import fixedpoint
 import gamebase
 import gamesave
+import runhistory
 
+MENU_TOP_RUN_COUNT = 5
+
+def _format_score(score_ticks: int) -> str:
+    return str(fixedpoint.to_decimal(score_ticks, gamebase.TICK_RATE, 1))
 
 class MenuScene(BasicScene):
     
@@ -25,6 +32,8 @@ class Menu(DynamicEntity):
     __text_key_hint2: Surface
     __text_key_hint3: Surface
     __text_best_score: Optional[Surface] = None
+    __text_today_best_score: Optional[Surface] = None
+    __text_top_scores: Optional[Surface] = None
 
     def on_spawn(self):
 
@@ -33,54 +42,67 @@ class Menu(DynamicEntity):
             PlayerInputManager, 
             self.scene.get_singleton_entity(PlayerInputManager)
         )
-        font = gamebase.get_default_font()
-        self.__text_key_hint1 = font.render(
+        self.__text_key_hint1 = gamebase.render_text(
             "Press Space to start the game!", True, "black"
         )
-        self.__text_key_hint2 = font.render(
+        self.__text_key_hint2 = gamebase.render_text(
             "Press F to toggle the fullscreen mode.", True, "black"
         )
-        self.__text_key_hint3 = font.render(
+        self.__text_key_hint3 = gamebase.render_text(
             "Press M to toggle the mute mode.", True, "black"
         )
         best_score = gamesave.get("best_score", Decimal)
         if best_score != Decimal(0):
-            self.__text_best_score = font.render(
+            self.__text_best_score = gamebase.render_text(
                 "Best Score: " + str(best_score), True, "orange"
             )
+        history = runhistory.get_run_history()
+        if history != None:
+            today_best = history.get_best_of_day(time.strftime("%Y-%m-%d"))
+            if today_best != None:
+                self.__text_today_best_score = gamebase.render_text(
+                    "Today's Best: " + _format_score(today_best.score_ticks), True, "orange"
+                )
+            top_runs = history.get_top_runs(MENU_TOP_RUN_COUNT)
+            if len(top_runs) > 0:
+                self.__text_top_scores = gamebase.render_text(
+                    "Top Runs: " + ", ".join(_format_score(run.score_ticks) for run in top_runs), True, "black"
+                )
         
-    def on_tick(self):
+    def on_input(self):
+
+        if self.__input_manager.request_jump:
+            gamebase.request_load_scene("GameScene")
+
+    def on_hud(self):
 
         screen = gamebase.get_screen()
-        input_manager = self.__input_manager
 
         x = gamebase.WINDOW_DIMENSION[0] // 2
         y = 300
         surface = self.__text_key_hint1
-        screen.blit(
+        gamebase.report_dirty_rect(screen.blit(
             surface, 
             (x - surface.get_width() // 2, y)
-        )
+        ))
         y += 60
         surface = self.__text_key_hint2
-        screen.blit(
+        gamebase.report_dirty_rect(screen.blit(
             surface, 
             (x - surface.get_width() // 2, y)
-        )
+        ))
         y += 60
         surface = self.__text_key_hint3
-        screen.blit(
+        gamebase.report_dirty_rect(screen.blit(
             surface, 
             (x - surface.get_width() // 2, y)
-        )
+        ))
         y += 60
-        surface = self.__text_best_score
-        if surface != None:
-            screen.blit(
-                surface,
-                (x - surface.get_width() // 2, y)
-            )
-        
-        if input_manager.request_jump:
-            gamebase.request_load_scene("GameScene")
+        for surface in (self.__text_best_score, self.__text_today_best_score, self.__text_top_scores):
+            if surface != None:
+                gamebase.report_dirty_rect(screen.blit(
+                    surface,
+                    (x - surface.get_width() // 2, y)
+                ))
+                y += 60
         
\ No newline at end of file
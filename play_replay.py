@@ -0,0 +1,57 @@
+'''
+Play a recorded run, in the window or headless at full speed, and check that it ends as recorded.
+
+Every finished run is saved to last_run.replay in the working directory.
+
+Usage:
+    python play_replay.py [--headless] [last_run.replay]
+'''
+
+import argparse
+import os
+import sys
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description = "Play a recorded run.")
+    parser.add_argument(
+        "path", nargs = "?", default = "last_run.replay",
+        help = "the replay file (default: last_run.replay)"
+    )
+    parser.add_argument(
+        "--headless", action = "store_true",
+        help = "run without a window at full speed and exit when the player dies"
+    )
+    args = parser.parse_args()
+
+    if args.headless:
+        os.environ["DONT_TOUCH_BLOCKS_HEADLESS"] = "1"
+    # gamebase reads the headless mode when it's imported, so import it after the mode is known.
+    import gamebase
+    from gamescene import GameScene
+    from menuscene import MenuScene
+    from replay import Replay
+    import runrecorder
+
+    replay = Replay.load(args.path)
+    gamebase.register_scene("MenuScene", MenuScene)
+    gamebase.register_scene("GameScene", GameScene)
+    runrecorder.set_next_replay(replay, quit_when_finished = args.headless)
+    starttime_ns = time.perf_counter_ns()
+    gamebase.run("GameScene")
+    elapsed = (time.perf_counter_ns() - starttime_ns) / 1e9
+
+    record = runrecorder.get_last_record()
+    print(f"replay: {replay}")
+    if record == None:
+        print("The replay was stopped before the player died.")
+        sys.exit(1)
+    if args.headless:
+        print(f"wall time: {elapsed:.3f} s")
+    if record != replay:
+        print(f"MISMATCH: the replayed run ended as {record}")
+        sys.exit(1)
+    print(f"OK: the player died at tick {record.death_tick} as recorded.")
+
+if __name__ == "__main__":
+    main()
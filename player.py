@@ -3,10 +3,11 @@ This module contains entities about player.
 '''
 
 from decimal import Decimal
-import decimal
+from fractions import Fraction
 import blockmap
 from blockmap import BlockMapManager
 import gamebase
+import fixedpoint
 from scene import Scene, DynamicEntity, PygameEventListenerEntity, SingletonEntity
 import pygame
 from pygame import draw
@@ -14,12 +15,15 @@ import globalresources
 import gamesave
 
 class PlayerInputManager(SingletonEntity, PygameEventListenerEntity, DynamicEntity):
+
+    tick_order = 100 # the requests are cleared after every other late hook
     
     __request_debug: bool = False
     __request_jump: bool = False
     __request_escape: bool = False
     __request_fullscreen: bool = False
     __request_mute: bool = False
+    __request_profile_dump: bool = False
 
     @property
     def request_debug(self) -> bool:
@@ -41,6 +45,10 @@ class PlayerInputManager(SingletonEntity, PygameEventListenerEntity, DynamicEnti
     def request_mute(self) -> bool:
         return self.__request_mute
 
+    @property
+    def request_profile_dump(self) -> bool:
+        return self.__request_profile_dump
+
     def on_pygame_event(self, event: pygame.event.Event):
         if event.type == pygame.KEYUP:
             key = event.key
@@ -54,7 +62,16 @@ class PlayerInputManager(SingletonEntity, PygameEventListenerEntity, DynamicEnti
                 self.__request_fullscreen = True
             elif key == pygame.K_m:
                 self.__request_mute = True
+            elif key == pygame.K_p:
+                self.__request_profile_dump = True
     
+    def replace_jump_request(self, request_jump: bool):
+        '''
+        Replace the jump request of the current tick, e.g. with a replayed one.
+        '''
+
+        self.__request_jump = request_jump
+
     def on_late_tick(self):
         
         self.__request_debug = False
@@ -62,6 +79,7 @@ class PlayerInputManager(SingletonEntity, PygameEventListenerEntity, DynamicEnti
         self.__request_escape = False
         self.__request_fullscreen = False
         self.__request_mute = False
+        self.__request_profile_dump = False
 
             
 PLAYER_JUMP_SPEED = Decimal(285)
@@ -77,13 +95,29 @@ PLAYER_MAX_SPEED = Decimal(600)
 PLAYER_SPEED_ACCEL_TO_MAX_TIME = Decimal(180)
 PLAYER_SPEED_ACCEL = (PLAYER_MAX_SPEED - PLAYER_INITIAL_SPEED) / PLAYER_SPEED_ACCEL_TO_MAX_TIME
 
+# fixed-point versions of the constants above, used by the per-tick physics
+PLAYER_JUMP_SPEED_FIXED = fixedpoint.speed_from_pixels_per_second(
+    PLAYER_JUMP_SPEED, gamebase.TICK_RATE)
+PLAYER_OFFSET_X_FIXED = fixedpoint.from_pixels(PLAYER_OFFSET_X)
+PLAYER_INITIAL_POS_Y_FIXED = fixedpoint.from_pixels(PLAYER_INITIAL_POS_Y)
+PLAYER_INITIAL_SPEED_FIXED = fixedpoint.speed_from_pixels_per_second(
+    PLAYER_INITIAL_SPEED, gamebase.TICK_RATE)
+PLAYER_MAX_SPEED_FIXED = fixedpoint.speed_from_pixels_per_second(
+    PLAYER_MAX_SPEED, gamebase.TICK_RATE)
+PLAYER_SPEED_ACCEL_FIXED = fixedpoint.exact(Fraction(
+    PLAYER_MAX_SPEED_FIXED - PLAYER_INITIAL_SPEED_FIXED, 
+    int(PLAYER_SPEED_ACCEL_TO_MAX_TIME) * gamebase.TICK_RATE
+))
+
 class Player(SingletonEntity, DynamicEntity):
 
+    tick_order = 20 # after the block maps move
+
     __input_manager: PlayerInputManager
     __blockmap_manager: BlockMapManager
 
-    __pos_y: Decimal = PLAYER_INITIAL_POS_Y
-    __speed_y: Decimal = Decimal(0)
+    __pos_y: int = PLAYER_INITIAL_POS_Y_FIXED
+    __speed_y: int = 0
 
     __is_dead: bool = False
 
@@ -98,25 +132,25 @@ class Player(SingletonEntity, DynamicEntity):
         self.__blockmap_manager = self.scene.get_singleton_entity(
             BlockMapManager) #type:ignore
         
-    def __move(self, dt: Decimal):
+    def __move(self):
         input_manager = self.__input_manager
         if input_manager.request_jump:
-            self.__speed_y = -PLAYER_JUMP_SPEED
+            self.__speed_y = -PLAYER_JUMP_SPEED_FIXED
             if not gamesave.get("is_mute", bool):
                 globalresources.SND_JUMP.play()
-        g_accel = gamebase.GRAVITY_ACCEL
-        self.__speed_y += g_accel * dt 
-        self.__pos_y += self.__speed_y * dt
+        self.__speed_y += gamebase.GRAVITY_ACCEL_FIXED
+        self.__pos_y += self.__speed_y
         
         y = self.__pos_y
-        if y < 0 or y > blockmap.BLOCK_MAP_SURFACE_HEIGHT or self.__blockmap_manager.test_touch_block(Decimal(PLAYER_OFFSET_X), y):
+        if y < 0 or y > blockmap.BLOCK_MAP_SURFACE_HEIGHT_FIXED or self.__blockmap_manager.test_touch_block(PLAYER_OFFSET_X_FIXED, y):
             self.__is_dead = True
     
     def on_tick(self):
-        dt = gamebase.TICK_TIME
+        if not self.__is_dead:
+            self.__move()
+
+    def on_render(self):
         screen = gamebase.get_screen()
         is_dead = self.__is_dead
-        if not is_dead:
-            self.__move(dt)
-        draw.circle(
-            screen, "blue" if not is_dead else "red", (PLAYER_OFFSET_X, int(self.__pos_y)), PLAYER_RADIUS)
+        gamebase.report_dirty_rect(draw.circle(
+            screen, "blue" if not is_dead else "red", (PLAYER_OFFSET_X, fixedpoint.to_pixels(self.__pos_y)), PLAYER_RADIUS))
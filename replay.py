@@ -0,0 +1,154 @@
+'''
+This module contains the replay data of a game run and its compact binary file format.
+
+A run is reproducible from the seed of its block map generation, the ticks when the player jumped and the block map swaps when no generated block map was ready in time. It doesn't import pygame, so that replays can be handled by worker processes cheaply.
+
+File format, all integers after the header are unsigned LEB128 varints:
+    magic b"DTBR", version(1 byte), seed(8 bytes, little endian)
+    death tick, or 0 if the run didn't end
+    number of jumps, followed by the delta of each jump tick from the previous one(the first one from 0)
+    number of starved swaps, followed by the delta of each swap index from the previous one
+    version 2 only: the id of the chunk library the block maps were taken from
+
+A run generated live is written in version 1, so that it's readable by older builds.
+'''
+
+import struct
+from typing import List, Optional, Tuple
+
+REPLAY_MAGIC = b"DTBR"
+REPLAY_VERSION = 2
+REPLAY_FILE_EXTENSION = ".replay"
+
+_HEADER = struct.Struct("<4sBQ")
+
+class ReplayFormatError(ValueError):
+    '''
+    Raised when the data isn't a valid replay.
+    '''
+
+    pass
+
+def _write_varint(out: bytearray, value: int):
+    if value < 0:
+        raise ValueError("A varint can't be negative!")
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    '''
+    Returns the value and the position after it.
+    '''
+
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ReplayFormatError("The replay data is truncated!")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def _write_ticks(out: bytearray, ticks: List[int]):
+    _write_varint(out, len(ticks))
+    last = 0
+    for tick in ticks:
+        _write_varint(out, tick - last)
+        last = tick
+
+def _read_ticks(data: bytes, pos: int) -> Tuple[List[int], int]:
+    count, pos = _read_varint(data, pos)
+    ticks: List[int] = []
+    last = 0
+    for _ in range(count):
+        delta, pos = _read_varint(data, pos)
+        last += delta
+        ticks.append(last)
+    return ticks, pos
+
+class Replay:
+    '''
+    The record of a game run.
+    '''
+
+    seed: int # the seed of the block map generation, a 64-bit unsigned int
+    jump_ticks: List[int] # the scene ticks when the player jumped, in ascending order
+    starved_swaps: List[int] # the indices of the block map swaps that fell back to an empty block map, in ascending order
+    death_tick: Optional[int] # the scene tick when the player died, i.e. the score in ticks, or None if the run didn't end
+    chunk_library_id: int # the id of the chunk library the block maps were taken from, or 0 if they were generated live
+
+    def __init__(self, seed: int, jump_ticks: Optional[List[int]] = None, starved_swaps: Optional[List[int]] = None, death_tick: Optional[int] = None, chunk_library_id: int = 0):
+        self.seed = seed
+        self.jump_ticks = [] if jump_ticks == None else jump_ticks
+        self.starved_swaps = [] if starved_swaps == None else starved_swaps
+        self.death_tick = death_tick
+        self.chunk_library_id = chunk_library_id
+
+    def to_bytes(self) -> bytes:
+        version = 1 if self.chunk_library_id == 0 else REPLAY_VERSION
+        out = bytearray(_HEADER.pack(REPLAY_MAGIC, version, self.seed))
+        _write_varint(out, 0 if self.death_tick == None else self.death_tick)
+        _write_ticks(out, self.jump_ticks)
+        _write_ticks(out, self.starved_swaps)
+        if version >= 2:
+            _write_varint(out, self.chunk_library_id)
+        return bytes(out)
+
+    @staticmethod
+    def from_bytes(data: bytes) -> "Replay":
+        '''
+        Raises:
+            ReplayFormatError: The data isn't a valid replay.
+        '''
+
+        if len(data) < _HEADER.size:
+            raise ReplayFormatError("The replay data is truncated!")
+        magic, version, seed = _HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC:
+            raise ReplayFormatError("The data isn't a replay!")
+        if not 1 <= version <= REPLAY_VERSION:
+            raise ReplayFormatError(f"The replay version {version} isn't supported!")
+        pos = _HEADER.size
+        death_tick, pos = _read_varint(data, pos)
+        jump_ticks, pos = _read_ticks(data, pos)
+        starved_swaps, pos = _read_ticks(data, pos)
+        chunk_library_id = 0
+        if version >= 2:
+            chunk_library_id, pos = _read_varint(data, pos)
+        if pos != len(data):
+            raise ReplayFormatError("There's extra data after the replay!")
+        return Replay(
+            seed, jump_ticks, starved_swaps, None if death_tick == 0 else death_tick, chunk_library_id)
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @staticmethod
+    def load(path: str) -> "Replay":
+        '''
+        Raises:
+            OSError: The file couldn't be read.
+            ReplayFormatError: The file isn't a valid replay.
+        '''
+
+        with open(path, "rb") as f:
+            return Replay.from_bytes(f.read())
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Replay):
+            return False
+        return (
+            self.seed == other.seed and self.jump_ticks == other.jump_ticks
+            and self.starved_swaps == other.starved_swaps
+            and self.death_tick == other.death_tick
+            and self.chunk_library_id == other.chunk_library_id
+        )
+
+    def __repr__(self) -> str:
+        return f"Replay(seed={self.seed}, jumps={len(self.jump_ticks)}, starved_swaps={len(self.starved_swaps)}, death_tick={self.death_tick}, chunk_library_id={self.chunk_library_id:016x})"
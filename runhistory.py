@@ -0,0 +1,319 @@
+'''
+This module contains the run history: every finished run, appended to a local SQLite database, and the leaderboard queries on it.
+
+The queries never load the whole history. The top runs are read through an index on the score, and summary tables are kept up to date on every append: the best run of each day, and the number of runs of each score and of each second of score. A percentile query sums the counts of the seconds up to the one it falls in, then the counts of the scores within that second, instead of counting the runs. So every query stays well under a millisecond with a million runs.
+
+Runs are appended behind by a background thread with its own connection, so a slow disk never stalls a tick. The database is in WAL mode, so reading never waits for a write. It doesn't import pygame.
+'''
+
+import atexit
+import math
+import os
+import sqlite3
+import threading
+import time
+import typing
+from typing import List, Optional, Tuple
+from utils import HandoffQueue
+
+RUN_HISTORY_ENV_NAME = "DONT_TOUCH_BLOCKS_RUN_HISTORY"
+DEFAULT_RUN_HISTORY_FILE_PATH = "run_history.db"
+RUN_HISTORY_VERSION = 1
+SCORE_BUCKET_TICKS = 100 # the scores counted together in score_bucket_counts, a second at the tick rate
+
+_SCHEMA = f'''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    score_ticks INTEGER NOT NULL,
+    max_speed INTEGER NOT NULL,
+    duration_ms INTEGER NOT NULL,
+    seed INTEGER,
+    timestamp REAL NOT NULL,
+    day TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_by_score ON runs (score_ticks DESC, id);
+CREATE TABLE IF NOT EXISTS score_counts (
+    score_ticks INTEGER PRIMARY KEY,
+    count INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS score_bucket_counts (
+    bucket INTEGER PRIMARY KEY,
+    count INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS daily_bests (
+    day TEXT PRIMARY KEY,
+    run_id INTEGER NOT NULL,
+    score_ticks INTEGER NOT NULL
+) WITHOUT ROWID;
+PRAGMA user_version = {RUN_HISTORY_VERSION};
+'''
+
+class RunRecord:
+    '''
+    A finished run.
+    '''
+
+    score_ticks: int # the survival time in ticks
+    max_speed: int # the highest player speed in sub-pixels per tick
+    duration_ms: int # the real time the run took
+    seed: Optional[int] # the seed of the block map generation, a 64-bit unsigned int
+    timestamp: float # when the run finished, in seconds since the epoch
+    run_id: Optional[int] # the id in the history, None if it isn't stored yet
+
+    def __init__(self, score_ticks: int, max_speed: int, duration_ms: int, seed: Optional[int], timestamp: float, run_id: Optional[int] = None):
+        self.score_ticks = score_ticks
+        self.max_speed = max_speed
+        self.duration_ms = duration_ms
+        self.seed = seed
+        self.timestamp = timestamp
+        self.run_id = run_id
+
+    @property
+    def day(self) -> str:
+        '''
+        Returns the local date of the run, as "YYYY-MM-DD".
+        '''
+
+        return time.strftime("%Y-%m-%d", time.localtime(self.timestamp))
+
+    def __repr__(self) -> str:
+        return f"RunRecord(score_ticks={self.score_ticks}, max_speed={self.max_speed}, duration_ms={self.duration_ms}, seed={self.seed}, timestamp={self.timestamp}, run_id={self.run_id})"
+
+def _seed_to_db(seed: Optional[int]) -> Optional[int]:
+    # SQLite integers are signed.
+    if seed == None or seed < (1 << 63):
+        return seed
+    return seed - (1 << 64)
+
+def _seed_from_db(seed: Optional[int]) -> Optional[int]:
+    if seed == None or seed >= 0:
+        return seed
+    return seed + (1 << 64)
+
+class RunHistory:
+    '''
+    A connection to a run history database, which is created if it doesn't exist. A RunHistory must only be used by the thread that opened it.
+    '''
+
+    __connection: sqlite3.Connection
+
+    def __init__(self, path: str):
+        self.__connection = sqlite3.connect(path)
+        self.__connection.execute("PRAGMA journal_mode = WAL")
+        self.__connection.executescript(_SCHEMA)
+
+    def close(self):
+        self.__connection.close()
+
+    def append(self, run: RunRecord) -> int:
+        '''
+        Append a run and update the summary tables, in one transaction.
+
+        Returns:
+            The id of the run.
+        '''
+
+        connection = self.__connection
+        day = run.day
+        with connection:
+            run_id = typing.cast(int, connection.execute(
+                "INSERT INTO runs (score_ticks, max_speed, duration_ms, seed, timestamp, day) VALUES (?, ?, ?, ?, ?, ?)",
+                (run.score_ticks, run.max_speed, run.duration_ms, _seed_to_db(run.seed), run.timestamp, day)
+            ).lastrowid)
+            connection.execute(
+                "INSERT INTO score_counts (score_ticks, count) VALUES (?, 1) "
+                "ON CONFLICT (score_ticks) DO UPDATE SET count = count + 1",
+                (run.score_ticks,)
+            )
+            connection.execute(
+                "INSERT INTO score_bucket_counts (bucket, count) VALUES (?, 1) "
+                "ON CONFLICT (bucket) DO UPDATE SET count = count + 1",
+                (run.score_ticks // SCORE_BUCKET_TICKS,)
+            )
+            connection.execute(
+                "INSERT INTO daily_bests (day, run_id, score_ticks) VALUES (?, ?, ?) "
+                "ON CONFLICT (day) DO UPDATE SET run_id = excluded.run_id, score_ticks = excluded.score_ticks "
+                "WHERE excluded.score_ticks > daily_bests.score_ticks",
+                (day, run_id, run.score_ticks)
+            )
+        run.run_id = run_id
+        return run_id
+
+    def get_run_count(self) -> int:
+        row = self.__connection.execute("SELECT TOTAL(count) FROM score_bucket_counts").fetchone()
+        return int(row[0])
+
+    def get_top_runs(self, count: int) -> List[RunRecord]:
+        '''
+        Returns the runs with the highest scores, the highest first. Runs of the same score are in the order they were appended.
+        '''
+
+        return [
+            self.__to_record(row) for row in self.__connection.execute(
+                "SELECT score_ticks, max_speed, duration_ms, seed, timestamp, id FROM runs "
+                "ORDER BY score_ticks DESC, id LIMIT ?",
+                (count,)
+            )
+        ]
+
+    def get_daily_bests(self, count: int) -> List[Tuple[str, RunRecord]]:
+        '''
+        Returns the best run of each of the last days that have runs, the latest day first.
+        '''
+
+        return [
+            (row[0], self.__to_record(row[1:])) for row in self.__connection.execute(
+                "SELECT daily_bests.day, runs.score_ticks, max_speed, duration_ms, seed, timestamp, runs.id "
+                "FROM daily_bests JOIN runs ON runs.id = daily_bests.run_id "
+                "ORDER BY daily_bests.day DESC LIMIT ?",
+                (count,)
+            )
+        ]
+
+    def get_best_of_day(self, day: str) -> Optional[RunRecord]:
+        '''
+        Returns the best run of a day, as "YYYY-MM-DD", or None if there's no run that day.
+        '''
+
+        row = self.__connection.execute(
+            "SELECT runs.score_ticks, max_speed, duration_ms, seed, timestamp, runs.id "
+            "FROM daily_bests JOIN runs ON runs.id = daily_bests.run_id WHERE daily_bests.day = ?",
+            (day,)
+        ).fetchone()
+        return None if row == None else self.__to_record(row)
+
+    def get_score_at_percentile(self, percent: float) -> Optional[int]:
+        '''
+        Returns the nearest-rank percentile of the scores in ticks, or None if there's no run.
+        '''
+
+        run_count = self.get_run_count()
+        if run_count == 0:
+            return None
+        rank = max(1, math.ceil(run_count * percent / 100))
+        connection = self.__connection
+        cumulative_count = 0
+        for bucket, count in connection.execute("SELECT bucket, count FROM score_bucket_counts ORDER BY bucket"):
+            if cumulative_count + count >= rank:
+                break
+            cumulative_count += count
+        for score_ticks, count in connection.execute(
+            "SELECT score_ticks, count FROM score_counts WHERE score_ticks >= ? AND score_ticks < ? ORDER BY score_ticks",
+            (bucket * SCORE_BUCKET_TICKS, (bucket + 1) * SCORE_BUCKET_TICKS)
+        ):
+            cumulative_count += count
+            if cumulative_count >= rank:
+                break
+        return score_ticks
+
+    def get_percentile_rank(self, score_ticks: int) -> float:
+        '''
+        Returns the percentage of the runs whose scores are lower than a score, 0 if there's no run.
+        '''
+
+        bucket = score_ticks // SCORE_BUCKET_TICKS
+        lower_count, run_count = self.__connection.execute(
+            "SELECT TOTAL(CASE WHEN bucket < ? THEN count ELSE 0 END), TOTAL(count) FROM score_bucket_counts",
+            (bucket,)
+        ).fetchone()
+        if run_count == 0:
+            return 0.0
+        lower_count += self.__connection.execute(
+            "SELECT TOTAL(count) FROM score_counts WHERE score_ticks >= ? AND score_ticks < ?",
+            (bucket * SCORE_BUCKET_TICKS, score_ticks)
+        ).fetchone()[0]
+        return lower_count * 100 / run_count
+
+    @staticmethod
+    def __to_record(row: tuple) -> RunRecord:
+        score_ticks, max_speed, duration_ms, seed, timestamp, run_id = row
+        return RunRecord(score_ticks, max_speed, duration_ms, _seed_from_db(seed), timestamp, run_id)
+
+_path: str = os.environ.get(RUN_HISTORY_ENV_NAME, DEFAULT_RUN_HISTORY_FILE_PATH)
+_reader: Optional[RunHistory] = None
+_writer_queue: HandoffQueue[RunRecord] = HandoffQueue()
+_writer_thread: Optional[threading.Thread] = None
+
+def is_enabled() -> bool:
+    '''
+    Returns whether runs are recorded. Setting the environment variable DONT_TOUCH_BLOCKS_RUN_HISTORY to an empty string disables the history, and to a path moves it.
+    '''
+
+    global _path
+    return _path != ""
+
+def get_run_history() -> Optional[RunHistory]:
+    '''
+    Returns the connection of the main thread to the run history, which is opened on the first call, or None if the history is disabled or can't be opened.
+    '''
+
+    global _reader
+    if _reader == None and is_enabled():
+        try:
+            _reader = RunHistory(_path)
+        except sqlite3.Error as e:
+            print(f"WARNING: Couldn't open the run history {_path}: {e}")
+            set_path("")
+    return _reader
+
+def set_path(path: str):
+    '''
+    Use another run history file, or none if path is an empty string. The pending runs are written to the old one first.
+    '''
+
+    global _path, _reader
+    flush()
+    if _reader != None:
+        _reader.close()
+        _reader = None
+    _path = path
+
+def append_later(run: RunRecord):
+    '''
+    Append a run by the background writer, unless the history is disabled. If the writer has stopped on an error, the history is disabled, so that runs aren't queued for nobody.
+    '''
+
+    global _writer_thread
+    if _writer_thread != None and not _writer_thread.is_alive():
+        # the writer only stops by itself on an error, which it has reported.
+        print(f"WARNING: The run history {_path} is disabled for the rest of the session.")
+        set_path("")
+    if not is_enabled():
+        return
+    if _writer_thread == None:
+        _writer_thread = threading.Thread(target = _run_writer_thread, args = (_path, _writer_queue), daemon = True)
+        _writer_thread.start()
+    _writer_queue.put(run)
+
+def flush():
+    '''
+    Wait until the pending runs are appended. The writer is started again by the next append_later.
+    '''
+
+    global _writer_queue, _writer_thread
+    if _writer_thread == None:
+        return
+    _writer_queue.close()
+    _writer_thread.join()
+    _writer_queue = HandoffQueue()
+    _writer_thread = None
+
+def _run_writer_thread(path: str, queue: HandoffQueue[RunRecord]):
+    history: Optional[RunHistory] = None
+    try:
+        history = RunHistory(path)
+        while True:
+            run = queue.get()
+            if run == None:
+                # the queue is closed, but the runs put before that are still appended.
+                run = queue.get_nowait()
+                if run == None:
+                    break
+            history.append(run)
+    except sqlite3.Error as e:
+        print(f"WARNING: Couldn't append to the run history {path}: {e}")
+    finally:
+        if history != None:
+            history.close()
+
+atexit.register(flush)
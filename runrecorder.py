@@ -0,0 +1,167 @@
+'''
+This module contains the entity that records a game run for replays, or replays a recorded one.
+'''
+
+import random
+import typing
+from typing import Optional
+from blockmap import BlockMapManager
+import gamebase
+from player import Player, PlayerInputManager
+from replay import Replay, REPLAY_FILE_EXTENSION
+from scene import DynamicEntity, SingletonEntity
+
+LAST_REPLAY_FILE_PATH = "last_run" + REPLAY_FILE_EXTENSION
+
+_next_replay: Optional[Replay] = None
+_quit_after_next_replay: bool = False
+_last_record: Optional[Replay] = None
+
+def set_next_replay(replay: Optional[Replay], quit_when_finished: bool = False):
+    '''
+    Make the RunRecorder spawned next replay the given run instead of recording a new one. It only affects one run.
+
+    Args:
+        replay: The run to replay.
+        quit_when_finished: Whether to exit the game loop as soon as the player dies.
+    '''
+
+    global _next_replay
+    global _quit_after_next_replay
+    _next_replay = replay
+    _quit_after_next_replay = quit_when_finished
+
+def get_last_record() -> Optional[Replay]:
+    '''
+    Returns what happened in the last finished run, recorded or replayed, or None if no run has finished.
+    '''
+
+    global _last_record
+    return _last_record
+
+class RunRecorder(SingletonEntity, DynamicEntity):
+    '''
+    Records the seed of the block map generation, the jumps and the block map starvations of a game run, and saves the replay to LAST_REPLAY_FILE_PATH when the player dies.
+
+    If a replay is set by set_next_replay, the recorded jumps replace the input of the player and the recorded starvations are reproduced until the player dies, or until the replay is given up because the generator didn't deliver a blockmap, see replay_error.
+
+    It must be spawned before BlockMapGenerator, so that the seed is chosen before the generation starts. The jumps are replaced in the input phase, before the player moves.
+    '''
+
+    tick_order = -10 # the record is finished before other late hooks read it
+
+    __input_manager: PlayerInputManager
+    __blockmap_manager: Optional[BlockMapManager] = None
+    __player: Optional[Player] = None
+
+    __replay: Optional[Replay] = None # the replay being played
+    __record: Replay # what happens in this run
+    __next_jump_index: int = 0
+    __is_finished: bool = False
+    __quit_when_finished: bool = False
+
+    @property
+    def seed(self) -> int:
+        return self.__record.seed
+
+    @property
+    def is_replaying(self) -> bool:
+        return self.__replay != None
+
+    @property
+    def is_finished(self) -> bool:
+        '''
+        Returns whether the player has died, or the replay has been given up.
+        '''
+
+        return self.__is_finished
+
+    @property
+    def replay_error(self) -> Optional[str]:
+        '''
+        Returns why the replay has been given up, or None.
+        '''
+
+        blockmap_manager = self.__blockmap_manager
+        return None if blockmap_manager == None else blockmap_manager.replay_error
+
+    @property
+    def record(self) -> Replay:
+        '''
+        Returns what has happened in this run so far. Its chunk_library_id is set by BlockMapGenerator when the run takes block maps from a chunk library.
+        '''
+
+        return self.__record
+
+    def on_spawn(self):
+        global _next_replay
+
+        super().on_spawn()
+        self.__input_manager = typing.cast(
+            PlayerInputManager,
+            self.scene.get_singleton_entity(PlayerInputManager)
+        )
+        replay = _next_replay
+        _next_replay = None
+        self.__replay = replay
+        self.__quit_when_finished = replay != None and _quit_after_next_replay
+        self.__record = Replay(
+            random.getrandbits(64) if replay == None else replay.seed,
+            chunk_library_id = 0 if replay == None else replay.chunk_library_id
+        )
+
+    def on_input(self):
+        if self.__is_finished:
+            return
+        if self.__player == None:
+            # they're spawned after this entity.
+            self.__player = typing.cast(
+                Player, self.scene.get_singleton_entity(Player)
+            )
+            self.__blockmap_manager = typing.cast(
+                BlockMapManager,
+                self.scene.get_singleton_entity(BlockMapManager)
+            )
+            if self.__replay != None:
+                self.__blockmap_manager.replay_starvations(
+                    self.__replay.starved_swaps)
+
+        tick = self.scene.tick_count
+        replay = self.__replay
+        input_manager = self.__input_manager
+        if replay != None:
+            jump_ticks = replay.jump_ticks
+            index = self.__next_jump_index
+            request_jump = index < len(jump_ticks) and jump_ticks[index] == tick
+            if request_jump:
+                self.__next_jump_index = index + 1
+            input_manager.replace_jump_request(request_jump)
+        if input_manager.request_jump:
+            self.__record.jump_ticks.append(tick)
+
+    def on_late_tick(self):
+        global _last_record
+
+        player = self.__player
+        if self.__is_finished or player == None:
+            return
+        if not player.is_dead:
+            if self.__replay != None and self.replay_error != None:
+                # the run can't be reproduced anymore, so it ends without a record.
+                self.__is_finished = True
+                if self.__quit_when_finished:
+                    gamebase.request_quit()
+            return
+        self.__is_finished = True
+        record = self.__record
+        record.death_tick = self.scene.tick_count
+        record.starved_swaps = list(
+            typing.cast(BlockMapManager, self.__blockmap_manager).starved_swaps)
+        _last_record = record
+        if self.__quit_when_finished:
+            gamebase.request_quit()
+        if self.__replay == None:
+            try:
+                record.save(LAST_REPLAY_FILE_PATH)
+            except OSError as e:
+                print(f"WARNING: Couldn't save the replay to {LAST_REPLAY_FILE_PATH}: {e}")
@@ -2,31 +2,83 @@
 This module is mainly about scenes and entities.
 '''
 
+import time
 import typing
-from typing import List, Set, Dict, Type, Optional
+from typing import Callable, List, Set, Dict, Tuple, Type, Optional
 from abc import ABC, abstractmethod
+from enum import IntEnum
 import pygame
+import tickprofiler
+from tickprofiler import TickProfiler
 from utils import DecimalVector2, InvalidOperationException
 
+class TickPhase(IntEnum):
+    '''
+    The phases of a tick in the order they run. A DynamicEntity is only called in the phases whose hook it overrides.
+    '''
+
+    INPUT = 0 # on_input: read or replace the input of the tick
+    SIMULATION = 1 # on_tick: update the game state
+    RENDER = 2 # on_render: draw the world
+    HUD = 3 # on_hud: draw the user interface over the world
+    LATE = 4 # on_late_tick: react to the result of the tick
+
+_PHASE_HOOK_NAMES = ("on_input", "on_tick", "on_render", "on_hud", "on_late_tick")
+# the drawing of a tick runs from the start of RENDER to the end of HUD, i.e. the start of LATE
+_RENDER_START_PHASE = int(TickPhase.RENDER)
+_RENDER_END_PHASE = int(TickPhase.LATE)
+
+# (sort key, entity, hook) of a scheduled hook
+_ScheduledHook = Tuple[Tuple[int, str, int], "DynamicEntity", Callable[[], None]]
+
 class Scene(ABC):
     '''
     Represent for a stage of the game, a collection or manager of game entities.
 
     This class is responsible for managing a group of associated game entities, 
     including spawning entities, updating entities, distributing events to entities, and so on. Concrete scenes should be implemented by inheriting this class.
+
+    While the tick profiler is enabled, see the module tickprofiler, the time of every hook and event call is recorded.
+
+    A tick runs the phases of TickPhase in order. In each phase, the entities are called in the order of their tick_order, then their class names, and only then the order they were spawned in. Entities spawned or destroyed while a tick or an event is being dispatched join or leave the schedule when the dispatch ends, so that the schedule is never copied.
     '''
 
     __entities: Set["Entity"]
-    __dynamic_entities: List["DynamicEntity"]
+    __phase_hooks: List[List[_ScheduledHook]] # the scheduled hooks of each phase, sorted by the sort key
     __pygame_event_listener_entities: List["PygameEventListenerEntity"]
     __singleton_entities: Dict[Type["SingletonEntity"], "SingletonEntity"]
+    __tick_count: int = 0
+    __spawn_count: int = 0
+    __last_render_ns: int = 0
+
+    __is_dispatching: bool = False
+    __pending_spawned_entities: List["Entity"] # spawned during the dispatch
+    __pending_destroyed_entities: Set["Entity"] # destroyed during the dispatch, which aren't called anymore
     
     def __init__(self):
         self.__entities = set()
-        self.__dynamic_entities = []
+        self.__phase_hooks = [[] for _ in TickPhase]
         self.__pygame_event_listener_entities = []
         self.__singleton_entities = {}
+        self.__pending_spawned_entities = []
+        self.__pending_destroyed_entities = set()
     
+    @property
+    def tick_count(self) -> int:
+        '''
+        Returns the index of the current tick, counting from 1 for the first tick of the scene.
+        '''
+
+        return self.__tick_count
+
+    @property
+    def last_render_ns(self) -> int:
+        '''
+        Returns the nanoseconds the last tick spent in the phases RENDER and HUD, i.e. drawing rather than updating the game.
+        '''
+
+        return self.__last_render_ns
+
     @abstractmethod
     def on_create(self):
         '''
@@ -47,6 +99,8 @@ class Scene(ABC):
         '''
         Spawn a entity in the scene.
 
+        The entity is spawned at once, but if a tick or an event is being dispatched, it's only called from the next dispatch.
+
         Args:
             entity_type: A type of the entity to spawn, which must be the subclass of Entity.
 
@@ -64,15 +118,15 @@ class Scene(ABC):
             raise ValueError("Arg entity_type must be the subclass of Entity!")
         
         entity = entity_type(self)
-        self.__entities.add(entity)
-        if isinstance(entity, DynamicEntity):
-            self.__dynamic_entities.append(entity)
-        if isinstance(entity, PygameEventListenerEntity):
-            self.__pygame_event_listener_entities.append(entity)
         if isinstance(entity, SingletonEntity):
             if entity_type in self.__singleton_entities:
                 raise InvalidOperationException(f"Couldn't spawn the singleton entity of the type {entity_type}: there's alreay a instance!")
             self.__singleton_entities[typing.cast(Type[SingletonEntity], entity_type)] = entity
+        self.__entities.add(entity)
+        if self.__is_dispatching:
+            self.__pending_spawned_entities.append(entity)
+        else:
+            self.__schedule(entity)
             
         entity.on_spawn()
 
@@ -89,12 +143,14 @@ class Scene(ABC):
         '''
 
         self.__entities.remove(entity)
-        if isinstance(entity, DynamicEntity):
-            self.__dynamic_entities.remove(entity)
-        if isinstance(entity, PygameEventListenerEntity):
-            self.__pygame_event_listener_entities.remove(entity)
         if isinstance(entity, SingletonEntity):
             del self.__singleton_entities[type(entity)]
+        if not self.__is_dispatching:
+            self.__unschedule(entity)
+        elif entity in self.__pending_spawned_entities:
+            self.__pending_spawned_entities.remove(entity)
+        else:
+            self.__pending_destroyed_entities.add(entity)
     
     def _tick(self):
         '''
@@ -103,11 +159,44 @@ class Scene(ABC):
         This method can only be called by the module gamebase!
         '''
 
-        entity_buffer = self.__dynamic_entities.copy()
-        for entity in entity_buffer:
-            entity.on_tick()
-        for entity in entity_buffer:
-            entity.on_late_tick()
+        self.__tick_count += 1
+        profiler = tickprofiler.get_active_profiler()
+        destroyed_entities = self.__pending_destroyed_entities
+        self.__is_dispatching = True
+        try:
+            if profiler != None:
+                self.__tick_profiled(profiler)
+            else:
+                perf_counter_ns = time.perf_counter_ns
+                render_starttime_ns = 0
+                for phase, phase_hooks in enumerate(self.__phase_hooks):
+                    if phase == _RENDER_START_PHASE:
+                        render_starttime_ns = perf_counter_ns()
+                    elif phase == _RENDER_END_PHASE:
+                        self.__last_render_ns = perf_counter_ns() - render_starttime_ns
+                    for _, entity, hook in phase_hooks:
+                        if destroyed_entities and entity in destroyed_entities:
+                            continue
+                        hook()
+        finally:
+            self.__end_dispatch()
+
+    def __tick_profiled(self, profiler: TickProfiler):
+        destroyed_entities = self.__pending_destroyed_entities
+        perf_counter_ns = time.perf_counter_ns
+        render_starttime_ns = 0
+        for phase, (hook_name, phase_hooks) in enumerate(zip(_PHASE_HOOK_NAMES, self.__phase_hooks)):
+            if phase == _RENDER_START_PHASE:
+                render_starttime_ns = perf_counter_ns()
+            elif phase == _RENDER_END_PHASE:
+                self.__last_render_ns = perf_counter_ns() - render_starttime_ns
+            for _, entity, hook in phase_hooks:
+                if destroyed_entities and entity in destroyed_entities:
+                    continue
+                starttime_ns = perf_counter_ns()
+                hook()
+                profiler.record(type(entity), hook_name, perf_counter_ns() - starttime_ns)
+        profiler.end_tick()
 
     def _destroy(self):
         '''
@@ -130,9 +219,57 @@ class Scene(ABC):
         This method can only be called by the module gamebase!
         '''
 
-        entity_buffer = self.__pygame_event_listener_entities.copy()
-        for entity in entity_buffer:
-            entity.on_pygame_event(event)
+        profiler = tickprofiler.get_active_profiler()
+        destroyed_entities = self.__pending_destroyed_entities
+        self.__is_dispatching = True
+        try:
+            for entity in self.__pygame_event_listener_entities:
+                if destroyed_entities and entity in destroyed_entities:
+                    continue
+                if profiler != None:
+                    starttime_ns = time.perf_counter_ns()
+                    entity.on_pygame_event(event)
+                    profiler.record(type(entity), "on_pygame_event", time.perf_counter_ns() - starttime_ns)
+                else:
+                    entity.on_pygame_event(event)
+        finally:
+            self.__end_dispatch()
+
+    def __end_dispatch(self):
+        self.__is_dispatching = False
+        if self.__pending_destroyed_entities:
+            for entity in self.__pending_destroyed_entities:
+                self.__unschedule(entity)
+            self.__pending_destroyed_entities.clear()
+        if self.__pending_spawned_entities:
+            for entity in self.__pending_spawned_entities:
+                self.__schedule(entity)
+            self.__pending_spawned_entities.clear()
+
+    def __schedule(self, entity: "Entity"):
+        if isinstance(entity, PygameEventListenerEntity):
+            self.__pygame_event_listener_entities.append(entity)
+        if not isinstance(entity, DynamicEntity):
+            return
+        entity_type = type(entity)
+        key = (entity.tick_order, entity_type.__qualname__, self.__spawn_count)
+        self.__spawn_count += 1
+        for phase, name in enumerate(_PHASE_HOOK_NAMES):
+            # the hooks an entity doesn't override are never called.
+            if getattr(entity_type, name) is not getattr(DynamicEntity, name):
+                phase_hooks = self.__phase_hooks[phase]
+                phase_hooks.append((key, entity, getattr(entity, name)))
+                phase_hooks.sort(key = lambda scheduled_hook: scheduled_hook[0])
+
+    def __unschedule(self, entity: "Entity"):
+        if isinstance(entity, PygameEventListenerEntity):
+            self.__pygame_event_listener_entities.remove(entity)
+        if not isinstance(entity, DynamicEntity):
+            return
+        for phase_hooks in self.__phase_hooks:
+            phase_hooks[:] = [
+                scheduled_hook for scheduled_hook in phase_hooks if scheduled_hook[1] is not entity
+            ]
 
 class Entity(ABC):
     '''
@@ -222,18 +359,43 @@ class PygameEventListenerEntity(Entity):
 class DynamicEntity(Entity):
     '''
     Entities of this type will be updated on every game tick(in other word, frame).
+
+    Override the hooks of the phases the entity takes part in, see TickPhase.
     '''
 
+    tick_order: int = 0 # the order in every phase, the lower the earlier
+
+    def on_input(self):
+        '''
+        This method will be called on every game tick before the simulation, to read or replace the input.
+        '''
+
+        pass
+
     def on_tick(self):
         '''
-        This method will be called on every game tick.
+        This method will be called on every game tick to update the game state.
+        '''
+
+        pass
+
+    def on_render(self):
+        '''
+        This method will be called on every game tick after the simulation, to draw the world.
+        '''
+
+        pass
+
+    def on_hud(self):
+        '''
+        This method will be called on every game tick after the world is drawn, to draw the user interface.
         '''
 
         pass
 
     def on_late_tick(self):
         '''
-        This method will be called after the method on_tick of all entities is called
+        This method will be called at the end of every game tick, after the other hooks of all entities are called.
         '''
 
         pass
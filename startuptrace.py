@@ -0,0 +1,114 @@
+'''
+This module contains the startup trace: how long each phase of the startup takes, up to the first frame presented.
+
+The times are relative to the first import of this module, so main.py imports it before anything else. The trace is always kept, as it costs a few timestamps. Set the environment variable DONT_TOUCH_BLOCKS_STARTUP_TRACE to a path to write it there when the first frame is presented. It doesn't import pygame.
+'''
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+STARTUP_TRACE_ENV_NAME = "DONT_TOUCH_BLOCKS_STARTUP_TRACE"
+
+class StartupPhase:
+    '''
+    A phase of the startup. Times are in nanoseconds since the trace started.
+    '''
+
+    name: str
+    start_ns: int
+    end_ns: int
+    is_background: bool # whether it ran on another thread, alongside the main thread
+
+    def __init__(self, name: str, start_ns: int, end_ns: int, is_background: bool):
+        self.name = name
+        self.start_ns = start_ns
+        self.end_ns = end_ns
+        self.is_background = is_background
+
+_origin_ns: int = time.perf_counter_ns()
+_phases: List[StartupPhase] = []
+_phases_lock: threading.Lock = threading.Lock()
+_first_frame_ns: Optional[int] = None
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    '''
+    Trace the code in the with block as a phase of the startup. A phase on a thread other than the main thread is a background phase.
+    '''
+
+    start_ns = time.perf_counter_ns() - _origin_ns
+    try:
+        yield
+    finally:
+        end_ns = time.perf_counter_ns() - _origin_ns
+        is_background = threading.current_thread() is not threading.main_thread()
+        with _phases_lock:
+            _phases.append(StartupPhase(name, start_ns, end_ns, is_background))
+
+def get_phases() -> List[StartupPhase]:
+    '''
+    Returns the finished phases, in the order they finished.
+    '''
+
+    with _phases_lock:
+        return list(_phases)
+
+def get_time_to_first_frame_ms() -> Optional[float]:
+    '''
+    Returns the milliseconds from the start of the trace to the first frame presented, or None if there's none yet.
+    '''
+
+    global _first_frame_ns
+    return None if _first_frame_ns == None else _first_frame_ns / 1e6
+
+def mark_first_frame():
+    '''
+    Record that the first frame has been presented, and write the trace if DONT_TOUCH_BLOCKS_STARTUP_TRACE is set. Later calls do nothing.
+    '''
+
+    global _first_frame_ns
+    if _first_frame_ns != None:
+        return
+    _first_frame_ns = time.perf_counter_ns() - _origin_ns
+    path = os.environ.get(STARTUP_TRACE_ENV_NAME, "")
+    if path == "":
+        return
+    try:
+        write_report(path)
+    except OSError as e:
+        print(f"WARNING: Couldn't save the startup trace to {path}: {e}")
+
+def to_report() -> Dict[str, Any]:
+    '''
+    Returns the trace as a JSON-serializable dict.
+    '''
+
+    return {
+        "time_to_first_frame_ms": get_time_to_first_frame_ms(),
+        "phases": [
+            {
+                "name": phase.name,
+                "start_ms": phase.start_ns / 1e6,
+                "duration_ms": (phase.end_ns - phase.start_ns) / 1e6,
+                "background": phase.is_background,
+            }
+            for phase in sorted(get_phases(), key = lambda phase: phase.start_ns)
+        ],
+    }
+
+def write_report(path: str):
+    '''
+    Write the trace to a JSON file. The file is replaced only when it's complete.
+
+    Raises:
+        OSError: The file couldn't be written.
+    '''
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(to_report(), f, indent = 2)
+    os.replace(temp_path, path)
@@ -0,0 +1,225 @@
+'''
+Unit test for module blockmap.
+'''
+
+import math
+import random
+import threading
+import time
+import typing
+import unittest
+from unittest import TestCase
+import pygame
+from pygame import Surface
+import blockmap
+import gamebase
+from blockmap import (
+    BlockMap, BlockMapManager, BLOCK_MAP_WIDTH, BLOCK_MAP_HEIGHT, BLOCK_SIDE_LEN, BLOCK_SIDE_LEN_FIXED,
+    BLOCK_MAP_SURFACE_WIDTH_FIXED, BLOCK_MAP_POOL_MIN_SIZE, BLOCK_MAP_POOL_MAX_SIZE
+)
+from scene import Scene
+
+class _TestScene(Scene):
+    def on_create(self):
+        pass
+
+    def on_destroy(self):
+        pass
+
+def _random_color(rand: random.Random):
+    return (rand.randrange(256), rand.randrange(256), rand.randrange(256))
+
+class BlockMapTestCase(TestCase):
+    def check_surface(self, bmap: BlockMap):
+        # the reference is the rasterizer that drew every block with draw.rect.
+        reference = Surface(bmap.surface.get_size(), flags = pygame.SRCALPHA)
+        reference.fill((0, 0, 0, 0))
+        for x in range(BLOCK_MAP_WIDTH):
+            for y in range(BLOCK_MAP_HEIGHT):
+                if bmap.is_solid(x, y):
+                    pygame.draw.rect(
+                        reference, bmap.get_color(x, y) + (255,),
+                        (x * BLOCK_SIDE_LEN, y * BLOCK_SIDE_LEN, BLOCK_SIDE_LEN, BLOCK_SIDE_LEN)
+                    )
+        self.assertEqual(
+            pygame.image.tobytes(bmap.surface, "RGBA"), pygame.image.tobytes(reference, "RGBA")
+        )
+
+    def test_refresh(self):
+        rand = random.Random(4)
+        bmap = BlockMap()
+        bmap.refresh()
+        self.check_surface(bmap)
+        for x in range(BLOCK_MAP_WIDTH):
+            for y in range(BLOCK_MAP_HEIGHT):
+                if rand.random() < 0.4:
+                    bmap.set_cell(x, y, _random_color(rand))
+        bmap.refresh()
+        self.check_surface(bmap)
+        # only the changed columns are redrawn.
+        for _ in range(3):
+            for _ in range(10):
+                x = rand.randrange(BLOCK_MAP_WIDTH)
+                y = rand.randrange(BLOCK_MAP_HEIGHT)
+                bmap.set_cell(x, y, None if bmap.is_solid(x, y) else _random_color(rand))
+            bmap.refresh()
+            self.check_surface(bmap)
+        bmap.recycle()
+        bmap.refresh()
+        self.check_surface(bmap)
+
+    def test_load(self):
+        rand = random.Random(5)
+        source = BlockMap()
+        for x in range(BLOCK_MAP_WIDTH):
+            for y in range(BLOCK_MAP_HEIGHT):
+                if rand.random() < 0.5:
+                    source.set_cell(x, y, _random_color(rand))
+        bmap = BlockMap()
+        bmap.load(source.occupancy.tobytes(), source.colors.tobytes())
+        self.assertEqual(bmap.column_masks, source.column_masks)
+        bmap.refresh()
+        self.check_surface(bmap)
+
+class BlockMapManagerTestCase(TestCase):
+    def launch_manager(self) -> BlockMapManager:
+        manager = typing.cast(BlockMapManager, _TestScene().spawn_entity(BlockMapManager))
+        # the first blockmap after the screen has a block at the top left.
+        manager.launch(lambda bmap: bmap.set_cell(0, 0, (255, 0, 0)))
+        return manager
+
+    def swap(self, manager: BlockMapManager):
+        manager.move(BLOCK_MAP_SURFACE_WIDTH_FIXED)
+        manager.on_tick()
+
+    def is_next_blockmap_empty(self, manager: BlockMapManager) -> bool:
+        return not any(
+            manager.test_touch_block(BLOCK_MAP_SURFACE_WIDTH_FIXED + x * BLOCK_SIDE_LEN_FIXED, y * BLOCK_SIDE_LEN_FIXED)
+            for x in range(BLOCK_MAP_WIDTH) for y in range(BLOCK_MAP_HEIGHT)
+        )
+
+    def test_starvation(self):
+        manager = self.launch_manager()
+        # the generator takes a blockmap and never delivers it.
+        self.assertNotEqual(manager.wait_unready_blockmap(), None)
+        self.swap(manager)
+        metrics = manager.metrics
+        self.assertEqual(metrics.starvation_count, 1)
+        self.assertEqual(manager.starved_swaps, [0])
+        event = metrics.starvation_events[-1]
+        self.assertEqual(event.tick, gamebase.get_tick_count())
+        self.assertGreater(event.waited_ms, 0.0)
+        self.assertGreaterEqual(event.generation_elapsed_ms, event.waited_ms)
+        self.assertEqual(event.time_to_consume_ms, metrics.time_to_consume_ms)
+        self.assertEqual(event.pool_size, BLOCK_MAP_POOL_MIN_SIZE)
+        # the game goes on with the passed blockmap, empty, after the one on the screen.
+        self.assertTrue(manager.test_touch_block(0, 0))
+        self.assertTrue(self.is_next_blockmap_empty(manager))
+        self.swap(manager)
+        self.assertEqual(metrics.starvation_count, 2)
+        self.assertEqual(manager.starved_swaps, [0, 1])
+        self.assertEqual(len(metrics.starvation_events), 2)
+
+    def test_replay_starvations(self):
+        manager = self.launch_manager()
+        manager.replay_starvations([1])
+        def generate():
+            bmap = typing.cast(BlockMap, manager.wait_unready_blockmap())
+            # later than a swap waits outside a replay.
+            time.sleep(0.05)
+            bmap.set_cell(1, 0, (0, 255, 0))
+            manager.put_ready_blockmap(bmap)
+        thread = threading.Thread(target = generate)
+        thread.start()
+        # a swap that wasn't starved in the recorded run waits for the generator.
+        self.swap(manager)
+        thread.join()
+        self.assertEqual(manager.starved_swaps, [])
+        self.assertTrue(manager.test_touch_block(BLOCK_MAP_SURFACE_WIDTH_FIXED + BLOCK_SIDE_LEN_FIXED, 0))
+        # a starved one falls back to an empty blockmap, even if one is ready.
+        manager.put_ready_blockmap(typing.cast(BlockMap, manager.wait_unready_blockmap()))
+        self.swap(manager)
+        self.assertEqual(manager.starved_swaps, [1])
+        self.assertTrue(self.is_next_blockmap_empty(manager))
+        self.assertEqual(manager.metrics.starvation_count, 0)
+        self.assertEqual(manager.metrics.ready_depth, 1)
+
+    def test_replay_with_dead_generator(self):
+        manager = self.launch_manager()
+        manager.replay_starvations([])
+        # the generator dies with a blockmap.
+        self.assertNotEqual(manager.wait_unready_blockmap(), None)
+        wait_timeout = blockmap.REPLAY_BLOCKMAP_WAIT_TIMEOUT
+        blockmap.REPLAY_BLOCKMAP_WAIT_TIMEOUT = 0.05
+        try:
+            self.assertEqual(manager.replay_error, None)
+            starttime = time.perf_counter()
+            self.swap(manager)
+            self.assertLess(time.perf_counter() - starttime, 1.0)
+        finally:
+            blockmap.REPLAY_BLOCKMAP_WAIT_TIMEOUT = wait_timeout
+        self.assertNotEqual(manager.replay_error, None)
+        self.assertTrue(self.is_next_blockmap_empty(manager))
+        # the replay isn't recorded as starved, and later swaps don't wait anymore.
+        self.assertEqual(manager.starved_swaps, [])
+        starttime = time.perf_counter()
+        self.swap(manager)
+        self.assertLess(time.perf_counter() - starttime, 1.0)
+
+    def test_target_pool_size(self):
+        self.assertEqual(blockmap.get_target_pool_size(0.0, math.inf), BLOCK_MAP_POOL_MIN_SIZE)
+        self.assertEqual(blockmap.get_target_pool_size(5.0, 10.0), BLOCK_MAP_POOL_MIN_SIZE)
+        # 2 x 24 ms of generation is 5 blockmaps passed in 10 ms each.
+        self.assertEqual(blockmap.get_target_pool_size(24.0, 10.0), 3 + 5)
+        self.assertEqual(blockmap.get_target_pool_size(1000.0, 10.0), BLOCK_MAP_POOL_MAX_SIZE)
+
+    def test_pool_size(self):
+        manager = self.launch_manager()
+        metrics = manager.metrics
+        metrics.target_pool_size = BLOCK_MAP_POOL_MIN_SIZE + 2
+        # the pool grows by one blockmap per tick without a swap.
+        for pool_size in (BLOCK_MAP_POOL_MIN_SIZE + 1, BLOCK_MAP_POOL_MIN_SIZE + 2, BLOCK_MAP_POOL_MIN_SIZE + 2):
+            manager.on_tick()
+            self.assertEqual(metrics.pool_size, pool_size)
+        # the generator is far faster than the player, so the pool shrinks by one blockmap per swap.
+        for _ in range(BLOCK_MAP_POOL_MIN_SIZE):
+            manager.put_ready_blockmap(typing.cast(BlockMap, manager.wait_unready_blockmap()))
+        self.assertEqual(manager.try_get_unready_blockmap(), None)
+        for pool_size in (BLOCK_MAP_POOL_MIN_SIZE + 1, BLOCK_MAP_POOL_MIN_SIZE, BLOCK_MAP_POOL_MIN_SIZE):
+            self.swap(manager)
+            self.assertEqual(metrics.target_pool_size, BLOCK_MAP_POOL_MIN_SIZE)
+            self.assertEqual(metrics.pool_size, pool_size)
+        # a slow generation makes the pool grow again.
+        metrics.record_generation(40.0)
+        self.swap(manager)
+        self.assertEqual(metrics.target_pool_size, blockmap.get_target_pool_size(40.0, metrics.time_to_consume_ms))
+        self.assertEqual(metrics.pool_size, BLOCK_MAP_POOL_MIN_SIZE)
+        manager.on_tick()
+        self.assertEqual(metrics.pool_size, BLOCK_MAP_POOL_MIN_SIZE + 1)
+
+    def test_no_growth_after_stop(self):
+        for stop in ("is_stopped", "stop_generation"):
+            manager = self.launch_manager()
+            metrics = manager.metrics
+            metrics.target_pool_size = BLOCK_MAP_POOL_MIN_SIZE + 2
+            if stop == "is_stopped":
+                manager.is_stopped = True
+            else:
+                manager.stop_generation()
+            manager.on_tick()
+            self.assertEqual(metrics.pool_size, BLOCK_MAP_POOL_MIN_SIZE)
+
+    def test_destroy_with_dead_generator(self):
+        manager = self.launch_manager()
+        # the generator dies with a blockmap.
+        self.assertNotEqual(manager.wait_unready_blockmap(), None)
+        stop_timeout = blockmap.GENERATION_STOP_TIMEOUT
+        blockmap.GENERATION_STOP_TIMEOUT = 0.05
+        try:
+            starttime = time.perf_counter()
+            manager.destroy()
+            self.assertLess(time.perf_counter() - starttime, 1.0)
+        finally:
+            blockmap.GENERATION_STOP_TIMEOUT = stop_timeout
+
+unittest.main()
@@ -0,0 +1,141 @@
+'''
+Unit test for module blockmap_engine.
+'''
+
+import copy
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import typing
+import unittest
+from unittest import TestCase
+import blockmap_engine
+from blockmap_engine import BlockMapEngine, GenerationParams, GenerationProcess
+
+PARAMS = GenerationParams(
+    map_width = 32,
+    map_height = 20,
+    block_side_len = 240000,
+    tick_rate = 100,
+    gravity_accel = 600,
+    jump_speed = 17100,
+    initial_speed = 18000,
+    max_speed = 36000,
+    speed_accel = 1,
+    pos_y_min = 360000,
+    pos_y_max = 4440000,
+    pos_y_jumpable_min = 609675,
+    jump_interval_min = 0.2,
+    jump_interval_max = 1.17,
+    path_y_offset_range_start = (1.0, 5.0),
+    path_y_offset_range_end = (0.0, 2.0),
+    path_y_offset_to_end_ticks = 12000
+)
+
+class BlockMapEngineTestCase(TestCase):
+    def check_map(self, occupancy, colors):
+        width = PARAMS.map_width
+        height = PARAMS.map_height
+        for x in range(width):
+            column = occupancy[x * height:(x + 1) * height]
+            self.assertIn(0, column) # the path is open in every column
+            for y in range(height):
+                alpha = colors[(y * width + x) * 4 + 3]
+                self.assertEqual(alpha, 255 if column[y] else 0)
+
+    def test_generate(self):
+        engine = BlockMapEngine(PARAMS, 1)
+        occupancy = bytearray(PARAMS.map_size)
+        colors = bytearray(PARAMS.map_size * 4)
+        while engine.simulated_ticks < PARAMS.path_y_offset_to_end_ticks * 2:
+            engine.generate(occupancy, colors)
+            self.check_map(occupancy, colors)
+
+    def test_seed(self):
+        maps = []
+        for seed in (1, 1, 2):
+            engine = BlockMapEngine(PARAMS, seed)
+            occupancy = bytearray(PARAMS.map_size)
+            colors = bytearray(PARAMS.map_size * 4)
+            for _ in range(3):
+                engine.generate(occupancy, colors)
+            maps.append((occupancy, colors))
+        self.assertEqual(maps[0], maps[1])
+        self.assertNotEqual(maps[0], maps[2])
+
+    def test_closed_form(self):
+        # the closed form draws the same random numbers as the per-tick simulation, so the maps must be exactly the same
+        fast_accel_params = copy.copy(PARAMS)
+        fast_accel_params.speed_accel = 40 # reaches the max speed in the middle of a map
+        max_speed_params = copy.copy(PARAMS)
+        max_speed_params.initial_speed = PARAMS.max_speed
+        for params in (PARAMS, fast_accel_params, max_speed_params):
+            for seed in range(10):
+                engines = [
+                    BlockMapEngine(params, seed, is_closed_form = is_closed_form)
+                    for is_closed_form in (True, False)
+                ]
+                buffers = [
+                    (bytearray(params.map_size), bytearray(params.map_size * 4))
+                    for _ in engines
+                ]
+                for _ in range(20):
+                    for engine, (occupancy, colors) in zip(engines, buffers):
+                        engine.generate(occupancy, colors)
+                    self.assertEqual(buffers[0], buffers[1])
+                    self.assertEqual(engines[0].simulated_ticks, engines[1].simulated_ticks)
+
+    def test_process(self):
+        process = GenerationProcess(PARAMS)
+        try:
+            process.reset(1)
+            engine = BlockMapEngine(PARAMS, 1)
+            occupancy = bytearray(PARAMS.map_size)
+            colors = bytearray(PARAMS.map_size * 4)
+            for _ in range(3):
+                process.generate()
+                engine.generate(occupancy, colors)
+                self.assertEqual(bytes(process.occupancy), occupancy)
+                self.assertEqual(bytes(process.colors), colors)
+        finally:
+            process.close()
+
+    def test_process_terminate(self):
+        process = GenerationProcess(PARAMS)
+        try:
+            process.reset(1)
+            children = multiprocessing.active_children()
+            self.assertEqual(len(children), 1)
+            # the worker hangs, and so does the generate call.
+            os.kill(typing.cast(int, children[0].pid), signal.SIGSTOP)
+            # a reset doesn't wait forever.
+            response_timeout = blockmap_engine.GENERATION_PROCESS_RESPONSE_TIMEOUT
+            blockmap_engine.GENERATION_PROCESS_RESPONSE_TIMEOUT = 0.05
+            try:
+                starttime = time.perf_counter()
+                self.assertRaises(TimeoutError, process.reset, 2)
+                self.assertLess(time.perf_counter() - starttime, 1.0)
+            finally:
+                blockmap_engine.GENERATION_PROCESS_RESPONSE_TIMEOUT = response_timeout
+            errors = []
+            def generate():
+                try:
+                    process.generate()
+                except (EOFError, OSError) as e:
+                    errors.append(e)
+            thread = threading.Thread(target = generate)
+            thread.start()
+            thread.join(0.2)
+            self.assertTrue(thread.is_alive())
+            process.terminate()
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+            self.assertEqual(len(errors), 1)
+        finally:
+            process.close()
+        self.assertTrue(process.is_closed)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+'''
+Unit test for module chunklibrary.
+'''
+
+import copy
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+from chunklibrary import build_chunk_library, ChunkLibrary, ChunkLibraryFormatError, ChunkStitcher
+from test_blockmap_engine import PARAMS
+
+class ChunkLibraryTestCase(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "test.chunks")
+        self.library_id = build_chunk_library(self.path, PARAMS, 4, 5, 1)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_chains(self):
+        library = ChunkLibrary(self.path, PARAMS)
+        try:
+            self.assertEqual(library.library_id, self.library_id)
+            self.assertEqual(library.chunk_count, 20)
+            for index in range(library.chunk_count):
+                entry_state, exit_state = library.get_states(index)
+                if index % library.chain_length == 0:
+                    self.assertEqual(entry_state[4], 0) # a chain starts at the start of a run
+                else:
+                    self.assertEqual(entry_state, library.get_states(index - 1)[1])
+                    self.assertTrue(library.is_compatible(index - 1, index))
+                occupancy = bytes(library.get_occupancy(index))
+                for x, (y_min, y_max) in enumerate(library.get_corridor_bounds(index)):
+                    column = occupancy[x * PARAMS.map_height:(x + 1) * PARAMS.map_height]
+                    self.assertEqual(column[y_min:y_max + 1], bytes(y_max + 1 - y_min))
+        finally:
+            library.close()
+
+    def test_stitch(self):
+        library = ChunkLibrary(self.path, PARAMS)
+        try:
+            stitcher = ChunkStitcher(library, 1)
+            self.assertEqual(stitcher.exit_state, None)
+            indices = []
+            while True:
+                index = stitcher.next_chunk()
+                if index == None:
+                    break
+                indices.append(index)
+            self.assertEqual([index % library.chain_length for index in indices], list(range(5)))
+            for index, next_index in zip(indices, indices[1:]):
+                self.assertTrue(library.is_compatible(index, next_index))
+            self.assertEqual(stitcher.exit_state, library.get_states(indices[-1])[1])
+        finally:
+            library.close()
+
+    def test_invalid(self):
+        other_params = copy.copy(PARAMS)
+        other_params.gravity_accel += 1
+        self.assertRaises(ChunkLibraryFormatError, ChunkLibrary, self.path, other_params)
+        with open(self.path, "r+b") as f:
+            f.truncate(os.path.getsize(self.path) - 1)
+        self.assertRaises(ChunkLibraryFormatError, ChunkLibrary, self.path, PARAMS)
+
+unittest.main()
@@ -0,0 +1,34 @@
+'''
+Unit test for module fixedpoint.
+'''
+
+import unittest
+from unittest import TestCase
+from decimal import Decimal
+import fixedpoint
+
+class FixedPointTestCase(TestCase):
+    def test_conversion(self):
+        self.assertEqual(fixedpoint.from_pixels(1), fixedpoint.SUBPIXELS_PER_PIXEL)
+        self.assertEqual(fixedpoint.from_pixels("2.5"), fixedpoint.SUBPIXELS_PER_PIXEL * 5 // 2)
+        self.assertEqual(fixedpoint.speed_from_pixels_per_second(300, 100), 3 * fixedpoint.SUBPIXELS_PER_PIXEL)
+        self.assertEqual(fixedpoint.accel_from_pixels_per_second2(1000, 100), fixedpoint.SUBPIXELS_PER_PIXEL // 10)
+        self.assertRaises(ValueError, fixedpoint.from_pixels, Decimal("0.00001"))
+
+    def test_to_pixels(self):
+        self.assertEqual(fixedpoint.to_pixels(fixedpoint.from_pixels(3) + 1), 3)
+        self.assertEqual(fixedpoint.to_pixels(-1), -1)
+
+    def test_div_round_half_even(self):
+        self.assertEqual(fixedpoint.div_round_half_even(5, 10), 0)
+        self.assertEqual(fixedpoint.div_round_half_even(15, 10), 2)
+        self.assertEqual(fixedpoint.div_round_half_even(16, 10), 2)
+        self.assertEqual(fixedpoint.div_round_half_even(-15, 10), -2)
+
+    def test_to_decimal(self):
+        self.assertEqual(str(fixedpoint.to_decimal(1234, 100, 1)), "12.3")
+        self.assertEqual(str(fixedpoint.to_decimal(0, 100, 1)), "0.0")
+        self.assertEqual(str(fixedpoint.to_decimal(123456789, 10, 1)), "12345678.9")
+        self.assertEqual(fixedpoint.to_decimal(1, 3, 2), Decimal("0.33"))
+
+unittest.main()
@@ -0,0 +1,51 @@
+'''
+Unit test for module frametelemetry.
+'''
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+from frametelemetry import FrameTelemetry, get_percentile, write_reports
+
+class FrameTelemetryTestCase(TestCase):
+    def test_ring(self):
+        telemetry = FrameTelemetry(4)
+        for i in range(1, 7):
+            telemetry.record(i, 0, 0, 0)
+        self.assertEqual(telemetry.frame_count, 4)
+        self.assertEqual(telemetry.recorded_count, 6)
+        self.assertEqual(telemetry.get_times_ns(), [3, 4, 5, 6])
+        self.assertEqual(telemetry.get_times_ns("event"), [3, 4, 5, 6])
+        self.assertEqual(telemetry.get_times_ns("tick"), [0, 0, 0, 0])
+        telemetry.clear()
+        self.assertEqual(telemetry.get_times_ns(), [])
+
+    def test_statistics(self):
+        self.assertEqual(get_percentile(list(range(1, 101)), 95), 95)
+        self.assertEqual(get_percentile([], 50), 0)
+        telemetry = FrameTelemetry()
+        for _ in range(98):
+            telemetry.record(0, 1000000, 0, 500000)
+        telemetry.record(0, 9000000, 0, 0)
+        telemetry.record(0, 120000000, 0, 0)
+        percentiles = telemetry.get_percentiles_ms()
+        self.assertEqual(percentiles, {"p50": 1.5, "p95": 1.5, "p99": 9.0, "max": 120.0})
+        self.assertEqual(telemetry.get_histogram(), [0, 98, 0, 0, 1, 0, 0, 0, 0, 1])
+        self.assertEqual(telemetry.get_histogram("flip"), [100, 0, 0, 0, 0, 0, 0, 0, 0, 0])
+
+    def test_report(self):
+        telemetry = FrameTelemetry()
+        telemetry.record(1, 2, 3, 4)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "frame_telemetry.json")
+            write_reports(path, [telemetry.to_report("GameScene")])
+            with open(path) as f:
+                report = json.load(f)["reports"][0]
+            self.assertEqual(os.listdir(temp_dir), ["frame_telemetry.json"])
+        self.assertEqual(report["scene"], "GameScene")
+        self.assertEqual(report["frames"], 1)
+        self.assertEqual(report["percentiles_ms"]["frame"]["max"], 10 / 1e6)
+
+unittest.main()
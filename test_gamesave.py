@@ -0,0 +1,77 @@
+'''
+Unit test for module gamesave.
+'''
+
+import json
+import os
+import tempfile
+import time
+import unittest
+from decimal import Decimal
+from unittest import TestCase
+import gamesave
+
+class GameSaveTestCase(TestCase):
+    def test_write_behind(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            gamesave.SAVE_FILENAME = os.path.join(temp_dir, "save.json")
+            gamesave.load()
+            gamesave.flush()
+            gamesave.set("is_mute", True)
+            gamesave.set("best_score", Decimal("12.5"))
+            with open(gamesave.SAVE_FILENAME) as f:
+                self.assertEqual(json.load(f)["is_mute"], False)
+            gamesave.flush()
+            self.assertEqual(os.listdir(temp_dir), ["save.json"])
+            with open(gamesave.SAVE_FILENAME) as f:
+                self.assertEqual(json.load(f)["is_mute"], True)
+
+            gamesave.set("is_mute", False)
+            gamesave.set("best_score", Decimal(0))
+            gamesave.load()
+            self.assertEqual(gamesave.get("is_mute", bool), True)
+            self.assertEqual(gamesave.get("best_score", Decimal), Decimal("12.5"))
+            gamesave.flush()
+
+    def test_failed_write(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            gamesave.SAVE_FILENAME = os.path.join(temp_dir, "save.json")
+            gamesave.load()
+            gamesave.flush()
+            # the save can't replace a directory.
+            os.remove(gamesave.SAVE_FILENAME)
+            os.mkdir(gamesave.SAVE_FILENAME)
+            with self.assertRaises(OSError):
+                gamesave.save()
+            self.assertEqual(os.listdir(temp_dir), ["save.json"])
+
+    def test_writer_survives_error(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            gamesave.SAVE_FILENAME = os.path.join(temp_dir, "save.json")
+            gamesave.load()
+            gamesave.set("is_mute", False)
+            gamesave.flush()
+            write = gamesave._write
+            def fail(snapshot):
+                raise TypeError("not serializable")
+            gamesave._write = fail
+            try:
+                gamesave.set("best_score", Decimal(3))
+                # wait until the writer has taken the change and failed on it.
+                deadline = time.monotonic() + 10
+                while gamesave._pending_save != None and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                time.sleep(0.1)
+            finally:
+                gamesave._write = write
+            # the next change is still written behind.
+            gamesave.set("is_mute", True)
+            deadline = time.monotonic() + 10
+            is_mute = False
+            while not is_mute and time.monotonic() < deadline:
+                time.sleep(0.05)
+                with open(gamesave.SAVE_FILENAME) as f:
+                    is_mute = json.load(f)["is_mute"]
+            self.assertTrue(is_mute)
+
+unittest.main()
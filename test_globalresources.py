@@ -0,0 +1,44 @@
+'''
+Unit test for module globalresources.
+'''
+
+import math
+import os
+import struct
+import tempfile
+import unittest
+import wave
+from unittest import TestCase
+
+os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+import pygame
+import globalresources
+
+class SoundCacheTestCase(TestCase):
+    def test_load_sound(self):
+        pygame.mixer.init()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "tone.wav")
+            with wave.open(path, "wb") as f:
+                f.setnchannels(1)
+                f.setsampwidth(2)
+                f.setframerate(22050)
+                f.writeframes(b"".join(struct.pack("<h", int(8000 * math.sin(i / 10))) for i in range(2205)))
+            cache_dir = os.path.join(temp_dir, "sound_cache")
+            decoded = globalresources.load_sound(path, cache_dir)
+            cache_files = os.listdir(cache_dir)
+            self.assertEqual(len(cache_files), 1)
+            # the samples are loaded from the cache rather than decoded again.
+            samples = decoded.get_raw()[:4000]
+            with open(os.path.join(cache_dir, cache_files[0]), "wb") as f:
+                f.write(samples)
+            self.assertEqual(globalresources.load_sound(path, cache_dir).get_raw(), samples)
+            # another file is another entry.
+            with open(path, "ab") as f:
+                f.write(bytes(4))
+            globalresources.load_sound(path, cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+        pygame.mixer.quit()
+
+unittest.main()
@@ -0,0 +1,61 @@
+'''
+Unit test for module glyphatlas.
+'''
+
+import unittest
+from unittest import TestCase
+import pygame
+from pygame import Color, Surface
+from pygame.font import Font
+from glyphatlas import GlyphAtlas, GlyphText
+
+pygame.font.init()
+
+class GlyphAtlasTestCase(TestCase):
+    def assert_same_as_glyphs(self, font: Font, text: str, antialias: bool):
+        color = Color("yellow")
+        # the text laid out by the width of each glyph, without the subpixel positioning of the font.
+        glyphs = [font.render(char, antialias, color) for char in text]
+        width = sum(glyph.get_width() for glyph in glyphs)
+        reference = Surface((width + 10, font.get_height()), pygame.SRCALPHA)
+        x = 10
+        for glyph in glyphs:
+            reference.blit(glyph, (x, 0))
+            x += glyph.get_width()
+
+        atlas = GlyphAtlas(font, color, antialias)
+        self.assertEqual(atlas.get_width(text), width)
+        surface = Surface(reference.get_size(), pygame.SRCALPHA)
+        rect = atlas.draw(surface, text, (10, 0))
+        self.assertEqual(rect, pygame.Rect(10, 0, width, font.get_height()))
+        self.assertEqual(
+            pygame.image.tobytes(surface, "RGBA"), pygame.image.tobytes(reference, "RGBA")
+        )
+
+    def test_draw(self):
+        font = Font(None, 50)
+        self.assert_same_as_glyphs(font, "12.30", True)
+        self.assert_same_as_glyphs(font, "7 ms", False)
+        # a glyph that isn't rendered up front
+        self.assert_same_as_glyphs(font, "Z9", True)
+
+    def test_text(self):
+        font = Font(None, 50)
+        color = Color("aqua")
+        atlas = GlyphAtlas(font, color)
+        label = font.render("Speed: ", True, color)
+        text = GlyphText(atlas, label)
+        self.assertEqual(text.text, None)
+        for value in ("1234.5", "300.0"):
+            text.set_text(value)
+            self.assertEqual(text.width, label.get_width() + atlas.get_width(value))
+            surface = Surface((text.width, atlas.height), pygame.SRCALPHA)
+            self.assertEqual(text.draw(surface, (0, 0)), surface.get_rect())
+            reference = Surface(surface.get_size(), pygame.SRCALPHA)
+            reference.blit(label, (0, 0))
+            atlas.draw(reference, value, (label.get_width(), 0))
+            self.assertEqual(
+                pygame.image.tobytes(surface, "RGBA"), pygame.image.tobytes(reference, "RGBA")
+            )
+
+unittest.main()
@@ -0,0 +1,31 @@
+'''
+Unit test for module replay.
+'''
+
+import unittest
+from unittest import TestCase
+from replay import Replay, ReplayFormatError
+
+class ReplayTestCase(TestCase):
+    def test_round_trip(self):
+        replay = Replay(2 ** 64 - 1, [1, 2, 130, 20000], [3], 20001)
+        self.assertEqual(Replay.from_bytes(replay.to_bytes()), replay)
+        replay = Replay(0)
+        self.assertEqual(Replay.from_bytes(replay.to_bytes()), replay)
+        self.assertEqual(Replay.from_bytes(replay.to_bytes()).death_tick, None)
+        replay = Replay(1, [10], [], 20, 2 ** 64 - 1)
+        self.assertEqual(Replay.from_bytes(replay.to_bytes()), replay)
+        self.assertNotEqual(Replay.from_bytes(replay.to_bytes()), Replay(1, [10], [], 20))
+
+    def test_compact(self):
+        # 13 header bytes, then one byte per small number
+        replay = Replay(1, [10, 20, 30], [], 40)
+        self.assertEqual(len(replay.to_bytes()), 13 + 1 + 4 + 1)
+
+    def test_invalid(self):
+        data = Replay(1, [10, 20], [], 40).to_bytes()
+        self.assertRaises(ReplayFormatError, Replay.from_bytes, data[:-1])
+        self.assertRaises(ReplayFormatError, Replay.from_bytes, data + b"\0")
+        self.assertRaises(ReplayFormatError, Replay.from_bytes, b"XXXX" + data[4:])
+
+unittest.main()
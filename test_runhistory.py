@@ -0,0 +1,60 @@
+'''
+Unit test for module runhistory.
+'''
+
+import os
+import tempfile
+import time
+import unittest
+from unittest import TestCase
+import runhistory
+from runhistory import RunHistory, RunRecord
+
+DAY_SECONDS = 24 * 60 * 60
+
+class RunHistoryTestCase(TestCase):
+    def test_queries(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            history = RunHistory(os.path.join(temp_dir, "run_history.db"))
+            self.assertEqual(history.get_score_at_percentile(50), None)
+            self.assertEqual(history.get_percentile_rank(100), 0.0)
+            now = time.time()
+            for i, score_ticks in enumerate([300, 100, 500, 100, 200]):
+                history.append(RunRecord(score_ticks, 10 + i, 1000, (1 << 64) - 1 - i, now - (i % 2) * DAY_SECONDS))
+            self.assertEqual(history.get_run_count(), 5)
+            self.assertEqual([run.score_ticks for run in history.get_top_runs(3)], [500, 300, 200])
+            self.assertEqual(history.get_top_runs(1)[0].seed, (1 << 64) - 3)
+            self.assertEqual(history.get_score_at_percentile(50), 200)
+            self.assertEqual(history.get_score_at_percentile(100), 500)
+            self.assertEqual(history.get_percentile_rank(250), 60.0)
+            daily_bests = history.get_daily_bests(5)
+            self.assertEqual([run.score_ticks for _, run in daily_bests], [500, 100])
+            self.assertEqual(daily_bests[0][0], RunRecord(0, 0, 0, None, now).day)
+            self.assertEqual(history.get_best_of_day(daily_bests[1][0]).run_id, 2)
+            self.assertEqual(history.get_best_of_day("2000-01-01"), None)
+            history.close()
+
+    def test_append_later(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            runhistory.set_path(os.path.join(temp_dir, "run_history.db"))
+            for score_ticks in range(10):
+                runhistory.append_later(RunRecord(score_ticks, 0, 0, None, time.time()))
+            runhistory.flush()
+            history = runhistory.get_run_history()
+            assert history != None
+            self.assertEqual(history.get_run_count(), 10)
+            runhistory.set_path("")
+            self.assertEqual(runhistory.get_run_history(), None)
+
+    def test_writer_error(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            runhistory.set_path(os.path.join(temp_dir, "missing", "run_history.db"))
+            # the writer can't open the file, so the history is disabled by a later append.
+            deadline = time.monotonic() + 10
+            while runhistory.is_enabled() and time.monotonic() < deadline:
+                runhistory.append_later(RunRecord(0, 0, 0, None, time.time()))
+                time.sleep(0.01)
+            self.assertFalse(runhistory.is_enabled())
+            runhistory.flush()
+
+unittest.main()
@@ -0,0 +1,81 @@
+'''
+Unit test for module scene.
+'''
+
+import time
+import unittest
+from unittest import TestCase
+from typing import List, Optional
+from scene import Scene, DynamicEntity, Entity
+
+_calls: List[str] = []
+
+class _TestScene(Scene):
+    def on_create(self):
+        pass
+
+    def on_destroy(self):
+        pass
+
+class _Renderer(DynamicEntity):
+    tick_order = -1
+
+    def on_render(self):
+        _calls.append("render")
+
+class _Simulator(DynamicEntity):
+    entity_to_destroy: Optional[Entity] = None
+
+    def on_tick(self):
+        _calls.append("tick")
+        # the spawned entity is called from the next tick, the destroyed one isn't called anymore.
+        if self.scene.tick_count == 1:
+            self.scene.spawn_entity(_Renderer)
+            if self.entity_to_destroy != None:
+                self.entity_to_destroy.destroy()
+
+    def on_input(self):
+        _calls.append("input")
+
+class _Late(DynamicEntity):
+    tick_order = -1
+
+    def on_late_tick(self):
+        _calls.append("late")
+
+class _SlowRenderer(DynamicEntity):
+    def on_render(self):
+        time.sleep(0.01)
+
+class SceneTestCase(TestCase):
+    def setUp(self):
+        _calls.clear()
+
+    def test_phases(self):
+        scene = _TestScene()
+        scene.spawn_entity(_Late)
+        scene.spawn_entity(_Renderer)
+        scene.spawn_entity(_Simulator)
+        scene._tick()
+        self.assertEqual(_calls, ["input", "tick", "render", "late"])
+
+    def test_deferred(self):
+        scene = _TestScene()
+        simulator = scene.spawn_entity(_Simulator)
+        simulator.entity_to_destroy = scene.spawn_entity(_Late)
+        scene._tick()
+        self.assertEqual(_calls, ["input", "tick"])
+        _calls.clear()
+        scene._tick()
+        self.assertEqual(_calls, ["input", "tick", "render"])
+
+    def test_last_render_ns(self):
+        scene = _TestScene()
+        scene.spawn_entity(_Simulator)
+        scene._tick()
+        self.assertLess(scene.last_render_ns, 5000000)
+        scene.spawn_entity(_SlowRenderer)
+        scene._tick()
+        self.assertGreaterEqual(scene.last_render_ns, 10000000)
+
+unittest.main()
@@ -0,0 +1,42 @@
+'''
+Unit test for module startuptrace.
+'''
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import TestCase
+import startuptrace
+
+class StartupTraceTestCase(TestCase):
+    def test_trace(self):
+        with startuptrace.phase("import"):
+            pass
+        def load():
+            with startuptrace.phase("sounds"):
+                pass
+        thread = threading.Thread(target = load)
+        thread.start()
+        thread.join()
+        self.assertEqual(startuptrace.get_time_to_first_frame_ms(), None)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "startup_trace.json")
+            os.environ[startuptrace.STARTUP_TRACE_ENV_NAME] = path
+            try:
+                startuptrace.mark_first_frame()
+            finally:
+                del os.environ[startuptrace.STARTUP_TRACE_ENV_NAME]
+            with open(path) as f:
+                report = json.load(f)
+        time_to_first_frame_ms = startuptrace.get_time_to_first_frame_ms()
+        assert time_to_first_frame_ms != None
+        self.assertEqual(report["time_to_first_frame_ms"], time_to_first_frame_ms)
+        self.assertEqual(
+            [(phase["name"], phase["background"]) for phase in report["phases"]],
+            [("import", False), ("sounds", True)]
+        )
+        self.assertTrue(all(phase["start_ms"] + phase["duration_ms"] <= time_to_first_frame_ms for phase in report["phases"]))
+
+unittest.main()
@@ -0,0 +1,43 @@
+'''
+Unit test for module textcache.
+'''
+
+import unittest
+from unittest import TestCase
+import pygame
+from pygame import Color
+from pygame.font import Font
+from textcache import TextCache
+
+pygame.font.init()
+
+class TextCacheTestCase(TestCase):
+    def test_render(self):
+        font = Font(None, 50)
+        cache = TextCache(2)
+        surface = cache.render(font, "GAME OVER", True, "black")
+        self.assertEqual(
+            pygame.image.tobytes(surface, "RGBA"),
+            pygame.image.tobytes(font.render("GAME OVER", True, "black"), "RGBA")
+        )
+        # the same colour in another form is the same key.
+        self.assertIs(cache.render(font, "GAME OVER", True, Color(0, 0, 0)), surface)
+        self.assertIsNot(cache.render(font, "GAME OVER", False, "black"), surface)
+        self.assertEqual((cache.hit_count, cache.miss_count), (1, 2))
+
+    def test_eviction(self):
+        font = Font(None, 50)
+        cache = TextCache(2)
+        surface_a = cache.render(font, "a", True, "black")
+        cache.render(font, "b", True, "black")
+        self.assertIs(cache.render(font, "a", True, "black"), surface_a)
+        # "b" is the least recently used.
+        cache.render(font, "c", True, "black")
+        self.assertEqual(len(cache), 2)
+        self.assertIs(cache.render(font, "a", True, "black"), surface_a)
+        cache.render(font, "b", True, "black")
+        self.assertEqual((cache.hit_count, cache.miss_count), (2, 4))
+        cache.clear()
+        self.assertEqual((len(cache), cache.hit_count, cache.miss_count), (0, 0, 0))
+
+unittest.main()
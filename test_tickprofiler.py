@@ -0,0 +1,34 @@
+'''
+Unit test for module tickprofiler.
+'''
+
+import unittest
+from unittest import TestCase
+from tickprofiler import TickProfiler, PROFILE_WINDOW_TICKS
+
+class TickProfilerTestCase(TestCase):
+    def test_window(self):
+        profiler = TickProfiler()
+        for _ in range(PROFILE_WINDOW_TICKS):
+            self.assertEqual(profiler.get_window_rows(), [])
+            profiler.record(int, "on_tick", 10)
+            profiler.record(str, "on_hud", 30)
+            profiler.record(str, "on_hud", 50)
+            profiler.end_tick()
+        self.assertEqual(profiler.window_count, 1)
+        rows = profiler.get_window_rows()
+        self.assertEqual([(name, hook_name) for name, hook_name, _ in rows], [("str", "on_hud"), ("int", "on_tick")])
+        self.assertEqual(rows[0][2].calls, PROFILE_WINDOW_TICKS * 2)
+        self.assertEqual(rows[0][2].total_ns, PROFILE_WINDOW_TICKS * 80)
+        self.assertEqual(rows[0][2].max_ns, 50)
+        self.assertEqual(len(profiler.get_window_rows(1)), 1)
+
+    def test_table(self):
+        profiler = TickProfiler()
+        profiler.record(int, "on_tick", 2000000)
+        profiler.end_tick()
+        lines = profiler.format_table().splitlines()
+        self.assertEqual(lines[0], "ticks: 1")
+        self.assertEqual(lines[2].split(), ["int.on_tick", "1", "2.000", "2.0000", "2.000"])
+
+unittest.main()
@@ -2,9 +2,11 @@
 Unit test for module utils.
 '''
 
+import threading
+import time
 import unittest
 from unittest import TestCase
-from utils import DecimalVector2
+from utils import DecimalVector2, HandoffQueue
 from decimal import Decimal
 
 class DecimalVector2TestCase(TestCase):
@@ -27,4 +29,46 @@ class DecimalVector2TestCase(TestCase):
         self.assertEqual(DecimalVector2(2, 3) * Decimal("1.5"), DecimalVector2(3, "4.5"))
         self.assertEqual(DecimalVector2(1, 2) / 11, DecimalVector2(Decimal(1) / Decimal(11), Decimal(2) / Decimal(11)))
 
+class HandoffQueueTestCase(TestCase):
+    def test_fifo(self):
+        queue: HandoffQueue[int] = HandoffQueue()
+        for i in range(3):
+            queue.put(i)
+        self.assertEqual(len(queue), 3)
+        self.assertEqual([queue.get(), queue.get_nowait(), queue.get(0)], [0, 1, 2])
+        self.assertEqual(queue.get_nowait(), None)
+
+    def test_get_timeout(self):
+        queue: HandoffQueue[int] = HandoffQueue()
+        starttime = time.perf_counter()
+        self.assertEqual(queue.get(0.05), None)
+        self.assertGreaterEqual(time.perf_counter() - starttime, 0.04)
+
+    def test_put_wakes_consumer(self):
+        queue: HandoffQueue[int] = HandoffQueue()
+        items = []
+        consumer = threading.Thread(target = lambda: items.append(queue.get()))
+        consumer.start()
+        time.sleep(0.05)
+        queue.put(1)
+        consumer.join(5)
+        self.assertEqual(items, [1])
+
+    def test_close(self):
+        queue: HandoffQueue[int] = HandoffQueue()
+        items = []
+        consumer = threading.Thread(target = lambda: items.append(queue.get()))
+        consumer.start()
+        time.sleep(0.05)
+        queue.close()
+        consumer.join(5)
+        self.assertFalse(consumer.is_alive())
+        self.assertEqual(items, [None])
+        # the items left after closing are taken by get_nowait, but not by get.
+        queue.put(1)
+        queue.put(2)
+        self.assertTrue(queue.is_closed)
+        self.assertEqual(queue.get(), None)
+        self.assertEqual([queue.get_nowait(), queue.get_nowait(), queue.get_nowait()], [1, 2, None])
+
 unittest.main()
\ No newline at end of file
@@ -0,0 +1,35 @@
+'''
+Unit test for module xor_encrypt.
+'''
+
+import base64
+import unittest
+from unittest import TestCase
+import xor_encrypt
+from xor_encrypt import XorStream
+
+class XorEncryptTestCase(TestCase):
+    def test_format(self):
+        # the format of the files saved byte by byte before
+        self.assertEqual(
+            xor_encrypt.encrypt("123.4", "key"),
+            ("WldKRVE=", "e7074b29890bbf5443325df5572bff0e")
+        )
+        self.assertEqual(xor_encrypt.decrypt("WldKRVE=", "key", "e7074b29890bbf5443325df5572bff0e"), "123.4")
+        self.assertEqual(xor_encrypt.decrypt("WldKRVE=", "key", "0" * 32), None)
+        self.assertEqual(xor_encrypt.encrypt("", "key")[0], "")
+
+    def test_stream(self):
+        content = "Don't touch blocks. " * 100
+        result, md5 = xor_encrypt.encrypt(content, "a longer key")
+        data = content.encode()
+        stream = XorStream("a longer key")
+        chunks = [stream.update(data[start:start + 7]) for start in range(0, len(data), 7)]
+        self.assertEqual(base64.b64encode(b"".join(chunks)).decode(), result)
+        self.assertEqual(stream.hexdigest(), md5)
+        stream = XorStream("a longer key", is_decrypting = True)
+        self.assertEqual(stream.update(base64.b64decode(result)), data)
+        self.assertEqual(stream.hexdigest(), md5)
+        self.assertEqual(stream.offset, len(data))
+
+unittest.main()
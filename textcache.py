@@ -0,0 +1,77 @@
+'''
+This module contains the text cache, which keeps the surfaces of rendered texts so that static texts such as key hints aren't rasterized again whenever a scene is created.
+
+The surfaces of the cache are shared by everyone who renders the same text. They must not be drawn on, and a blend setting such as the alpha must be set again before every blit. The cache of the default font is shared, see gamebase.render_text.
+'''
+
+from collections import OrderedDict
+from typing import Any, Tuple
+from pygame import Color, Surface
+from pygame.font import Font
+
+TEXT_CACHE_CAPACITY = 64 # the number of surfaces kept, the least recently used is evicted first
+
+# (font, text, antialias, RGBA colour)
+TextCacheKey = Tuple[Font, str, bool, Tuple[int, ...]]
+
+class TextCache:
+    '''
+    A least recently used cache of the surfaces rendered by fonts.
+    '''
+
+    __capacity: int
+    __surfaces: "OrderedDict[TextCacheKey, Surface]"
+    __hit_count: int = 0
+    __miss_count: int = 0
+
+    def __init__(self, capacity: int = TEXT_CACHE_CAPACITY):
+        if capacity < 1:
+            raise ValueError("Arg capacity must be positive!")
+        self.__capacity = capacity
+        self.__surfaces = OrderedDict()
+
+    @property
+    def capacity(self) -> int:
+        return self.__capacity
+
+    @property
+    def hit_count(self) -> int:
+        return self.__hit_count
+
+    @property
+    def miss_count(self) -> int:
+        return self.__miss_count
+
+    def __len__(self) -> int:
+        return len(self.__surfaces)
+
+    def render(self, font: Font, text: str, antialias: bool, color: Any) -> Surface:
+        '''
+        Returns the surface of a text as font.render would, rendering it only if it isn't in the cache.
+
+        Args:
+            color: Any colour value that pygame.Color takes, such as "black".
+        '''
+
+        key = (font, text, antialias, tuple(Color(color)))
+        surfaces = self.__surfaces
+        surface = surfaces.get(key)
+        if surface != None:
+            surfaces.move_to_end(key)
+            self.__hit_count += 1
+            return surface
+        self.__miss_count += 1
+        surface = font.render(text, antialias, color)
+        surfaces[key] = surface
+        if len(surfaces) > self.__capacity:
+            surfaces.popitem(last = False)
+        return surface
+
+    def clear(self):
+        '''
+        Remove every surface and reset the counters.
+        '''
+
+        self.__surfaces.clear()
+        self.__hit_count = 0
+        self.__miss_count = 0
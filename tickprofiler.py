@@ -0,0 +1,172 @@
+'''
+This module contains the tick profiler, which measures the time each entity type spends in each hook.
+
+The profiler is off by default, because every measured call costs two clock reads. While it's on, see set_enabled, the scene records every hook it calls and every pygame event it sends. The debug display turns it on while it's shown. Set the environment variable DONT_TOUCH_BLOCKS_PROFILE to 1 to keep it on from the start.
+'''
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+PROFILE_ENV_NAME = "DONT_TOUCH_BLOCKS_PROFILE"
+PROFILE_WINDOW_TICKS = 50 # the live statistics are averaged over this number of ticks, like the frametime
+PROFILE_DUMP_FILE_PATH = "tick_profile.txt"
+
+class HookStats:
+    '''
+    The time an entity type spends in a hook. Times are in nanoseconds.
+    '''
+
+    calls: int = 0
+    total_ns: int = 0
+    max_ns: int = 0 # the longest single call
+
+# (entity type name, hook name, statistics)
+ProfileRow = Tuple[str, str, HookStats]
+
+def _add_stats(total_stats: Dict[Tuple[type, str], HookStats], stats: Dict[Tuple[type, str], HookStats]):
+    for key, hook_stats in stats.items():
+        total = total_stats.get(key)
+        if total == None:
+            total = total_stats[key] = HookStats()
+        total.calls += hook_stats.calls
+        total.total_ns += hook_stats.total_ns
+        total.max_ns = max(total.max_ns, hook_stats.max_ns)
+
+def _to_rows(stats: Dict[Tuple[type, str], HookStats]) -> List[ProfileRow]:
+    rows = [
+        (entity_type.__qualname__, hook_name, hook_stats)
+        for (entity_type, hook_name), hook_stats in stats.items()
+    ]
+    rows.sort(key = lambda row: row[2].total_ns, reverse = True)
+    return rows
+
+class TickProfiler:
+    '''
+    Accumulates the time of every (entity type, hook) pair, both over the live window of PROFILE_WINDOW_TICKS ticks and since the last reset.
+    '''
+
+    __window_stats: Dict[Tuple[type, str], HookStats]
+    __total_stats: Dict[Tuple[type, str], HookStats]
+    __window_rows: List[ProfileRow] # the last finished window, the slowest first
+    __window_ticks: int = 0
+    __total_ticks: int = 0
+    __window_count: int = 0
+
+    def __init__(self):
+        self.__window_stats = {}
+        self.__total_stats = {}
+        self.__window_rows = []
+
+    @property
+    def total_ticks(self) -> int:
+        return self.__total_ticks + self.__window_ticks
+
+    @property
+    def window_count(self) -> int:
+        '''
+        Returns the number of finished windows, which changes whenever get_window_rows does.
+        '''
+
+        return self.__window_count
+
+    def record(self, entity_type: type, hook_name: str, elapsed_ns: int):
+        key = (entity_type, hook_name)
+        stats = self.__window_stats.get(key)
+        if stats == None:
+            stats = self.__window_stats[key] = HookStats()
+        stats.calls += 1
+        stats.total_ns += elapsed_ns
+        if elapsed_ns > stats.max_ns:
+            stats.max_ns = elapsed_ns
+
+    def end_tick(self):
+        self.__window_ticks += 1
+        if self.__window_ticks < PROFILE_WINDOW_TICKS:
+            return
+        _add_stats(self.__total_stats, self.__window_stats)
+        self.__window_rows = _to_rows(self.__window_stats)
+        self.__total_ticks += self.__window_ticks
+        self.__window_stats = {}
+        self.__window_ticks = 0
+        self.__window_count += 1
+
+    def get_window_rows(self, count: Optional[int] = None) -> List[ProfileRow]:
+        '''
+        Returns the statistics of the last finished window, the slowest first. The time per tick is total_ns / PROFILE_WINDOW_TICKS.
+
+        Args:
+            count: The number of rows to return, or None to return all.
+        '''
+
+        return self.__window_rows[:count]
+
+    def reset(self):
+        self.__window_stats.clear()
+        self.__total_stats.clear()
+        self.__window_rows = []
+        self.__window_ticks = 0
+        self.__total_ticks = 0
+        self.__window_count += 1
+
+    def format_table(self) -> str:
+        '''
+        Returns a text table of the statistics since the last reset, the slowest first.
+        '''
+
+        total_stats: Dict[Tuple[type, str], HookStats] = {}
+        _add_stats(total_stats, self.__total_stats)
+        _add_stats(total_stats, self.__window_stats)
+        total_ticks = self.__total_ticks + self.__window_ticks
+        ticks = max(1, total_ticks)
+        rows = _to_rows(total_stats)
+        name_width = max([len(name) + len(hook_name) + 1 for name, hook_name, _ in rows] + [len("hook")])
+        lines = [
+            f"ticks: {total_ticks}",
+            f"{"hook":<{name_width}} {"calls":>10} {"total ms":>12} {"ms/tick":>10} {"max ms":>10}",
+        ]
+        for name, hook_name, stats in rows:
+            lines.append(
+                f"{name + "." + hook_name:<{name_width}} {stats.calls:>10} "
+                f"{stats.total_ns / 1e6:>12.3f} {stats.total_ns / 1e6 / ticks:>10.4f} "
+                f"{stats.max_ns / 1e6:>10.3f}"
+            )
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str = PROFILE_DUMP_FILE_PATH):
+        '''
+        Write format_table to a file.
+
+        Raises:
+            OSError: The file couldn't be written.
+        '''
+
+        with open(path, "w") as f:
+            f.write(self.format_table())
+
+_profiler: TickProfiler = TickProfiler()
+_is_enabled_by_env: bool = os.environ.get(PROFILE_ENV_NAME, "0") not in ("", "0")
+_active_profiler: Optional[TickProfiler] = _profiler if _is_enabled_by_env else None
+
+def get_profiler() -> TickProfiler:
+    global _profiler
+    return _profiler
+
+def get_active_profiler() -> Optional[TickProfiler]:
+    '''
+    Returns the profiler if it's enabled, otherwise None.
+    '''
+
+    global _active_profiler
+    return _active_profiler
+
+def is_enabled() -> bool:
+    global _active_profiler
+    return _active_profiler != None
+
+def set_enabled(enabled: bool):
+    '''
+    Turn the profiler on or off. It stays on if it's enabled by the environment variable DONT_TOUCH_BLOCKS_PROFILE.
+    '''
+
+    global _active_profiler
+    _active_profiler = _profiler if enabled or _is_enabled_by_env else None
@@ -2,14 +2,19 @@
 This module provides some useful tools.
 '''
 
+from collections import deque
 from decimal import Decimal
-from typing import Any, NoReturn, Sequence, Tuple, Union, Self
+import threading
+from typing import Any, Deque, Generic, NoReturn, Optional, Sequence, Tuple, TypeVar, Union, Self
 import typing
 from enum import IntEnum
-from pygame import Color
+
+if typing.TYPE_CHECKING:
+    # pygame isn't imported at run time, so that modules using only these tools stay cheap to import.
+    from pygame import Color
 
 Numeric = Union[int, float, str, Decimal]
-ColorValue = Union[Color, str, Sequence[int]]
+ColorValue = Union["Color", str, Sequence[int]]
  
 def try_decimal(num: Any) -> Any:
     '''
@@ -98,6 +103,84 @@ class DecimalVector2:
 class InvalidOperationException(Exception):
     pass
 
+T = TypeVar("T")
+
+class HandoffQueue(Generic[T]):
+    '''
+    A FIFO queue for handing items from one producer thread to one consumer thread.
+
+    Taking an item that is already there doesn't acquire any lock, as deque.append and deque.popleft are atomic. A consumer that finds the queue empty can block until an item is put or the queue is closed, instead of polling.
+    '''
+
+    __items: Deque[T]
+    __condition: threading.Condition
+    __is_closed: bool = False
+
+    def __init__(self):
+        self.__items = deque()
+        self.__condition = threading.Condition()
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    @property
+    def is_closed(self) -> bool:
+        return self.__is_closed
+
+    def put(self, item: T):
+        '''
+        Put an item and wake up the consumer if it's waiting.
+        '''
+
+        with self.__condition:
+            self.__items.append(item)
+            self.__condition.notify()
+
+    def get_nowait(self) -> Optional[T]:
+        '''
+        Returns the oldest item, or None if the queue is empty.
+        '''
+
+        try:
+            return self.__items.popleft()
+        except IndexError:
+            return None
+
+    def get(self, timeout: Optional[float] = None) -> Optional[T]:
+        '''
+        Returns the oldest item, waiting for one if the queue is empty.
+
+        Args:
+            timeout: The maximum seconds to wait, or None to wait without limit.
+
+        Returns:
+            The item, or None if the wait timed out or the queue is closed.
+        '''
+
+        items = self.__items
+        if self.__is_closed:
+            return None
+        try:
+            return items.popleft()
+        except IndexError:
+            pass
+        with self.__condition:
+            if not self.__condition.wait_for(
+                lambda: len(items) > 0 or self.__is_closed, timeout):
+                return None
+            if self.__is_closed:
+                return None
+            return items.popleft()
+
+    def close(self):
+        '''
+        Close the queue, so that get returns None at once from now on. Items left in the queue can still be taken by get_nowait.
+        '''
+
+        with self.__condition:
+            self.__is_closed = True
+            self.__condition.notify_all()
+
 class FadeState(IntEnum):
     IN = 0
     HOLD = 1
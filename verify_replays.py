@@ -0,0 +1,217 @@
+'''
+Verify recorded runs in parallel: every replay is re-simulated headless and its score and death tick are compared with the recorded ones.
+
+Each worker process plays a chunk of replays one after another in a single game loop, so pygame is initialized once per chunk.
+
+Usage:
+    python verify_replays.py [--jobs 4] [--chunk-size 64] [--check-best-score] replays/ other.replay ...
+'''
+
+import argparse
+import glob
+import math
+import multiprocessing
+import os
+import sys
+import time
+import typing
+from typing import List, Optional, Tuple
+
+os.environ["DONT_TOUCH_BLOCKS_HEADLESS"] = "1"
+# the workers would overwrite each other's reports.
+os.environ.setdefault("DONT_TOUCH_BLOCKS_FRAME_TELEMETRY", "")
+
+from decimal import Decimal
+import blockmap_generator
+import fixedpoint
+import gamebase
+from gamerule import GameRule
+from gamescene import GameScene
+from replay import Replay, ReplayFormatError, REPLAY_FILE_EXTENSION
+import runrecorder
+from runrecorder import RunRecorder
+from scene import DynamicEntity
+
+# the extra ticks a replay may run after the recorded death tick before it's reported as a mismatch
+DEATH_TICK_MARGIN = 1
+
+# the most replays a worker process plays in one game loop by default
+MAX_DEFAULT_CHUNK_SIZE = 64
+
+# (path, recorded death tick, replayed death tick or None, replayed score or None, error message or None)
+VerifyResult = Tuple[str, Optional[int], Optional[int], Optional[Decimal], Optional[str]]
+
+_chunk_replays: List[Tuple[str, Replay]] = []
+_chunk_results: List[VerifyResult] = []
+
+class ReplayBatchScene(GameScene):
+    '''
+    A game scene that replays the next replay of the chunk and loads itself again for the following one.
+    '''
+
+    def on_create(self):
+
+        super().on_create()
+        self.spawn_entity(ReplayBatchRunner)
+
+class ReplayBatchRunner(DynamicEntity):
+
+    __path: str
+    __replay: Replay
+    __recorder: RunRecorder
+    __game_rule: GameRule
+
+    __is_done: bool = False
+
+    def on_spawn(self):
+
+        super().on_spawn()
+        self.__path, self.__replay = _chunk_replays[len(_chunk_results)]
+        self.__recorder = typing.cast(
+            RunRecorder, self.scene.get_singleton_entity(RunRecorder)
+        )
+        self.__game_rule = typing.cast(
+            GameRule, self.scene.get_singleton_entity(GameRule)
+        )
+
+    def on_late_tick(self):
+
+        if self.__is_done:
+            return
+        recorded_death_tick = self.__replay.death_tick
+        replay_error = self.__recorder.replay_error
+        if replay_error != None:
+            self.__finish(None, None, replay_error)
+        elif self.__recorder.is_finished:
+            record = self.__recorder.record
+            self.__finish(record.death_tick, self.__game_rule.score, None)
+        elif recorded_death_tick != None and self.scene.tick_count > recorded_death_tick + DEATH_TICK_MARGIN:
+            self.__finish(None, None, f"still alive at tick {self.scene.tick_count}")
+
+    def __finish(self, death_tick: Optional[int], score: Optional[Decimal], error: Optional[str]):
+        self.__is_done = True
+        _chunk_results.append(
+            (self.__path, self.__replay.death_tick, death_tick, score, error))
+        _start_next_replay()
+
+def _start_next_replay():
+    index = len(_chunk_results)
+    if index >= len(_chunk_replays):
+        gamebase.request_quit()
+        return
+    runrecorder.set_next_replay(_chunk_replays[index][1])
+    gamebase.request_load_scene("ReplayBatchScene")
+
+def _verify_chunk(paths: List[str]) -> List[VerifyResult]:
+    '''
+    Replay the given files in this process. It runs in a worker process that is used for a single chunk, because gamebase.run can only be called once.
+    '''
+
+    # a pool worker is daemonic and can't start a generation process, and the chunks run in parallel anyway.
+    blockmap_generator.set_generation_mode(blockmap_generator.GENERATION_MODE_THREAD)
+    results: List[VerifyResult] = []
+    for path in paths:
+        try:
+            _chunk_replays.append((path, Replay.load(path)))
+        except (OSError, ReplayFormatError) as e:
+            results.append((path, None, None, None, str(e)))
+    if len(_chunk_replays) > 0:
+        gamebase.register_scene("ReplayBatchScene", ReplayBatchScene)
+        runrecorder.set_next_replay(_chunk_replays[0][1])
+        gamebase.run("ReplayBatchScene")
+    return results + _chunk_results
+
+def collect_replay_paths(args: List[str]) -> List[str]:
+    '''
+    Expand directories and glob patterns to replay files.
+    '''
+
+    paths: List[str] = []
+    for arg in args:
+        if os.path.isdir(arg):
+            paths += sorted(glob.glob(os.path.join(arg, "**", "*" + REPLAY_FILE_EXTENSION), recursive = True))
+        elif glob.has_magic(arg):
+            paths += sorted(glob.glob(arg, recursive = True))
+        else:
+            paths.append(arg)
+    return paths
+
+def is_match(result: VerifyResult) -> bool:
+    _, recorded_death_tick, death_tick, score, error = result
+    if error != None or recorded_death_tick == None:
+        return False
+    return death_tick == recorded_death_tick and score == fixedpoint.to_decimal(
+        recorded_death_tick, gamebase.TICK_RATE, 2)
+
+def main():
+    parser = argparse.ArgumentParser(description = "Re-simulate replays in parallel and check their scores.")
+    parser.add_argument("paths", nargs = "+", help = "replay files, directories or glob patterns")
+    parser.add_argument(
+        "--jobs", type = int, default = os.cpu_count() or 1,
+        help = "the number of worker processes (default: the number of CPUs)"
+    )
+    parser.add_argument(
+        "--chunk-size", type = int, default = None,
+        help = f"the number of replays a worker process plays in one game loop (default: the replays split evenly over the jobs, at most {MAX_DEFAULT_CHUNK_SIZE})"
+    )
+    parser.add_argument(
+        "--check-best-score", action = "store_true",
+        help = "check that the best score in the save file is reached by a verified replay"
+    )
+    args = parser.parse_args()
+
+    paths = collect_replay_paths(args.paths)
+    if len(paths) == 0:
+        print("No replay is found.")
+        sys.exit(1)
+    if args.chunk_size != None:
+        chunk_size = max(1, args.chunk_size)
+    else:
+        # a chunk per job, so that every worker process is used.
+        chunk_size = min(MAX_DEFAULT_CHUNK_SIZE, math.ceil(len(paths) / max(1, args.jobs)))
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    jobs = max(1, min(args.jobs, len(chunks)))
+
+    starttime_ns = time.perf_counter_ns()
+    results: List[VerifyResult] = []
+    # spawn instead of fork: each chunk needs a fresh pygame.
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(jobs, maxtasksperchild = 1) as pool:
+        for chunk_results in pool.imap_unordered(_verify_chunk, chunks):
+            results += chunk_results
+    elapsed = (time.perf_counter_ns() - starttime_ns) / 1e9
+
+    mismatches = [result for result in results if not is_match(result)]
+    for path, recorded_death_tick, death_tick, score, error in sorted(mismatches):
+        if error != None:
+            print(f"MISMATCH: {path}: {error}")
+        elif recorded_death_tick == None:
+            print(f"MISMATCH: {path}: the recorded run didn't end")
+        else:
+            print(f"MISMATCH: {path}: recorded death tick {recorded_death_tick}, replayed {death_tick} (score {score})")
+
+    best_score: Optional[Decimal] = None
+    for result in results:
+        if is_match(result):
+            score = fixedpoint.to_decimal(typing.cast(int, result[1]), gamebase.TICK_RATE, 1)
+            if best_score == None or score > best_score:
+                best_score = score
+
+    print(f"runs: {len(results)}, matched: {len(results) - len(mismatches)}, mismatched: {len(mismatches)}")
+    print(f"verified best score: {best_score}")
+    print(f"wall time: {elapsed:.3f} s with {jobs} processes")
+    print(f"throughput: {len(results) / elapsed:.1f} runs/s, {len(results) / elapsed / jobs:.1f} runs/s per process")
+
+    is_ok = len(mismatches) == 0
+    if args.check_best_score:
+        import gamesave
+        claimed = gamesave.get("best_score", Decimal)
+        if best_score != None and best_score >= claimed:
+            print(f"OK: the best score {claimed} is backed by a verified replay.")
+        else:
+            print(f"MISMATCH: the best score {claimed} isn't backed by any verified replay.")
+            is_ok = False
+    sys.exit(0 if is_ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,78 @@
+'''
+XOR encryption with a repeated key, checked by the MD5 of the content.
+
+A whole buffer is XORed as one big integer against the key tiled to its length, which takes linear time. XorStream does the same chunk by chunk for contents that shouldn't be held in memory at once.
+'''
+
 import hashlib
 import base64
 from typing import Optional, Tuple
 
 STR_ENCODING = "utf-8"
 
+def xor_bytes(data: bytes, key: bytes, offset: int = 0) -> bytes:
+    '''
+    XOR data with the key repeated, as if the data started at offset in a longer content.
+    '''
+
+    if len(key) == 0:
+        raise ValueError("Arg key must not be empty!")
+    length = len(data)
+    if length == 0:
+        return b""
+    start = offset % len(key)
+    tiled_key = (key * ((start + length) // len(key) + 1))[start:start + length]
+    return (
+        int.from_bytes(data, "little") ^ int.from_bytes(tiled_key, "little")
+    ).to_bytes(length, "little")
+
+class XorStream:
+    '''
+    Encrypts or decrypts a content chunk by chunk. The chunks put together are the same as XORing the whole content at once, and the MD5 is of the plain content, as encrypt and decrypt compute it.
+
+    encrypt and decrypt store the XORed bytes in base64, so a file written from the chunks should be encoded as a whole, or in chunks whose lengths are multiples of 3.
+    '''
+
+    __key: bytes
+    __is_decrypting: bool
+    __offset: int = 0
+    __md5: "hashlib._Hash"
+
+    def __init__(self, key: str, is_decrypting: bool = False):
+        self.__key = key.encode(encoding = STR_ENCODING)
+        if len(self.__key) == 0:
+            raise ValueError("Arg key must not be empty!")
+        self.__is_decrypting = is_decrypting
+        self.__md5 = hashlib.md5()
+
+    @property
+    def offset(self) -> int:
+        '''
+        Returns the number of bytes processed.
+        '''
+
+        return self.__offset
+
+    def update(self, chunk: bytes) -> bytes:
+        '''
+        Returns the next chunk XORed.
+        '''
+
+        result = xor_bytes(chunk, self.__key, self.__offset)
+        self.__offset += len(chunk)
+        self.__md5.update(result if self.__is_decrypting else chunk)
+        return result
+
+    def hexdigest(self) -> str:
+        '''
+        Returns the MD5 of the plain content so far.
+        '''
+
+        return self.__md5.hexdigest()
+
 def encrypt(content: str, key: str) -> Tuple[str, str]:
-    key_bytes = key.encode(encoding = STR_ENCODING)
     content_bytes = content.encode(encoding = STR_ENCODING)
-    result = b""
-    for i in range(len(content_bytes)):
-        result += bytes([content_bytes[i] ^ key_bytes[i % len(key_bytes)]])
+    result = xor_bytes(content_bytes, key.encode(encoding = STR_ENCODING))
     result_str = base64.b64encode(result).decode(encoding = STR_ENCODING)
     md5 = hashlib.md5()
     md5.update(content_bytes)
@@ -24,13 +87,9 @@ def decrypt(content: str, key: str, md5_str: str) -> Optional[str]:
         pass
     if content_bytes == None:
         return None
-    key_bytes = key.encode(encoding = STR_ENCODING)
-    result = b""
-    for i in range(len(content_bytes)):
-        result += bytes([content_bytes[i] ^ key_bytes[i % len(key_bytes)]])
+    result = xor_bytes(content_bytes, key.encode(encoding = STR_ENCODING))
     md5 = hashlib.md5()
     md5.update(result)
     if md5.hexdigest() != md5_str:
         return None
     return result.decode(encoding = STR_ENCODING)
-    